@@ -0,0 +1,127 @@
+import re, sys, time
+from collections import namedtuple
+
+# Parser for the action lines the monitors send:
+#
+#   App focus end: pid=42 | exe="code.exe" | title="a | b" | duration=12.50s | reason=focus_switch
+#   Input summary: keys=42 | clicks=8 | scrolls=3 | moves=20 | interval=10.00s
+#   File renamed (from: a.txt to: b.txt): C:/x/a.txt -> C:/x/b.txt
+#
+# i.e. "<type>: <detail>", where the detail is either free text (file events)
+# or `key=value | key="quoted value"` segments (app_usage_tracker.fmt_detail,
+# input_summary_logger). Each line is split once and its segments tokenized in
+# a single regex pass; db.py stores the result in typed columns at ingest, so
+# the summary tools never re-parse text.
+
+ParsedAction = namedtuple("ParsedAction", "event_type detail exe title path duration pid")
+
+_LABELLED = re.compile(r'[^:()]*(?:\([^()]*\)[^:()]*)*:')  # type with (non-nested) parentheses, then ':'
+# one segment: "| key=value" or '| key="quoted value"' (tokenize() puts a '|' in
+# front of the first one). A quoted value ends at the quote that is followed by
+# the next segment or the end, so window titles may contain '|' and '"'.
+_FIELD = re.compile(r'\| *(\w+)=(?:"([^"]*(?:"(?! *(?:\| *\w+=|$))[^"]*)*)"| *([^| ]*(?: +[^| ]+)*))')
+
+def _strip_label(event_type):
+    """
+    'Folder created (name: New folder (2))' -> 'Folder created'. Drops the
+    trailing "(key: value ...)" group, matching parentheses by depth since
+    Windows names carry their own ("a (1).txt"); "(offline)" style suffixes
+    without a ':' stay, as does anything unbalanced.
+    """
+    if not event_type.endswith(")"):
+        return event_type
+    depth = 0
+    for i in range(len(event_type) - 1, -1, -1):
+        ch = event_type[i]
+        if ch == ')':
+            depth += 1
+        elif ch == '(':
+            depth -= 1
+            if depth == 0:
+                return event_type[:i].rstrip() if ":" in event_type[i:] else event_type
+    return event_type
+
+def split_event(action, labels=False):
+    """
+    'File renamed (from: a to: b): C:/a -> C:/b' -> ('File renamed', 'C:/a -> C:/b').
+    Splits on the first ':' outside parentheses and drops per-event label
+    arguments so the type is stable; "(after unlock)" style suffixes stay.
+    labels=True keeps them: ('File renamed (from: a to: b)', 'C:/a -> C:/b').
+    """
+    strip = (lambda t: t) if labels else _strip_label
+    i = action.find(":")
+    if i >= 0 and "(" not in action[:i]:  # the common case: no label before the colon
+        return action[:i].strip(), action[i + 1:].strip()
+    m = _LABELLED.match(action)
+    if m:
+        i = m.end() - 1
+        return strip(action[:i].strip()), action[i + 1:].strip()
+    depth = 0  # nested or unbalanced parentheses
+    for i, ch in enumerate(action):
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth = max(0, depth - 1)
+        elif ch == ':' and depth == 0:
+            return strip(action[:i].strip()), action[i + 1:].strip()
+    return action.strip(), ""
+
+def tokenize(detail):
+    """'pid=1 | exe="a.exe" | title="x | y"' -> {'pid': '1', 'exe': 'a.exe', 'title': 'x | y'}; first wins."""
+    return {key: quoted or bare for key, quoted, bare in reversed(_FIELD.findall("| " + detail))}
+
+def seconds(value):
+    """'12.50s' -> 12.5; None for anything else."""
+    if not value or value[-1] != "s":
+        return None
+    try:
+        return float(value[:-1])
+    except ValueError:
+        return None
+
+def parse(action):
+    """One action line -> ParsedAction; fields the line does not carry are None."""
+    event_type, detail = split_event(action)
+    if event_type == "Input events":  # JSON payload, see db.parse_input_activity
+        return ParsedAction(event_type, detail, None, None, None, None, None)
+    fields = tokenize(detail) if "=" in detail else {}
+    path = fields.get("path")
+    if path is None and event_type.startswith(("File ", "Folder ")):
+        path = detail.rsplit(" -> ", 1)[-1]  # renames: new location
+    duration = seconds(fields.get("duration") or fields.get("interval"))
+    pid = fields.get("pid")
+    return ParsedAction(event_type, detail, fields.get("exe") or None, fields.get("title"), path,
+                        duration, int(pid) if pid and pid.isdigit() else None)
+
+# --- micro-benchmark: python action_format.py [--n 200000] ---
+SAMPLES = [  # (line, the event_type parse() must give)
+    ('App focus end: pid=4312 | exe="chrome.exe" | title="GitHub | Pull requests" | path="C:/Program Files/'
+     'Google/Chrome/chrome.exe" | user="me" | session=console | monitors=2 | primary=1920x1080 | '
+     'duration=120.34s | reason=focus_switch', "App focus end"),
+    ('App focus start: pid=88 | exe="code.exe" | title="db.py - package" | path="C:/Apps/code.exe"',
+     "App focus start"),
+    ('Input summary: keys=42 | clicks=8 | scrolls=3 | moves=20 | interval=10.00s', "Input summary"),
+    ('File renamed (from: a.txt to: b.txt): C:/Users/me/Documents/a.txt -> C:/Users/me/Documents/b.txt',
+     "File renamed"),
+    ('File renamed (from: a (1).txt to: b.txt): C:/Users/me/Documents/a (1).txt -> C:/Users/me/Documents/b.txt',
+     "File renamed"),
+    ('Folder created (name: New folder (2)): C:/Users/me/Desktop/New folder (2)', "Folder created"),
+    ('File deleted (offline): C:/Users/me/Downloads/setup (3).exe', "File deleted (offline)"),
+    ('File created: C:/Users/me/Downloads/report.docx', "File created"),
+]
+
+def bench(n):
+    for line, expected in SAMPLES:
+        got = parse(line).event_type
+        if got != expected:
+            raise SystemExit(f"parse() gave {got!r}, expected {expected!r}, for: {line}")
+    lines = ([line for line, _ in SAMPLES] * (n // len(SAMPLES) + 1))[:n]
+    for name, fn in (("split_event", split_event), ("parse", parse)):
+        started = time.perf_counter()
+        for line in lines:
+            fn(line)
+        elapsed = time.perf_counter() - started
+        print(f"{name:12} {n / elapsed:>12,.0f} lines/s  ({elapsed / n * 1e6:.2f} µs/line)")
+
+if __name__ == "__main__":
+    bench(int(sys.argv[sys.argv.index("--n") + 1]) if "--n" in sys.argv else 200000)
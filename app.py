@@ -1,12 +1,67 @@
 from flask import Flask, request, jsonify, abort
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.wsgi import get_input_stream
 from functools import wraps
-import os
-from db import log_action, init_db, get_db, calculate_hash
+from argparse import Namespace
+import base64, gzip, hashlib, io, json, os, zlib
+import db
+from db import log_action, log_actions, init_db, verify_chain, get_proof, get_head
+from chain_verify import verify_parallel
+from ingest import GroupCommitIngest
+import summary_app_usage, summary_input_activity, summary_viewer
+import queue
 
 # --- Flask Setup ---
 app = Flask(__name__)
 init_db()
 
+# --- Compressed request bodies ---
+# The monitors gzip larger batches (Content-Encoding: gzip, monitor/transport.py);
+# they are inflated before Flask parses the JSON, up to AUDIT_MAX_REQUEST_MB.
+MAX_REQUEST_BYTES = int(float(os.getenv("AUDIT_MAX_REQUEST_MB", "64")) * 1024 * 1024)
+
+class GzipRequestBodies:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if environ.get("HTTP_CONTENT_ENCODING", "").strip().lower() == "gzip":
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                raw = get_input_stream(environ).read(MAX_REQUEST_BYTES + 1)  # bounded by Content-Length
+                body = inflater.decompress(raw, MAX_REQUEST_BYTES + 1)
+            except zlib.error:
+                return BadRequest("Invalid gzip request body")(environ, start_response)
+            if len(body) > MAX_REQUEST_BYTES:  # also stops decompression bombs early
+                return RequestEntityTooLarge()(environ, start_response)
+            if not inflater.eof:
+                return BadRequest("Truncated gzip request body")(environ, start_response)
+            environ["wsgi.input"] = io.BytesIO(body)
+            environ["CONTENT_LENGTH"] = str(len(body))
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = GzipRequestBodies(app.wsgi_app)
+
+# --- Async ingest (optional) ---
+# AUDIT_ASYNC_INGEST=1 answers /log and /log-batch with 202 + sequence numbers
+# and group-commits in the background every AUDIT_GROUP_COMMIT_MS.
+ASYNC_INGEST = os.getenv("AUDIT_ASYNC_INGEST", "0") == "1"
+GROUP_COMMIT_MS = float(os.getenv("AUDIT_GROUP_COMMIT_MS", "20"))
+ingest = GroupCommitIngest(window=GROUP_COMMIT_MS / 1000.0) if ASYNC_INGEST else None
+
+def enqueue_actions(actions):
+    try:
+        first, last = ingest.submit(actions)
+    except queue.Full:
+        return jsonify({"error": "Ingest queue is full; retry later"}), 503
+    return jsonify({
+        "accepted": len(actions),
+        "first_seq": first,
+        "seq": last,
+        "epoch": ingest.epoch
+    }), 202
+
 # --- Security Token Setup ---
 API_TOKEN = os.getenv("SECURE_API_TOKEN", "supersecrettoken123")
 
@@ -19,55 +74,236 @@ def require_token(f):
         return f(*args, **kwargs)
     return decorated
 
+# --- Report helpers (/summary/*) ---
+# The report routes reuse the summary scripts' aggregation (and their result
+# cache) against this server's DB.
+for _report in (summary_app_usage, summary_input_activity, summary_viewer):
+    _report.DB_FILE = db.DB_FILE
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+GZIP_MIN_BYTES = 1024
+
+def page_args():
+    limit = request.args.get("limit", PAGE_SIZE, type=int)
+    try:
+        cursor = request.args.get("cursor")
+        after = json.loads(base64.urlsafe_b64decode(cursor)) if cursor else None
+    except ValueError:
+        abort(400, description="Invalid cursor")
+    return max(1, min(limit, MAX_PAGE_SIZE)), after
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode()
+
+def report_etag(params):
+    # results only change when entries are logged, so the chain head plus the
+    # resolved parameters ("today" is a date) identify a response
+    last_id, last_hash = get_head()
+    raw = json.dumps([request.path, last_id, last_hash, params], sort_keys=True)
+    return 'W/"%s"' % hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+def conditional(params, compute):
+    """304 when the client's ETag still matches; else compute() as gzip-able JSON."""
+    etag = report_etag(params)
+    if etag in [t.strip() for t in request.headers.get("If-None-Match", "").split(",")]:
+        resp = app.response_class(status=304)
+    else:
+        try:
+            payload = compute()
+        except SystemExit as e:  # the summary scripts report bad input this way
+            return jsonify({"error": str(e)}), 400
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        resp = app.response_class(body, status=200, mimetype="application/json")
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("Accept-Encoding", ""):
+            resp.set_data(gzip.compress(body, 6))
+            resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["ETag"] = etag
+    resp.headers["Cache-Control"] = "private, no-cache"  # always revalidate; 304s are cheap
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+def keyset_page(items, sort_key, limit, after):
+    """items sorted by sort_key; the page after the `after` key, plus the next cursor."""
+    items = sorted(items, key=sort_key)
+    start = 0
+    if after is not None:
+        try:
+            start = next((n for n, i in enumerate(items) if sort_key(i) > tuple(after)), len(items))
+        except TypeError:
+            abort(400, description="Invalid cursor")
+    page = items[start:start + limit]
+    more = start + limit < len(items)
+    return page, encode_cursor(sort_key(page[-1])) if more else None
+
 # --- Routes ---
 
 @app.route('/log', methods=['POST'])
 @require_token
 def log_event():
     data = request.get_json()
-    action = data.get("action")
-    if not action:
-        return jsonify({"error": "Missing 'action' field"}), 400
+    action = data.get("action") if isinstance(data, dict) else None
+    if not isinstance(action, str) or not action.strip():
+        return jsonify({"error": "Missing or invalid 'action' field; expected non-empty string"}), 400
+    if ingest:
+        return enqueue_actions([action])
     result = log_action(action)
     return jsonify(result), 201
 
 @app.route('/verify', methods=['GET'])
 @require_token
 def verify_logs():
-    conn = get_db()
-    logs = conn.execute("SELECT * FROM audit_logs ORDER BY id ASC").fetchall()
-
-    for i in range(1, len(logs)):
-        expected_hash = calculate_hash(
-            logs[i-1]["hash"], logs[i]["timestamp"], logs[i]["action"]
-        )
-        if logs[i]["hash"] != expected_hash:
-            return jsonify({
-                "status": "FAILED",
-                "message": f"Tampering detected at entry ID {logs[i]['id']}"
-            }), 200
+    # ?full=1 rehashes everything; ?mode=parallel does the same across all cores;
+    # ?from=/?to= check an id range; otherwise only entries appended since the
+    # last checkpoint are checked
+    if request.args.get("mode") == "parallel":
+        workers = request.args.get("workers", type=int)
+        if workers is not None:  # one process per core at most, whatever the caller asks for
+            workers = max(1, min(workers, os.cpu_count() or 1))
+        result = verify_parallel(workers=workers)
+    else:
+        full = request.args.get("full", "").lower() in ("1", "true", "yes")
+        from_id = request.args.get("from", type=int)
+        to_id = request.args.get("to", type=int)
+        result = verify_chain(from_id=from_id, to_id=to_id, full=full)
+
+    if not result["ok"]:
+        return jsonify({
+            "status": "FAILED",
+            "message": f"Tampering detected at entry ID {result['bad_id']}",
+            "mode": result["mode"],
+            "checked": result["checked"]
+        }), 200
 
     return jsonify({
         "status": "SUCCESS",
-        "message": "All logs are intact and verified."
+        "message": "All logs are intact and verified." if result["mode"] in ("full", "parallel")
+                   else "Checked logs are intact and verified.",
+        "mode": result["mode"],
+        "checked": result["checked"],
+        "from_id": result["first_id"],
+        "to_id": result["last_id"]
     }), 200
 
 @app.route('/log-batch', methods=['POST'])
 @require_token
 def log_batch():
     data = request.get_json()
-    actions = data.get("actions")
+    actions = data.get("actions") if isinstance(data, dict) else None
     if not isinstance(actions, list) or not actions:
         return jsonify({"error": "Missing or invalid 'actions' field; expected non-empty list"}), 400
 
-    results = []
-    for action in actions:
-        if not isinstance(action, str) or not action.strip():
-            # Skip bad items but continue processing others
-            continue
-        results.append(log_action(action.strip()))
+    # Skip bad items but continue processing others
+    valid = [a.strip() for a in actions if isinstance(a, str) and a.strip()]
+    if ingest and valid:
+        return enqueue_actions(valid)
+    results = log_actions(valid) if valid else []
     return jsonify({"logged": results, "count": len(results)}), 201
 
+@app.route('/durable-watermark', methods=['GET'])
+@require_token
+def durable_watermark():
+    if not ingest:
+        return jsonify({"error": "Async ingest is disabled; writes are durable when acknowledged"}), 404
+    return jsonify({
+        "epoch": ingest.epoch,
+        "durable_seq": ingest.durable_seq,
+        "assigned_seq": ingest.assigned_seq,
+        "failed_seqs": sorted(ingest.failed)
+    }), 200
+
+@app.route('/status/<int:seq>', methods=['GET'])
+@require_token
+def ingest_status(seq):
+    if not ingest:
+        return jsonify({"error": "Async ingest is disabled; writes are durable when acknowledged"}), 404
+    return jsonify({
+        "epoch": ingest.epoch,
+        "seq": seq,
+        "state": ingest.status(seq),
+        "error": ingest.failed.get(seq),
+        "durable_seq": ingest.durable_seq
+    }), 200
+
+@app.route('/proof/<int:entry_id>', methods=['GET'])
+@require_token
+def entry_proof(entry_id):
+    # Merkle inclusion proof; check it offline with `python merkle.py proof.json`
+    proof = get_proof(entry_id)
+    if proof is None:
+        return jsonify({"error": f"No entry with ID {entry_id}"}), 404
+    if proof["block"] is None:
+        return jsonify({"error": f"Entry ID {entry_id} is not yet anchored in a Merkle block"}), 409
+    return jsonify(proof), 200
+
+@app.route('/summary/apps', methods=['GET'])
+@require_token
+def summary_apps():
+    # ?since=&until=&by=exe|exe+title, most used first; same totals as summary_app_usage.py
+    since = summary_app_usage.resolve_relative(request.args.get("since"))
+    until = summary_app_usage.resolve_relative(request.args.get("until"))
+    by = request.args.get("by", "exe")
+    if by not in ("exe", "exe+title"):
+        return jsonify({"error": "by must be 'exe' or 'exe+title'"}), 400
+    limit, after = page_args()
+
+    def compute():
+        totals = summary_app_usage.app_totals(since, until, by)
+        items = [dict(zip(("exe", "title"), key.split(" | ", 1)) if by == "exe+title" else {"exe": key}, **v)
+                 for key, v in totals.items()]
+        page, cursor = keyset_page(items, lambda i: (-i["seconds"], i["exe"], i.get("title", "")), limit, after)
+        return {"since": since, "until": until, "by": by, "items": page, "next_cursor": cursor}
+    return conditional([since, until, by, limit, after], compute)
+
+@app.route('/summary/input', methods=['GET'])
+@require_token
+def summary_input():
+    # ?since=&until=&bucket=minute|hour|day, oldest bucket first; same sums as summary_input_activity.py
+    since = summary_input_activity.resolve_relative(request.args.get("since"))
+    until = summary_input_activity.resolve_relative(request.args.get("until"))
+    bucket = request.args.get("bucket", "hour")
+    if bucket not in summary_input_activity.BUCKET_US:
+        return jsonify({"error": "bucket must be 'minute', 'hour' or 'day'"}), 400
+    limit, after = page_args()
+
+    def compute():
+        rows, _ = summary_input_activity.finish(summary_input_activity.activity_sums(since, until, bucket))
+        items = [dict(zip(("bucket_start", "keys", "clicks", "scrolls", "moves", "interval_s"), r)) for r in rows]
+        page, cursor = keyset_page(items, lambda i: (i["bucket_start"],), limit, after)
+        return {"since": since, "until": until, "bucket": bucket, "items": page, "next_cursor": cursor}
+    return conditional([since, until, bucket, limit, after], compute)
+
+@app.route('/summary/events', methods=['GET'])
+@require_token
+def summary_events():
+    # summary_viewer.py filters (?since=&until=&type=&contains=&query=); entries newest first,
+    # or ?group=type|path for counts, most frequent first
+    args = Namespace(since=request.args.get("since"), until=request.args.get("until"),
+                     atype=request.args.get("type"), contains=request.args.get("contains"),
+                     query=request.args.get("query"), no_cache=False, explain=False)
+    group = request.args.get("group")
+    if group not in (None, "type", "path"):
+        return jsonify({"error": "group must be 'type' or 'path'"}), 400
+    limit, after = page_args()
+    if after is not None and not group and not (isinstance(after, list) and len(after) == 2):
+        abort(400, description="Invalid cursor")
+
+    def compute():
+        if group:
+            items = [{"item": item, "count": n} for item, n in summary_viewer.group_counts(args, by=group)]
+            page, cursor = keyset_page(items, lambda i: (-i["count"], i["item"] or ""), limit, after)
+            return {"group": group, "items": page, "next_cursor": cursor}
+        rows = summary_viewer.fetch_page(args, limit + 1, before=after)
+        items = []
+        for log_id, timestamp, action in rows[:limit]:
+            action_type, detail = summary_viewer.split_action(action)
+            items.append({"id": log_id, "timestamp": timestamp, "action_type": action_type, "detail": detail})
+        cursor = encode_cursor([items[-1]["timestamp"], items[-1]["id"]]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": cursor}
+    params = [summary_viewer.resolve_relative(args.since), summary_viewer.resolve_relative(args.until),
+              args.atype, args.contains, args.query, group, limit, after]
+    return conditional(params, compute)
+
 if __name__ == '__main__':
     init_db()  # Ensure DB is initialized before starting the app
     app.run(debug=True)
@@ -0,0 +1 @@
+# Benchmarks for the audit server and summary tools; see bench/run.py.
@@ -0,0 +1,54 @@
+import argparse, json
+
+# python -m bench.compare old.json new.json [--threshold 10]
+#
+# Lines up the metrics of two bench/run.py result files and flags the ones
+# that got worse by more than --threshold percent (exit status 1 if any did).
+
+def metrics(results):
+    """{name: (value, higher_is_better)} for one results file."""
+    out = {}
+    ingest = results.get("ingest")
+    if ingest:
+        out["ingest /log rows/s"] = (ingest["log"]["rows_per_sec"], True)
+        for b in ingest["log_batch"]:
+            out[f"ingest /log-batch x{b['batch']} rows/s"] = (b["rows_per_sec"], True)
+    for size in results["sizes"]:
+        rows = f"{size['rows']:,}"
+        if not size["build"].get("reused"):
+            out[f"{rows} build rows/s"] = (size["build"]["rows_per_sec"], True)
+        for name, v in size.get("verify", {}).items():
+            out[f"{rows} verify {name} s"] = (v["median_s"], False)
+        for r in size.get("reports", []):
+            out[f"{rows} {r['script']} {r['args']} range={r['range']} {r['mode']} s"] = (r["median_s"], False)
+    return out
+
+def main():
+    p = argparse.ArgumentParser(description="Compare two benchmark result files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent (default 10)")
+    args = p.parse_args()
+    with open(args.old, "r", encoding="utf-8") as f:
+        old = metrics(json.load(f))
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = metrics(json.load(f))
+
+    regressions = 0
+    width = max((len(k) for k in new), default=10)
+    print(f"{'Metric':<{width}}  {'Old':>12}  {'New':>12}  {'Change':>8}")
+    for name, (value, higher_better) in new.items():
+        if name not in old or not old[name][0]:
+            continue
+        before = old[name][0]
+        change = (value - before) / before * 100
+        worse = -change if higher_better else change
+        flag = ""
+        if worse > args.threshold:
+            flag, regressions = "  REGRESSION", regressions + 1
+        print(f"{name:<{width}}  {before:>12.4g}  {value:>12.4g}  {change:>+7.1f}%{flag}")
+    print(f"\n{regressions} regression(s) over {args.threshold:g}%")
+    raise SystemExit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse, json, os, platform, sqlite3, subprocess, sys, tempfile, time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Benchmark runner:
+#
+#   python -m bench.run --rows 10000,1000000 --out results.json
+#
+# Builds (or reuses) one synthetic DB per --rows size under --work, then
+# times /log and /log-batch on a fresh DB, /verify against each size and the
+# summary scripts at several range widths. Results go to a JSON file; compare
+# two of them with `python -m bench.compare old.json new.json`.
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Audit log benchmarks")
+    p.add_argument("--rows", default="10000", help="Comma-separated DB sizes (default 10000; up to 50M)")
+    p.add_argument("--users", type=int, default=10, help="Simulated desktops logging to the server (default 10)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--phases", default="ingest,verify,reports", help="Subset of ingest,verify,reports")
+    p.add_argument("--work", default=os.path.join(tempfile.gettempdir(), "audit-bench"),
+                   help="Where generated DBs are kept and reused between runs")
+    p.add_argument("--rebuild", action="store_true", help="Regenerate DBs even if --work has them")
+    p.add_argument("--log-requests", type=int, default=1000, help="Single-entry /log requests to time")
+    p.add_argument("--batch-sizes", default="10,100,1000", help="/log-batch sizes to time")
+    p.add_argument("--batch-rows", type=int, default=10000, help="Entries sent per /log-batch size")
+    p.add_argument("--widths", default="1h,1d,7d,all", help="Report ranges ending at the newest entry")
+    p.add_argument("--repeat", type=int, default=3, help="Timed runs per measurement")
+    p.add_argument("--out", metavar="FILE", help="Results file (default bench-<time>.json)")
+    return p.parse_args()
+
+def git_commit():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True)
+        return rev.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_phase(phase, db_file, params):
+    proc = subprocess.run([sys.executable, "-m", "bench.worker", phase, db_file, json.dumps(params)],
+                          cwd=ROOT, stdout=subprocess.PIPE, text=True)  # progress and errors go to stderr
+    if proc.returncode:
+        raise SystemExit(f"{phase} phase failed (exit status {proc.returncode})")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def ensure_db(args, rows):
+    """The generated DB for this size (built on first use) and its build stats."""
+    folder = os.path.join(args.work, f"rows{rows}-seed{args.seed}-users{args.users}")
+    meta = os.path.join(folder, "build.json")
+    if os.path.exists(meta) and not args.rebuild:
+        with open(meta, "r", encoding="utf-8") as f:
+            return os.path.join(folder, "logs.db"), dict(json.load(f), reused=True)
+    if os.path.exists(folder):
+        for name in os.listdir(folder):
+            os.remove(os.path.join(folder, name))
+    os.makedirs(folder, exist_ok=True)
+    db_file = os.path.join(folder, "logs.db")
+    print(f"build: {rows:,} rows", file=sys.stderr)
+    stats = run_phase("build", db_file, {"rows": rows, "seed": args.seed, "users": args.users})
+    with open(meta, "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+    return db_file, dict(stats, reused=False)
+
+def main():
+    args = parse_args()
+    phases = set(args.phases.split(","))
+    sizes = [int(float(n)) for n in args.rows.split(",")]
+    results = {
+        "meta": {
+            "started": datetime.utcnow().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "env": {k: v for k, v in os.environ.items() if k.startswith("AUDIT_")},
+            "args": vars(args),
+        },
+        "sizes": [],
+    }
+    started = time.perf_counter()
+    if "ingest" in phases:
+        print("ingest: /log and /log-batch", file=sys.stderr)
+        with tempfile.TemporaryDirectory() as tmp:
+            results["ingest"] = run_phase("ingest", os.path.join(tmp, "logs.db"), {
+                "log_requests": args.log_requests, "batch_rows": args.batch_rows,
+                "batch_sizes": [int(b) for b in args.batch_sizes.split(",")],
+                "seed": args.seed, "users": args.users})
+    for rows in sizes:
+        if not phases & {"verify", "reports"}:
+            break
+        db_file, build = ensure_db(args, rows)
+        size = {"rows": rows, "build": build}
+        if "verify" in phases:
+            print(f"verify: {rows:,} rows", file=sys.stderr)
+            size["verify"] = run_phase("verify", db_file, {"repeat": args.repeat})
+        if "reports" in phases:
+            print(f"reports: {rows:,} rows", file=sys.stderr)
+            size["reports"] = run_phase("reports", db_file, {
+                "last_ts": build["last_ts"], "widths": args.widths.split(","), "repeat": args.repeat})
+        results["sizes"].append(size)
+    results["meta"]["seconds"] = round(time.perf_counter() - started, 1)
+
+    out = args.out or f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
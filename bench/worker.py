@@ -0,0 +1,120 @@
+import contextlib, io, json, os, statistics, sys, time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+
+# One benchmark phase against one DB, in its own process so every phase starts
+# with a fresh chain writer, connection pools and page cache state of its own:
+#
+#   python -m bench.worker build|ingest|verify|reports <db_file> '<json params>'
+#
+# Prints the phase's results as one JSON line; bench/run.py collects them.
+
+WIDTHS = {"h": 3600, "d": 86400}
+
+def _stats(samples):
+    samples = sorted(samples)
+    return {"runs": len(samples), "min_s": round(samples[0], 6), "median_s": round(statistics.median(samples), 6),
+            "p95_s": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 6)}
+
+def _client():
+    import app  # opens db.DB_FILE, which the caller has set
+    return app.app.test_client(), {"Authorization": f"Bearer {app.API_TOKEN}"}
+
+def build(params):
+    from bench.workload import build
+
+    def progress(done, total):
+        print(f"\r  {done:,} / {total:,}", end="" if done < total else "\n", file=sys.stderr, flush=True)
+    return build(db.DB_FILE, params["rows"], seed=params["seed"], users=params["users"], progress=progress)
+
+def ingest(params):
+    from bench.workload import generate
+    client, headers = _client()
+    n = params["log_requests"]
+    actions = [a for _, a in generate(n + params["batch_rows"] * len(params["batch_sizes"]), seed=params["seed"],
+                                      users=params["users"])]
+    out = {}
+    samples = []
+    for action in actions[:n]:
+        started = time.perf_counter()
+        r = client.post("/log", json={"action": action}, headers=headers)
+        samples.append(time.perf_counter() - started)
+        if r.status_code not in (201, 202):
+            raise SystemExit(f"/log answered {r.status_code}: {r.get_data(as_text=True)}")
+    out["log"] = dict(_stats(samples), rows=n, rows_per_sec=round(n / sum(samples), 1))
+    out["log_batch"] = []
+    pos = n
+    for size in params["batch_sizes"]:
+        samples, rows = [], actions[pos:pos + params["batch_rows"]]
+        pos += len(rows)
+        for i in range(0, len(rows), size):
+            started = time.perf_counter()
+            r = client.post("/log-batch", json={"actions": rows[i:i + size]}, headers=headers)
+            samples.append(time.perf_counter() - started)
+            if r.status_code not in (201, 202):
+                raise SystemExit(f"/log-batch answered {r.status_code}: {r.get_data(as_text=True)}")
+        out["log_batch"].append(dict(_stats(samples), batch=size, rows=len(rows),
+                                     rows_per_sec=round(len(rows) / sum(samples), 1)))
+    return out
+
+def verify(params):
+    client, headers = _client()
+    rows = db.get_head()[0]
+    out = {}
+    for name, query in (("full", "full=1"), ("parallel", "mode=parallel")):
+        samples = []
+        for _ in range(params["repeat"]):
+            started = time.perf_counter()
+            body = client.get(f"/verify?{query}", headers=headers).get_json()
+            samples.append(time.perf_counter() - started)
+            if body["status"] != "SUCCESS":
+                raise SystemExit(f"/verify?{query}: {body}")
+        out[name] = dict(_stats(samples), rows=rows, rows_per_sec=round(rows / min(samples), 1))
+    return out
+
+REPORTS = [
+    ("summary_app_usage", ["--by", "exe"]),
+    ("summary_app_usage", ["--by", "exe+title"]),
+    ("summary_input_activity", ["--bucket", "hour"]),
+    ("summary_viewer", ["--group", "type"]),
+    ("summary_viewer", ["--group", "path"]),
+]
+
+def _run_script(module, argv):
+    saved = sys.argv
+    sys.argv = [module.__file__] + argv
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            module.main()
+            return time.perf_counter() - started
+    finally:
+        sys.argv = saved
+
+def reports(params):
+    import importlib
+    last = datetime.fromisoformat(params["last_ts"])
+    out = []
+    for name, argv in REPORTS:
+        module = importlib.import_module(name)
+        module.DB_FILE = db.DB_FILE
+        for width in params["widths"]:
+            since = [] if width == "all" else \
+                ["--since", (last - timedelta(seconds=int(width[:-1]) * WIDTHS[width[-1]])).isoformat(timespec="seconds")]
+            modes = [("cold", ["--no-cache"]), ("warm", [])]
+            if name != "summary_viewer":
+                modes.append(("raw", ["--raw"]))
+            for mode, extra in modes:
+                if mode == "warm":
+                    _run_script(module, argv + since)  # prime the result cache
+                samples = [_run_script(module, argv + since + extra) for _ in range(params["repeat"])]
+                out.append(dict(_stats(samples), script=name, args=" ".join(argv), range=width, mode=mode))
+    return out
+
+PHASES = {"build": build, "ingest": ingest, "verify": verify, "reports": reports}
+
+if __name__ == "__main__":
+    phase, db.DB_FILE, params = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+    print(json.dumps(PHASES[phase](params)))
@@ -0,0 +1,258 @@
+import json, os, random, sys, time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+
+# Synthetic audit traffic in the exact line formats the monitors send:
+#
+#   input_summary_logger   "Input summary: ..." + "Input events: {json}" per flush
+#   app_usage_tracker      focus start/end pairs (fmt_detail), lock/unlock,
+#                          logon/logoff, USB events
+#   file_watcher           file/folder created, modified, deleted, renamed
+#
+# Simulated users work weekday office hours; time advances in the input
+# logger's 10-second flush ticks and every tick's lines are logged in
+# timestamp order, as the server would see them from several desktops.
+
+TICK = 10.0  # input_summary_logger.FLUSH_INTERVAL_SEC
+START = datetime(2025, 1, 6, 8, 0)  # a Monday
+WORKDAY = (8, 18)
+
+APPS = [  # exe, path, titles
+    ("chrome.exe", "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe",
+     ["GitHub | Pull requests", "Inbox (3) - mail", "Stack Overflow - Where Developers Learn", "YouTube",
+      "Jira | Board", 'Search "quarterly report" - Google']),
+    ("Code.exe", "C:\\Users\\{user}\\AppData\\Local\\Programs\\Microsoft VS Code\\Code.exe",
+     ["db.py - package - Visual Studio Code", "app.py - package - Visual Studio Code", "README.md - package"]),
+    ("OUTLOOK.EXE", "C:\\Program Files\\Microsoft Office\\root\\Office16\\OUTLOOK.EXE",
+     ["Inbox - {user}@corp.example - Outlook", "Calendar - Outlook", "RE: Budget | Q3 - Message (HTML)"]),
+    ("Teams.exe", "C:\\Users\\{user}\\AppData\\Local\\Microsoft\\Teams\\current\\Teams.exe",
+     ["Chat | Microsoft Teams", "Meeting with Finance | Microsoft Teams"]),
+    ("EXCEL.EXE", "C:\\Program Files\\Microsoft Office\\root\\Office16\\EXCEL.EXE",
+     ["budget-2025.xlsx - Excel", "timesheet.xlsx - Excel"]),
+    ("explorer.exe", "C:\\Windows\\explorer.exe", ["Downloads", "Documents", "This PC"]),
+    ("WindowsTerminal.exe", "C:\\Program Files\\WindowsApps\\Microsoft.WindowsTerminal\\WindowsTerminal.exe",
+     ["Windows PowerShell", "python app.py"]),
+]
+FOLDERS = ["Documents", "Downloads", "Desktop", "Documents\\Projects\\package", "Pictures"]
+FILES = ["report.docx", "notes.txt", "budget-2025.xlsx", "db.py", "photo.jpg", "setup.exe", "data.csv"]
+KEYS = list("etaoinshrdlu") + ["space", "enter", "backspace", "shift", "ctrl_l", "tab"]
+BUTTONS = ["left", "left", "left", "right", "middle"]
+
+def fmt_detail(pid, exe, title, path, username="", session_type="", monitors=""):
+    # same as monitor/app_usage_tracker.fmt_detail (which needs pywin32 to import)
+    parts = [f"pid={pid}", f'exe="{exe}"', f'title="{title}"', f'path="{path}"']
+    if username:     parts.append(f'user="{username}"')
+    if session_type: parts.append(f"session={session_type}")
+    if monitors:     parts.append(monitors)
+    return " | ".join(parts)
+
+def _ms(t):
+    return t.isoformat(timespec="milliseconds")
+
+class User:
+    def __init__(self, n, rng):
+        self.rng = rng
+        self.name = f"user{n:03d}"
+        self.session = rng.choice(["console", "console", "remote"])
+        self.monitors = rng.choice(["", "monitors=1 | primary=1920x1080", "monitors=2 | primary=2560x1440"])
+        self.focus = None  # (pid, exe, title, path, since)
+        self.locked = False
+        self.logged_on = False
+
+    def _app(self):
+        exe, path, titles = self.rng.choice(APPS)
+        title = self.rng.choice(titles).replace("{user}", self.name)
+        return self.rng.randint(400, 30000), exe, title, path.replace("{user}", self.name)
+
+    def _detail(self, pid, exe, title, path):
+        return fmt_detail(pid, exe, title, path, self.name, self.session, self.monitors)
+
+    def _focus_start(self, t, tag="App focus start"):
+        pid, exe, title, path = self._app()
+        self.focus = (pid, exe, title, path, t)
+        return t, f"{tag}: {self._detail(pid, exe, title, path)}"
+
+    def _focus_end(self, t, reason):
+        pid, exe, title, path, since = self.focus
+        self.focus = None
+        dur = (t - since).total_seconds()
+        return t, f"App focus end: {self._detail(pid, exe, title, path)} | duration={dur:.2f}s | reason={reason}"
+
+    def _input(self, t):
+        rng = self.rng
+        counts = {"keys": int(rng.expovariate(1 / 25)), "clicks": rng.randint(0, 8),
+                  "scrolls": rng.randint(0, 12) if rng.random() < 0.4 else 0,
+                  "moves": int(rng.expovariate(1 / 60))}
+        started = t - timedelta(seconds=TICK)
+        # ticks start on a 10-second boundary, so every event time in the
+        # window shares started's "YYYY-MM-DDTHH:MM:" prefix
+        prefix, sec = started.isoformat()[:17], started.second
+        events = []
+        for kind, n in counts.items():
+            for off in rng.choices(range(int(TICK * 1000)), k=n):
+                at = f"{prefix}{sec + off // 1000:02d}.{off % 1000:03d}"
+                if kind == "keys":
+                    events.append({"t": at, "e": "key", "k": rng.choice(KEYS)})
+                elif kind == "clicks":
+                    events.append({"t": at, "e": "click", "b": rng.choice(BUTTONS)})
+                elif kind == "scrolls":
+                    events.append({"t": at, "e": "scroll", "dx": 0, "dy": rng.choice((-1, 1))})
+                else:
+                    events.append({"t": at, "e": "move"})
+        events.sort(key=lambda e: e["t"])
+        interval = TICK + rng.random() * 0.05
+        payload = {"window": {"start": _ms(started), "end": _ms(t), "seconds": round(interval, 3)},
+                   "counts": counts, "events": events[-400:]}  # MAX_EVENTS_PER_FLUSH
+        return [(t, f'Input summary: keys={counts["keys"]} | clicks={counts["clicks"]} | '
+                    f'scrolls={counts["scrolls"]} | moves={counts["moves"]} | interval={interval:.2f}s'),
+                (t, "Input events: " + json.dumps(payload, separators=(",", ":")))]
+
+    def _files(self, t):
+        rng = self.rng
+        base = f"C:\\Users\\{self.name}\\" + rng.choice(FOLDERS)
+        out = []
+        for i in range(1 if rng.random() < 0.8 else rng.randint(5, 60)):  # single saves, or a burst
+            at = t - timedelta(seconds=0.01 + rng.random() * (TICK - 0.02))  # within this tick
+            name = rng.choice(FILES)
+            path = f"{base}\\{name}"
+            r = rng.random()
+            if r < 0.45:
+                out.append((at, f"File modified: {path}"))
+            elif r < 0.7:
+                out.append((at, f"File created: {path}"))
+            elif r < 0.85:
+                out.append((at, f"File deleted: {path}"))
+            elif r < 0.95:
+                new = f"copy-{i}-{name}"
+                out.append((at, f"File renamed (from: {name} to: {new}): {path} -> {base}\\{new}"))
+            else:
+                folder = f"New folder ({i})"
+                out.append((at, f"Folder created (name: {folder}): {base}\\{folder}"))
+        return out
+
+    def tick(self, t):
+        """Entries for the 10 seconds ending at t."""
+        rng = self.rng
+        out = []
+        if not _working(t):
+            if self.logged_on:
+                self.logged_on = False
+                if self.focus:
+                    out.append(self._focus_end(t, "shutdown"))
+                out.append((t, f'Session logoff: time={t:%m/%d/%y %H:%M:%S} | source=Security | '
+                               f'user="{self.name}" | event=4634'))
+            return out
+        if not self.logged_on:
+            self.logged_on = True
+            out.append((t, f'Session logon: time={t:%m/%d/%y %H:%M:%S} | source=Security | '
+                           f'user="{self.name}" | event=4624'))
+            out.append(self._focus_start(t + timedelta(milliseconds=1)))
+        if self.locked:
+            if rng.random() < 0.05:
+                self.locked = False
+                out.append((t, f"Session unlocked: session_id={rng.randint(1, 4)}"))
+                out.append(self._focus_start(t, "App focus start (after unlock)"))
+            return out
+        if rng.random() < 0.0015:
+            self.locked = True
+            if self.focus:
+                out.append(self._focus_end(t, "session_lock"))
+            out.append((t, f"Session locked: session_id={rng.randint(1, 4)}"))
+            return out
+        if rng.random() < 0.7:  # the logger skips idle windows
+            out.extend(self._input(t))
+        if rng.random() < 0.1:
+            if self.focus:
+                out.append(self._focus_end(t, rng.choice(("focus_switch",) * 4 + ("title_change",))))
+            out.append(self._focus_start(t + timedelta(milliseconds=5)))
+        if rng.random() < 0.03:
+            out.extend(self._files(t))
+        if rng.random() < 0.0002:
+            drive = rng.choice("DEF")
+            out.append((t, f"USB volume {rng.choice(('arrived', 'removed'))}: drive={drive}:"))
+        return out
+
+def _working(t):
+    return t.weekday() < 5 and WORKDAY[0] <= t.hour < WORKDAY[1]
+
+def _next_workday(t):
+    t = t.replace(hour=WORKDAY[0], minute=0, second=0, microsecond=0)
+    while True:
+        t += timedelta(days=1)
+        if t.weekday() < 5:
+            return t
+
+def generate(n, seed=0, users=10, start=START):
+    """Yields n (timestamp, action) pairs from `users` simulated desktops, oldest first."""
+    rng = random.Random(seed)
+    people = [User(i, random.Random(rng.random())) for i in range(users)]
+    t, emitted = start, 0
+    while emitted < n:
+        t += timedelta(seconds=TICK)
+        if not _working(t) and not any(u.logged_on for u in people):
+            t = _next_workday(t)  # nothing is logged overnight or at weekends
+        batch = []
+        for u in people:
+            batch.extend(u.tick(t))
+        batch.sort(key=lambda e: e[0])
+        for entry in batch[:n - emitted]:
+            yield entry
+        emitted += len(batch)
+
+class Clock:
+    """Stands in for db.utcnow so appended entries carry the generated timestamps."""
+    def __init__(self):
+        self.pending = []
+
+    def __call__(self):
+        return self.pending.pop()
+
+def build(path, n, seed=0, users=10, batch=2000, progress=None):
+    """
+    Fills a new audit DB at path with n generated entries through db.log_actions
+    (same hashing, sharding and rollups as live ingest). Returns build stats.
+    """
+    if os.path.exists(path):
+        raise SystemExit(f"{path} already exists")
+    db.DB_FILE = path
+    db.init_db()
+    clock, real = Clock(), db.utcnow
+    db.utcnow = clock
+    started, done, chunk = time.perf_counter(), 0, []
+    first = last = None
+    try:
+        for ts, action in generate(n, seed, users):
+            chunk.append((ts, action))
+            if len(chunk) == batch:
+                done += _append(clock, chunk)
+                first = first or chunk[0][0]
+                last = chunk[-1][0]
+                chunk = []
+                if progress:
+                    progress(done, n)
+        if chunk:
+            done += _append(clock, chunk)
+            first = first or chunk[0][0]
+            last = chunk[-1][0]
+            if progress:
+                progress(done, n)
+    finally:
+        db.utcnow = real
+    elapsed = time.perf_counter() - started
+    return {"rows": done, "seed": seed, "users": users, "seconds": round(elapsed, 3),
+            "rows_per_sec": round(done / elapsed, 1) if elapsed else None,
+            "first_ts": first and first.isoformat(), "last_ts": last and last.isoformat(),
+            "bytes": sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(os.path.dirname(os.path.abspath(path)))
+                         for f in fs)}
+
+def _append(clock, chunk):
+    clock.pending = [ts for ts, _ in reversed(chunk)]
+    db.log_actions([action for _, action in chunk])
+    return len(chunk)
+
+if __name__ == "__main__":
+    # python bench/workload.py [N]: print N sample lines
+    for ts, action in generate(int(sys.argv[1]) if len(sys.argv) > 1 else 20, seed=1, users=2):
+        print(ts.isoformat(), action[:160])
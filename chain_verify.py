@@ -0,0 +1,106 @@
+import argparse, os, time
+from concurrent.futures import ProcessPoolExecutor
+
+import db
+
+# Each entry stores its own prev_hash, so disjoint id ranges can be rehashed
+# independently; afterwards we only have to check that the ranges join up.
+
+def plan_ranges(min_id, max_id, segments):
+    span = max_id - min_id + 1
+    size = max(1, -(-span // segments))  # ceil division
+    return [(lo, min(lo + size - 1, max_id)) for lo in range(min_id, max_id + 1, size)]
+
+def _check_segment(task):
+    path, readonly, profile, lo, hi = task
+    conn = db.open_connection(path, profile, readonly=readonly)
+    try:
+        return db.check_range(conn, lo, hi)
+    finally:
+        conn.close()
+
+def plan_tasks(segments, profile):
+    """Split every shard's id range into segments, proportional to its size."""
+    extents = []
+    with db.get_db() as meta:
+        shards = db.list_shards(meta)
+    for shard in shards:
+        path, readonly = db.shard_path(shard)
+        with db.get_db(path, readonly) as conn:
+            b = conn.execute("SELECT MIN(id) AS lo, MAX(id) AS hi FROM audit_logs").fetchone()
+        if b['lo'] is not None:
+            extents.append((path, readonly, b['lo'], b['hi']))
+    total = sum(hi - lo + 1 for _, _, lo, hi in extents)
+    tasks = []
+    for path, readonly, lo, hi in extents:
+        n = max(1, round(segments * (hi - lo + 1) / total))
+        tasks += [(path, readonly, profile, a, b) for a, b in plan_ranges(lo, hi, n)]
+    return tasks
+
+def verify_parallel(workers=None, segments=None, profile=None):
+    """
+    Full-chain verification across a process pool. Every worker streams its
+    id range through a cursor, so memory stays flat regardless of log size.
+    Returns the same result dict as db.verify_chain (mode="parallel").
+    """
+    profile = profile or db.DB_PROFILE
+    workers = workers or os.cpu_count() or 1
+    segments = segments or workers * 4  # a few per worker evens out uneven ranges
+
+    tasks = plan_tasks(segments, profile)
+    result = {"mode": "parallel", "ok": True, "bad_id": None, "checked": 0,
+              "first_id": tasks[0][3] if tasks else None,
+              "last_id": tasks[-1][4] if tasks else None, "last_hash": None}
+    if not tasks:
+        return result
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_check_segment, tasks))
+
+    # Join the segments: each must start from the hash the previous one ended on
+    # (this also checks that every shard continues the previous shard's chain)
+    bad_ids = []
+    prev = None
+    for part in parts:
+        result["checked"] += part["checked"]
+        if not part["ok"]:
+            bad_ids.append(part["bad_id"])
+        if part["first_id"] is None:
+            continue  # id gap covering the whole segment
+        if prev is not None and prev["ok"] and part["first_prev_hash"] != prev["last_hash"]:
+            bad_ids.append(part["first_id"])
+        prev = part
+
+    if bad_ids:
+        result["ok"] = False
+        result["bad_id"] = min(bad_ids)
+        result["last_id"] = None
+        return result
+
+    result["last_hash"] = prev["last_hash"]
+    db.save_checkpoint(result["last_id"], result["last_hash"])
+    return result
+
+def main():
+    p = argparse.ArgumentParser(description="Full audit chain verification using all CPU cores")
+    p.add_argument("--db", default=db.DB_FILE, help=f"SQLite file (default {db.DB_FILE})")
+    p.add_argument("--workers", type=int, default=0, help="Worker processes (default: CPU count)")
+    p.add_argument("--segments", type=int, default=0, help="Id ranges to split into (default: 4 per worker)")
+    args = p.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"DB not found: {args.db}")
+    db.DB_FILE = args.db
+
+    started = time.perf_counter()
+    result = verify_parallel(workers=args.workers or None, segments=args.segments or None)
+    elapsed = time.perf_counter() - started
+
+    if result["ok"]:
+        print(f"✅ Chain intact: {result['checked']} entries verified in {elapsed:.2f}s")
+    else:
+        print(f"❌ Tampering detected at entry ID {result['bad_id']} ({elapsed:.2f}s)")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import json, os
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import islice
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; only the --export-parquet options need it
+    pa = pq = None
+
+# Day-partitioned Parquet datasets for the summary tools' --export-parquet.
+#
+#   out_dir/day=2026-10-01/part-000000001234.parquet
+#   out_dir/_export_state.json        {"last_id": ..., "columns": [...]}
+#
+# Every run appends only entries with an id above the recorded last_id, as
+# new part files, so re-running an export is cheap. Readers get typed
+# columns (pq.read_table(out_dir, columns=[...]) reads just those) with the
+# "day" partition as an extra column.
+
+STATE_FILE = "_export_state.json"
+CHUNK = 5000  # rows per record batch / row group
+
+def _types():
+    return {
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "string": pa.string(),
+        "dictionary": pa.dictionary(pa.int32(), pa.string()),
+        "timestamp": pa.timestamp("us"),  # int64 microseconds, naive UTC like the log
+    }
+
+def require():
+    if pa is None:
+        raise SystemExit("Parquet export needs pyarrow (pip install pyarrow)")
+
+def _read_state(out_dir):
+    try:
+        with open(os.path.join(out_dir, STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def last_exported_id(out_dir, columns):
+    """Highest id already in the dataset at out_dir (0 for a new one)."""
+    state = _read_state(out_dir)
+    if state is None:
+        return 0
+    if state["columns"] != [list(c) for c in columns]:
+        raise SystemExit(f"{out_dir} holds a different export; pick another directory")
+    return state["last_id"]
+
+def _timestamps(values):
+    try:
+        return pa.array(values, pa.string()).cast(pa.timestamp("us"))
+    except pa.ArrowInvalid:
+        pass
+    # client-side times (input windows) may carry a UTC offset; store them as UTC
+    out = []
+    for v in values:
+        t = datetime.fromisoformat(v) if v else None
+        if t is not None and t.tzinfo is not None:
+            t = t.astimezone(timezone.utc).replace(tzinfo=None)
+        out.append(t)
+    return pa.array(out, pa.timestamp("us"))
+
+def _batch(schema, columns, rows):
+    arrays = []
+    for i, (name, kind) in enumerate(columns):
+        values = [r[i] for r in rows]
+        if kind == "dictionary":
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        elif kind == "timestamp":
+            arrays.append(_timestamps(values))
+        else:
+            arrays.append(pa.array(values, schema.field(name).type))
+    return pa.record_batch(arrays, schema=schema)
+
+def write_dataset(out_dir, columns, rows):
+    """
+    Append rows to the dataset. columns: [(name, kind)] with kind one of
+    int64/float64/string/dictionary/timestamp; the first two must be the
+    entry id and its timestamp, and rows must come in ascending id order.
+    Returns the number of rows written.
+    """
+    require()
+    types = _types()
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    os.makedirs(out_dir, exist_ok=True)
+    writers, written, last_id = {}, 0, None
+    rows = iter(rows)
+    try:
+        while True:
+            chunk = list(islice(rows, CHUNK))
+            if not chunk:
+                break
+            by_day = defaultdict(list)
+            for r in chunk:
+                by_day[r[1][:10]].append(r)
+            for day, part in by_day.items():
+                if day not in writers:
+                    path = os.path.join(out_dir, f"day={day}", f"part-{part[0][0]:012d}.parquet")
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writers[day] = (path, pq.ParquetWriter(path + ".tmp", schema))
+                writers[day][1].write_batch(_batch(schema, columns, part))
+            written += len(chunk)
+            last_id = chunk[-1][0]
+    except BaseException:
+        for path, w in writers.values():
+            w.close()
+            os.remove(path + ".tmp")
+        raise
+    # publish the parts, then move the high-water mark past them
+    for path, w in writers.values():
+        w.close()
+        os.replace(path + ".tmp", path)
+    if last_id is not None:
+        state_path = os.path.join(out_dir, STATE_FILE)
+        with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"last_id": last_id, "columns": [list(c) for c in columns]}, f)
+        os.replace(state_path + ".tmp", state_path)
+    return written
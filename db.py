@@ -1,56 +1,1123 @@
 import sqlite3
 import hashlib
-from datetime import datetime
+import json
+import merkle
+import event_codec
+import action_format
+import threading
+import queue
+import gzip
+import shutil
+import stat
+from contextlib import contextmanager
+from urllib.parse import quote
+from datetime import datetime, timedelta
 
 # --- SQLite DB file ---
 import os
 
 DB_FILE = r"C:/AuditData/logs.db"
 
+# --- Time-partitioned shards ---
+# "month": new entries go to one file per UTC month next to DB_FILE
+# (logs-2026-10.db, ...); DB_FILE keeps the shard manifest, checkpoints,
+# Merkle blocks and any entries written before sharding was enabled.
+# "none": everything stays in DB_FILE.
+SHARD_BY = os.getenv("AUDIT_SHARD_BY", "month")
 
-# --- Connect to DB ---
-def get_db():
-    conn = sqlite3.connect(DB_FILE)
+# entries per Merkle block (see merkle.py); blocks are sealed as appends fill them
+MERKLE_BLOCK_SIZE = int(os.getenv("AUDIT_MERKLE_BLOCK_SIZE", "1024"))
+
+# --- Durability profiles ---
+# strict:   rollback journal, fsync on every commit (SQLite defaults)
+# balanced: WAL, fsync only at checkpoints; survives app crashes
+# bulk:     balanced + large page cache and memory-mapped reads
+DB_PROFILE = os.getenv("AUDIT_DB_PROFILE", "balanced")
+POOL_SIZE = int(os.getenv("AUDIT_DB_POOL_SIZE", "8"))
+
+PROFILES = {
+    "strict": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+    },
+    "bulk": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -262144,      # KiB, i.e. 256 MB
+        "mmap_size": 1 << 30,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def open_connection(db_file=None, profile=None, check_same_thread=True, readonly=False):
+    profile = profile or DB_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DB profile {profile!r}; expected one of {sorted(PROFILES)}")
+    if readonly:
+        # sealed shards never change again, so skip locking entirely
+        path = quote((db_file or DB_FILE).replace("\\", "/"), safe="/:")
+        uri = f"file:{path}?mode=ro&immutable=1"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+        conn.row_factory = sqlite3.Row
+        return conn
+    conn = sqlite3.connect(db_file or DB_FILE, timeout=30, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
+    for pragma, value in PROFILES[profile].items():
+        conn.execute(f"PRAGMA {pragma}={value}")
     return conn
 
+
+# --- Connection pool ---
+class ConnectionPool:
+    """
+    Keeps up to `size` open connections for one DB file/profile and hands
+    them out to whichever thread asks, so requests skip connect + pragma setup.
+    """
+
+    def __init__(self, db_file, profile, size=POOL_SIZE, readonly=False):
+        self.db_file = db_file
+        self.profile = profile
+        self.readonly = readonly
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return open_connection(self.db_file, self.profile, check_same_thread=False,
+                                   readonly=self.readonly)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            with conn:  # commit on success, rollback on error
+                yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_file=None, readonly=False):
+    db_file = db_file or DB_FILE
+    key = (db_file, DB_PROFILE, readonly)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # shards are many and mostly idle; keep fewer spare connections for them
+            size = POOL_SIZE if db_file == DB_FILE else 2
+            pool = _pools[key] = ConnectionPool(db_file, DB_PROFILE, size, readonly)
+        return pool
+
+def drop_pools(db_file):
+    with _pools_lock:
+        for key in [k for k in _pools if k[0] == db_file]:
+            _pools.pop(key).close()
+
+
+# --- Connect to DB (pooled; use as `with get_db() as conn:`) ---
+def get_db(db_file=None, readonly=False):
+    return get_pool(db_file, readonly).connection()
+
+# --- Entry timestamps (UTC); bench/workload.py swaps in a simulated clock ---
+def utcnow():
+    return datetime.utcnow()
+
 # --- Generate SHA256 hash ---
 def calculate_hash(prev_hash, timestamp, action):
     data = f'{prev_hash}{timestamp}{action}'.encode('utf-8')
     return hashlib.sha256(data).hexdigest()
 
-# --- Initialize DB table ---
+# --- Parse action text into typed fields (formats produced by the monitors) ---
+def parse_action(action):
+    """Returns (event_type, exe, title, path, duration, pid); missing fields are None."""
+    p = action_format.parse(action)
+    return p.event_type, p.exe, p.title, p.path, p.duration, p.pid
+
+def parse_input_activity(event_type, timestamp, action):
+    """
+    Counts carried by "Input summary" / "Input events" rows as
+    (bucket_ts, keys, clicks, scrolls, moves, seconds), or None. Summaries
+    are bucketed by their log time, event windows by their own start time.
+    """
+    try:
+        _, detail = action.split(":", 1)
+        if event_type == "Input summary":
+            d = {k: v.rstrip("s") for k, v in action_format.tokenize(detail).items()}
+            return (timestamp,
+                    int(float(d.get("keys", "0"))), int(float(d.get("clicks", "0"))),
+                    int(float(d.get("scrolls", "0"))), int(float(d.get("moves", "0"))),
+                    float(d.get("interval", "0") or 0))
+        if event_type == "Input events":
+            payload = json.loads(detail.strip())
+            window = payload.get("window", {})
+            cnts = payload.get("counts", {})
+            start = window.get("start")
+            try:
+                datetime.fromisoformat(start)
+            except (TypeError, ValueError):
+                start = timestamp
+            return (start,
+                    int(cnts.get("keys", 0)), int(cnts.get("clicks", 0)),
+                    int(cnts.get("scrolls", 0)), int(cnts.get("moves", 0)),
+                    float(window.get("seconds", 0.0) or 0))
+    except Exception:
+        return None
+    return None
+
+# --- "Input events" payloads: event lists live in input_event_blobs ---
+def compact_input_events(action):
+    """
+    "Input events: {json}" -> (canonical action, blob). The event list moves
+    into a compact blob (event_codec) and the action keeps the window, the
+    counts and the blob's digest, so the chain hash still covers the events.
+    Returns (action, None) for anything that isn't a JSON object payload.
+    """
+    try:
+        payload = json.loads(action.split(":", 1)[1])
+        if not isinstance(payload, dict):
+            return action, None
+        events = payload.pop("events", [])
+        window = payload.get("window")
+        start = window.get("start") if isinstance(window, dict) else None
+    except (ValueError, IndexError, AttributeError):
+        return action, None
+    codec, blob = event_codec.pack(start, events)
+    payload["blob"] = {"codec": codec, "n": len(events) if isinstance(events, list) else None,
+                       "bytes": len(blob), "sha256": hashlib.sha256(blob).hexdigest()}
+    return "Input events: " + json.dumps(payload, separators=(",", ":"), sort_keys=True), blob
+
+def blob_digest(action):
+    """sha256 an "Input events" action expects of its blob, or None for inline payloads."""
+    if '"blob":' not in action:
+        return None
+    try:
+        desc = json.loads(action.split(":", 1)[1]).get("blob")
+        return desc.get("sha256") if isinstance(desc, dict) else None
+    except (ValueError, IndexError, AttributeError):
+        return None
+
+def load_input_events(action, blob=None):
+    """Payload dict of an "Input events" row with its "events" list, inline or from its blob."""
+    try:
+        payload = json.loads(action.split(":", 1)[1])
+    except (ValueError, IndexError):
+        return None
+    if not isinstance(payload, dict):
+        return None
+    desc = payload.pop("blob", None)
+    if isinstance(desc, dict) and blob is not None:
+        window = payload.get("window")
+        start = window.get("start") if isinstance(window, dict) else None
+        payload["events"] = event_codec.unpack(desc.get("codec"), start, blob)
+    return payload
+
+def _parsed_rows(rows):
+    """(id, timestamp, action, ...) rows -> (audit_logs field updates, input_activity rows)."""
+    fields, activity = [], []
+    for row in rows:
+        log_id, timestamp, action = row[0], row[1], row[2]
+        parsed = parse_action(action)
+        fields.append((log_id,) + parsed)
+        if parsed[0] in ("Input summary", "Input events"):
+            counts = parse_input_activity(parsed[0], timestamp, action)
+            if counts:
+                activity.append((log_id,) + counts)
+    return fields, activity
+
+# --- Schema migrations (tracked with PRAGMA user_version) ---
+def _m001_parsed_fields(conn):
+    cols = {r['name'] for r in conn.execute("PRAGMA table_info(audit_logs)")}
+    for name, decl in (("event_type", "TEXT"), ("exe", "TEXT"), ("title", "TEXT"),
+                       ("path", "TEXT"), ("duration", "REAL"), ("pid", "INTEGER")):
+        if name not in cols:
+            conn.execute(f"ALTER TABLE audit_logs ADD COLUMN {name} {decl}")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS input_activity (
+            log_id INTEGER PRIMARY KEY REFERENCES audit_logs(id),
+            bucket_ts TEXT NOT NULL,
+            keys INTEGER NOT NULL,
+            clicks INTEGER NOT NULL,
+            scrolls INTEGER NOT NULL,
+            moves INTEGER NOT NULL,
+            seconds REAL NOT NULL
+        )
+    ''')
+    # backfill existing rows in chunks so memory stays flat on large logs
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, timestamp, action FROM audit_logs WHERE id > ? ORDER BY id ASC LIMIT 5000", (last_id,)
+        ).fetchall()
+        if not rows:
+            break
+        fields, activity = _parsed_rows(rows)
+        conn.executemany(
+            "UPDATE audit_logs SET event_type = ?, exe = ?, title = ?, path = ?, duration = ?, pid = ? WHERE id = ?",
+            [f[1:] + (f[0],) for f in fields]
+        )
+        conn.executemany("INSERT OR REPLACE INTO input_activity VALUES (?, ?, ?, ?, ?, ?, ?)", activity)
+        last_id = rows[-1]['id']
+
+def _m002_report_indexes(conn):
+    # (event_type, timestamp, ...) covers the per-type report queries outright;
+    # timestamp alone serves date-bounded scans across all types
+    conn.executescript('''
+        CREATE INDEX IF NOT EXISTS idx_audit_logs_type_ts
+            ON audit_logs(event_type, timestamp, duration, exe, title, path);
+        CREATE INDEX IF NOT EXISTS idx_audit_logs_ts ON audit_logs(timestamp);
+    ''')
+
+def _m003_action_fts(conn):
+    # trigram tokens make MATCH behave like LIKE '%text%' (case-insensitive
+    # substring) for 3+ character terms, plus FTS5 boolean/phrase queries.
+    # The trigger keeps the index in step with every append.
+    try:
+        conn.executescript('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS audit_fts USING fts5(
+                action, content='audit_logs', content_rowid='id', tokenize='trigram'
+            );
+            CREATE TRIGGER IF NOT EXISTS audit_fts_ai AFTER INSERT ON audit_logs BEGIN
+                INSERT INTO audit_fts(rowid, action) VALUES (new.id, new.action);
+            END;
+            INSERT INTO audit_fts(audit_fts) VALUES ('rebuild');
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5/trigram: searches fall back to LIKE
+        print(f"[DB] full-text index unavailable ({e}); text search will scan")
+
+# --- Rollups: per-hour app usage and per-minute input activity, kept at ingest ---
+ROLLUP_STEPS = {"hour": timedelta(hours=1), "minute": timedelta(minutes=1)}
+
+def _floor(dt, unit):
+    return dt.replace(minute=0 if unit == "hour" else dt.minute, second=0, microsecond=0)
+
+def _rollup(conn, focus_ends, activity):
+    """
+    Fold rows into the rollup tables. focus_ends: (timestamp, exe, duration)
+    of "App focus end" rows; activity: (timestamp, bucket_ts, keys, clicks,
+    scrolls, moves, seconds). Keyed by log time so reports can bound by it.
+    """
+    apps = {}
+    for ts, exe, duration in focus_ends:
+        key = (ts[:13] + ":00:00", (exe or "").lower())
+        a = apps.get(key)
+        if a is None:
+            apps[key] = [1, duration, ts, ts]
+        else:
+            a[0] += 1
+            a[1] += duration
+            a[2] = min(a[2], ts)
+            a[3] = max(a[3], ts)
+    conn.executemany('''
+        INSERT INTO app_usage_hourly VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(hour, exe) DO UPDATE SET
+            sessions = sessions + excluded.sessions, seconds = seconds + excluded.seconds,
+            first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)
+    ''', [k + tuple(v) for k, v in apps.items()])
+
+    minutes = {}
+    for ts, bucket_ts, keys, clicks, scrolls, moves, seconds in activity:
+        key = (ts[:16] + ":00", _floor(datetime.fromisoformat(bucket_ts), "minute").isoformat())
+        m = minutes.setdefault(key, [0, 0, 0, 0, 0.0])
+        m[0] += keys
+        m[1] += clicks
+        m[2] += scrolls
+        m[3] += moves
+        m[4] += seconds
+    conn.executemany('''
+        INSERT INTO input_minutely VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(minute, bucket) DO UPDATE SET
+            keys = keys + excluded.keys, clicks = clicks + excluded.clicks, scrolls = scrolls + excluded.scrolls,
+            moves = moves + excluded.moves, seconds = seconds + excluded.seconds
+    ''', [k + tuple(v) for k, v in minutes.items()])
+
+def rollup_span(since, until, unit):
+    """
+    Whole hours/minutes inside [since, until] as (lo, hi) rollup keys, hi
+    exclusive and None meaning unbounded; None when there are none (or the
+    bounds don't parse). Rows in [since, lo) and [hi, until] must still be
+    read from audit_logs. Comparisons are string-wise, like the raw queries.
+    """
+    step = ROLLUP_STEPS[unit]
+    lo = hi = None
+    try:
+        if since:
+            start = _floor(datetime.fromisoformat(since), unit)
+            lo = start if since <= start.isoformat() else start + step
+        if until:
+            start = _floor(datetime.fromisoformat(until), unit)
+            last = (start + step - timedelta(microseconds=1)).isoformat()
+            hi = start + step if until >= last else start
+    except ValueError:
+        return None
+    if any(t is not None and t.tzinfo is not None for t in (lo, hi)):
+        return None  # rollup keys are naive UTC
+    if lo is not None and hi is not None and lo >= hi:
+        return None
+    return (lo and lo.isoformat()), (hi and hi.isoformat())
+
+def _m004_rollups(conn):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS app_usage_hourly (
+            hour TEXT NOT NULL,          -- '2026-10-17T06:00:00'
+            exe TEXT NOT NULL,           -- lower-cased, '' when unknown
+            sessions INTEGER NOT NULL,
+            seconds REAL NOT NULL,
+            first_ts TEXT NOT NULL,
+            last_ts TEXT NOT NULL,
+            PRIMARY KEY (hour, exe)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS input_minutely (
+            minute TEXT NOT NULL,        -- minute the rows were logged in
+            bucket TEXT NOT NULL,        -- minute the activity happened in
+            keys INTEGER NOT NULL,
+            clicks INTEGER NOT NULL,
+            scrolls INTEGER NOT NULL,
+            moves INTEGER NOT NULL,
+            seconds REAL NOT NULL,
+            PRIMARY KEY (minute, bucket)
+        ) WITHOUT ROWID;
+        DELETE FROM app_usage_hourly;
+        DELETE FROM input_minutely;
+    ''')
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, timestamp, exe, duration FROM audit_logs WHERE id > ? "
+            "AND event_type = 'App focus end' AND duration IS NOT NULL ORDER BY id ASC LIMIT 5000", (last_id,)
+        ).fetchall()
+        if not rows:
+            break
+        _rollup(conn, [tuple(r)[1:] for r in rows], [])
+        last_id = rows[-1]['id']
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT i.log_id, a.timestamp, i.bucket_ts, i.keys, i.clicks, i.scrolls, i.moves, i.seconds "
+            "FROM input_activity i JOIN audit_logs a ON a.id = i.log_id "
+            "WHERE i.log_id > ? ORDER BY i.log_id ASC LIMIT 5000", (last_id,)
+        ).fetchall()
+        if not rows:
+            break
+        _rollup(conn, [], [tuple(r)[1:] for r in rows])
+        last_id = rows[-1]['log_id']
+
+def _m005_input_event_blobs(conn):
+    # rows logged before this keep their inline JSON: rewriting them would break the chain
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS input_event_blobs (
+            log_id INTEGER PRIMARY KEY REFERENCES audit_logs(id),
+            data BLOB NOT NULL
+        )
+    """)
+
+def _m006_reparse_labelled_types(conn):
+    # event_type used to keep labels with their own parentheses,
+    # "Folder created (name: New folder (2))"; re-derive those rows so
+    # reports group them and check_range's re-parse matches the stored columns
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, timestamp, action FROM audit_logs WHERE id > ? "
+            "AND event_type LIKE '%(%:%)' ORDER BY id ASC LIMIT 5000", (last_id,)
+        ).fetchall()
+        if not rows:
+            break
+        fields, _ = _parsed_rows(rows)
+        conn.executemany(
+            "UPDATE audit_logs SET event_type = ?, exe = ?, title = ?, path = ?, duration = ?, pid = ? WHERE id = ?",
+            [f[1:] + (f[0],) for f in fields]
+        )
+        last_id = rows[-1]['id']
+    # checkpoints vouched for the old columns; the next incremental run rechecks everything
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'verify_checkpoints'").fetchone():
+        conn.execute("DELETE FROM verify_checkpoints")
+
+MIGRATIONS = [
+    _m001_parsed_fields,
+    _m002_report_indexes,
+    _m003_action_fts,
+    _m004_rollups,
+    _m005_input_event_blobs,
+    _m006_reparse_labelled_types,
+]
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, step in enumerate(MIGRATIONS, start=1):
+        if version < target:
+            step(conn)
+            conn.execute(f"PRAGMA user_version={target}")
+            conn.commit()
+    conn.execute("PRAGMA optimize")
+
+# --- Per-shard schema (audit_logs + everything derived from it) ---
+def init_shard(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            action TEXT NOT NULL,
+            prev_hash TEXT NOT NULL,
+            hash TEXT NOT NULL
+        );
+    """)
+    migrate(conn)
+
+# --- Shard manifest ---
+def shard_key_for(timestamp):
+    return timestamp[:7] if SHARD_BY == "month" else ""
+
+def shard_file(key, db_file=None):
+    db_file = db_file or DB_FILE
+    if not key:
+        return db_file
+    stem, ext = os.path.splitext(db_file)
+    return f"{stem}-{key}{ext}"
+
+def _cache_file(path):
+    d, name = os.path.split(path)
+    return os.path.join(d, ".shard-cache", name)
+
+def shard_path(shard, db_file=None):
+    """
+    (path, readonly) to open a manifest row with; compressed shards are
+    inflated once into .shard-cache next to the DB and read from there.
+    """
+    path = shard_file(shard['shard_key'], db_file)
+    if shard['state'] == 'sealed':
+        return path, True
+    if shard['state'] == 'compressed':
+        cached = _cache_file(path)
+        if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(path + ".gz"):
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            tmp = cached + ".tmp"
+            with gzip.open(path + ".gz", "rb") as src, open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, cached)
+        return cached, True
+    return path, False
+
+def list_shards(conn, from_id=None, to_id=None, since=None, until=None):
+    """
+    Manifest rows overlapping the given id and/or timestamp range, oldest
+    first. The active shard has no last_id/last_ts yet and is open-ended.
+    """
+    q = "SELECT * FROM shards WHERE 1=1"
+    params = []
+    if from_id is not None:
+        q += " AND (last_id IS NULL OR last_id >= ?)"; params.append(from_id)
+    if to_id is not None:
+        q += " AND first_id <= ?"; params.append(to_id)
+    if since:
+        q += " AND (last_ts IS NULL OR last_ts >= ?)"; params.append(since)
+    if until:
+        q += " AND first_ts <= ?"; params.append(until)
+    q += " ORDER BY first_id ASC"
+    return conn.execute(q, params).fetchall()
+
+@contextmanager
+def shard_db(shard):
+    path, readonly = shard_path(shard)
+    with get_db(path, readonly) as conn:
+        yield conn
+
+def report_shards(db_file, since=None, until=None):
+    """
+    (path, readonly) for every shard a report over [since, until] has to
+    read. Used by the summary scripts, which open DB files themselves.
+    """
+    conn = sqlite3.connect(db_file)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'shards'").fetchone():
+            return [(db_file, False)]
+        return [shard_path(s, db_file) for s in list_shards(conn, since=since, until=until)]
+    finally:
+        conn.close()
+
+def _register_main_shard(conn):
+    # entries written before sharding (or with AUDIT_SHARD_BY=none) live in DB_FILE itself
+    if conn.execute("SELECT 1 FROM shards").fetchone():
+        return
+    head = conn.execute(
+        "SELECT MIN(id) AS first_id, MAX(id) AS last_id, MIN(timestamp) AS first_ts, MAX(timestamp) AS last_ts "
+        "FROM audit_logs"
+    ).fetchone()
+    if head['first_id'] is None:
+        if SHARD_BY == "none":
+            conn.execute(
+                "INSERT INTO shards (shard_key, file, first_id, first_ts, prev_hash, state) "
+                "VALUES ('', ?, 1, '', '0', 'active')", (os.path.basename(DB_FILE),)
+            )
+        return
+    first = conn.execute("SELECT prev_hash FROM audit_logs WHERE id = ?", (head['first_id'],)).fetchone()
+    last = conn.execute("SELECT hash FROM audit_logs WHERE id = ?", (head['last_id'],)).fetchone()
+    active = SHARD_BY == "none"
+    conn.execute(
+        "INSERT INTO shards (shard_key, file, first_id, last_id, first_ts, last_ts, prev_hash, last_hash, state) "
+        "VALUES ('', ?, ?, ?, ?, ?, ?, ?, ?)",
+        (os.path.basename(DB_FILE), head['first_id'],
+         None if active else head['last_id'], head['first_ts'],
+         None if active else head['last_ts'], first['prev_hash'],
+         None if active else last['hash'], 'active' if active else 'closed')
+    )
+
+def _migrate_shard(shard):
+    path = shard_file(shard['shard_key'])
+    if shard['state'] in ('active', 'closed'):
+        with get_db(path) as conn:
+            init_shard(conn)
+        return
+    # sealed/compressed: only reopen for writing when a migration is pending
+    ro_path, _ = shard_path(shard)
+    conn = open_connection(ro_path, readonly=True)
+    try:
+        current = conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS)
+    finally:
+        conn.close()
+    if current:
+        return
+    compressed = shard['state'] == 'compressed'
+    if compressed:
+        with gzip.open(path + ".gz", "rb") as src, open(path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+    conn = open_connection(path, "strict")
+    try:
+        init_shard(conn)
+    finally:
+        conn.close()
+    _seal_file(path, compressed)
+
+def _seal_file(path, compress):
+    drop_pools(path)
+    conn = open_connection(path, "strict")  # leaves WAL mode, so no -wal/-shm files remain
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    drop_pools(path)
+    if compress:
+        with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+        if os.path.exists(_cache_file(path)):
+            os.remove(_cache_file(path))
+    else:
+        os.chmod(path, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+
+def seal_shard(key, compress=False):
+    """Mark a closed shard read-only (and optionally gzip it); it is never written again."""
+    if not key:
+        raise ValueError("The main DB file holds the manifest and cannot be sealed")
+    with get_db() as conn:
+        shard = conn.execute("SELECT * FROM shards WHERE shard_key = ?", (key,)).fetchone()
+    if not shard:
+        raise ValueError(f"No shard {key!r}")
+    if shard['state'] == 'active':
+        raise ValueError(f"Shard {key!r} is still being written to")
+    target = 'compressed' if compress else 'sealed'
+    if shard['state'] == target or shard['state'] == 'compressed':
+        return
+    path = shard_file(key)
+    if shard['state'] == 'sealed':
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+    _seal_file(path, compress)
+    with get_db() as conn:
+        conn.execute("UPDATE shards SET state = ? WHERE shard_key = ?", (target, key))
+
+# --- Initialize DB tables ---
 def init_db():
     with get_db() as conn:
-        conn.executescript('''
-            CREATE TABLE IF NOT EXISTS audit_logs (
+        init_shard(conn)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shards (
+                shard_key TEXT PRIMARY KEY,    -- '' for DB_FILE itself, else e.g. '2026-10'
+                file TEXT NOT NULL,
+                first_id INTEGER NOT NULL,
+                last_id INTEGER,               -- NULL while active
+                first_ts TEXT NOT NULL,
+                last_ts TEXT,
+                prev_hash TEXT NOT NULL,       -- hash the shard's first entry chains from
+                last_hash TEXT,
+                state TEXT NOT NULL            -- active | closed | sealed | compressed
+            );
+            CREATE TABLE IF NOT EXISTS verify_checkpoints (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                action TEXT NOT NULL,
-                prev_hash TEXT NOT NULL,
-                hash TEXT NOT NULL
+                last_id INTEGER NOT NULL,
+                last_hash TEXT NOT NULL,
+                verified_at TEXT NOT NULL
             );
-        ''')
+            CREATE TABLE IF NOT EXISTS merkle_blocks (
+                block_no INTEGER PRIMARY KEY,
+                first_id INTEGER NOT NULL,
+                last_id INTEGER NOT NULL UNIQUE,
+                root TEXT NOT NULL,
+                prev_block_hash TEXT NOT NULL,
+                block_hash TEXT NOT NULL
+            );
+        """)
+        _register_main_shard(conn)
+        shards = [s for s in list_shards(conn) if s['shard_key']]
+    for shard in shards:
+        _migrate_shard(shard)
+    # anchor any complete runs appended before merkle_blocks existed
+    _writer.seal_blocks()
+
+# --- Read entries across shards ---
+def iter_entries(from_id=None, to_id=None, columns="id, timestamp, action, prev_hash, hash"):
+    with get_db() as meta:
+        shards = list_shards(meta, from_id=from_id, to_id=to_id)
+    for shard in shards:
+        q = f"SELECT {columns} FROM audit_logs WHERE id >= ?"
+        params = [from_id or 0]
+        if to_id is not None:
+            q += " AND id <= ?"; params.append(to_id)
+        with shard_db(shard) as conn:
+            yield from conn.execute(q + " ORDER BY id ASC", params)
+
+def get_entry(entry_id):
+    with get_db() as meta:
+        shards = list_shards(meta, from_id=entry_id, to_id=entry_id)
+    for shard in shards:
+        with shard_db(shard) as conn:
+            row = conn.execute(
+                "SELECT id, timestamp, action, prev_hash, hash FROM audit_logs WHERE id = ?", (entry_id,)
+            ).fetchone()
+        if row:
+            return row
+    return None
 
 # --- Get last recorded hash ---
 def get_last_hash():
-    with get_db() as conn:
-        row = conn.execute("SELECT hash FROM audit_logs ORDER BY id DESC LIMIT 1").fetchone()
-        return row['hash'] if row else '0'
+    return _writer.head()[1]
+
+# --- (id, hash) of the newest entry; changes whenever anything is logged ---
+def get_head():
+    return _writer.head()
+
+# --- Single writer that owns the hash chain ---
+class ChainWriter:
+    """
+    Serializes appends behind one lock and keeps the chain head (last id +
+    hash) in memory. The head is reloaded from disk only on the first append
+    or when PRAGMA data_version shows another connection wrote to the active
+    shard. When an entry's month has no shard yet, the active shard is
+    closed in the manifest and a new one continues the chain from its last
+    hash. Full runs of MERKLE_BLOCK_SIZE entries are then sealed into
+    merkle_blocks (in the append's own transaction when unsharded).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = None
+        self._conn = None
+        self._active = None
+        self._data_version = None
+        self.last_id = 0
+        self.last_hash = '0'
+        self.block_no = 0
+        self.block_last_id = 0
+        self.block_hash = '0'
+
+    def _open(self):
+        if self._meta is not None:
+            return
+        self._meta = open_connection(check_same_thread=False)
+        self._active = self._meta.execute("SELECT * FROM shards WHERE state = 'active'").fetchone()
+        if self._active:
+            path = shard_file(self._active['shard_key'])
+            self._conn = self._meta if path == DB_FILE else open_connection(path, check_same_thread=False)
+        else:
+            last = self._meta.execute(
+                "SELECT last_id, last_hash FROM shards ORDER BY first_id DESC LIMIT 1"
+            ).fetchone()
+            self.last_id, self.last_hash = (last['last_id'], last['last_hash']) if last else (0, '0')
+        row = self._meta.execute(
+            "SELECT block_no, last_id, block_hash FROM merkle_blocks ORDER BY block_no DESC LIMIT 1"
+        ).fetchone()
+        self.block_no, self.block_last_id, self.block_hash = tuple(row) if row else (0, 0, '0')
+        self._data_version = None
+
+    def _reset(self):
+        # drop cached state after a failure; the next call reloads from disk
+        if self._conn is not None and self._conn is not self._meta:
+            self._conn.close()
+        if self._meta is not None:
+            self._meta.close()
+        self._meta = self._conn = self._active = None
+
+    def _sync_head(self, conn):
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        row = conn.execute("SELECT id, hash FROM audit_logs ORDER BY id DESC LIMIT 1").fetchone()
+        if row:
+            self.last_id, self.last_hash = row['id'], row['hash']
+        else:
+            self.last_id, self.last_hash = self._active['first_id'] - 1, self._active['prev_hash']
+        self._data_version = version
+
+    def _rollover(self, key, first_ts):
+        """Close the active shard and start `key`, chaining from the current head."""
+        meta = self._meta
+        with meta:
+            if self._active:
+                last_ts = self._conn.execute("SELECT MAX(timestamp) FROM audit_logs").fetchone()[0]
+                meta.execute(
+                    "UPDATE shards SET last_id = ?, last_ts = ?, last_hash = ?, state = 'closed' WHERE shard_key = ?",
+                    (self.last_id, last_ts or self._active['first_ts'], self.last_hash, self._active['shard_key'])
+                )
+            meta.execute(
+                "INSERT INTO shards (shard_key, file, first_id, first_ts, prev_hash, state) "
+                "VALUES (?, ?, ?, ?, ?, 'active')",
+                (key, os.path.basename(shard_file(key)), self.last_id + 1, first_ts, self.last_hash)
+            )
+        if self._conn is not None and self._conn is not meta:
+            self._conn.close()
+        path = shard_file(key)
+        self._conn = meta if path == DB_FILE else open_connection(path, check_same_thread=False)
+        init_shard(self._conn)
+        self._active = meta.execute("SELECT * FROM shards WHERE shard_key = ?", (key,)).fetchone()
+        self._data_version = None
+
+    def _seal_blocks(self, conn):
+        # ids only grow, so a full block is impossible until the id span allows it
+        while self.last_id - self.block_last_id >= MERKLE_BLOCK_SIZE:
+            leaves = self._block_leaves()
+            if len(leaves) < MERKLE_BLOCK_SIZE:
+                break
+            root = merkle.merkle_root([r['hash'] for r in leaves])
+            block_hash = merkle.block_hash(self.block_hash, root)
+            conn.execute(
+                "INSERT INTO merkle_blocks (block_no, first_id, last_id, root, prev_block_hash, block_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.block_no + 1, leaves[0]['id'], leaves[-1]['id'], root, self.block_hash, block_hash)
+            )
+            self.block_no, self.block_last_id, self.block_hash = self.block_no + 1, leaves[-1]['id'], block_hash
+
+    def _block_leaves(self):
+        leaves = []
+        shards = list_shards(self._meta, from_id=self.block_last_id + 1)
+        for shard in shards:
+            conn = self._conn if self._active and shard['shard_key'] == self._active['shard_key'] else None
+            if conn is None:
+                path, readonly = shard_path(shard)
+                conn = open_connection(path, readonly=readonly)
+                owned = True
+            else:
+                owned = False
+            try:
+                leaves += conn.execute(
+                    "SELECT id, hash FROM audit_logs WHERE id > ? ORDER BY id ASC LIMIT ?",
+                    (self.block_last_id, MERKLE_BLOCK_SIZE - len(leaves))
+                ).fetchall()
+            finally:
+                if owned:
+                    conn.close()
+            if len(leaves) >= MERKLE_BLOCK_SIZE:
+                break
+        return leaves
+
+    def _seal_pending_blocks(self):
+        meta = self._meta
+        try:
+            meta.execute("BEGIN IMMEDIATE")
+            self._seal_blocks(meta)
+            meta.commit()
+        except Exception:
+            meta.rollback()
+            raise
+
+    def head(self):
+        with self._lock:
+            self._open()
+            if self._conn is not None:
+                self._sync_head(self._conn)
+            return self.last_id, self.last_hash
+
+    def seal_blocks(self):
+        with self._lock:
+            try:
+                self._open()
+                if self._conn is not None:
+                    self._sync_head(self._conn)
+                self._seal_pending_blocks()
+            except Exception:
+                self._reset()
+                raise
+
+    def append(self, actions, fsync=False):
+        """Appends actions as one transaction; fsync=True commits with synchronous=FULL whatever the profile."""
+        if not actions:
+            return []
+        with self._lock:
+            try:
+                self._open()
+                if self._conn is not None:
+                    self._sync_head(self._conn)
+                timestamps = [utcnow().isoformat() for _ in actions]
+                key = shard_key_for(timestamps[0])
+                # never roll back to an older key (clock skew, or SHARD_BY switched to "none")
+                if self._active is None or key > self._active['shard_key']:
+                    self._rollover(key, timestamps[0])
+
+                conn = self._conn
+                if fsync:
+                    # WAL + NORMAL only syncs at checkpoints; the pragma can't change inside a transaction
+                    conn.execute("PRAGMA synchronous=FULL")
+                conn.execute("BEGIN IMMEDIATE")
+                self._sync_head(conn)
+                last_id, prev_hash = self.last_id, self.last_hash
+                rows, results, blobs = [], [], []
+                for timestamp, action in zip(timestamps, actions):
+                    if action.startswith("Input events:"):
+                        action, blob = compact_input_events(action)
+                        if blob is not None:
+                            blobs.append((last_id + 1, blob))
+                    hash_val = calculate_hash(prev_hash, timestamp, action)
+                    last_id += 1
+                    rows.append((last_id, timestamp, action, prev_hash, hash_val))
+                    results.append({
+                        "timestamp": timestamp,
+                        "action": action,
+                        "hash": hash_val
+                    })
+                    prev_hash = hash_val
+                fields, activity = _parsed_rows(rows)
+                conn.executemany(
+                    "INSERT INTO audit_logs (id, timestamp, action, prev_hash, hash, "
+                    "event_type, exe, title, path, duration, pid) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row + f[1:] for row, f in zip(rows, fields)]
+                )
+                conn.executemany("INSERT INTO input_activity VALUES (?, ?, ?, ?, ?, ?, ?)", activity)
+                conn.executemany("INSERT INTO input_event_blobs VALUES (?, ?)", blobs)
+                ts_of = {row[0]: row[1] for row in rows}
+                _rollup(conn,
+                        [(ts_of[f[0]], f[2], f[5]) for f in fields
+                         if f[1] == "App focus end" and f[5] is not None],
+                        [(ts_of[a[0]],) + a[1:] for a in activity])
+                self.last_id, self.last_hash = last_id, prev_hash
+                if conn is self._meta:
+                    self._seal_blocks(conn)
+                conn.commit()
+                if fsync:
+                    conn.execute(f"PRAGMA synchronous={PROFILES[DB_PROFILE]['synchronous']}")
+            except Exception:
+                if self._conn is not None and self._conn.in_transaction:
+                    self._conn.rollback()
+                self._reset()  # force a reload of the head
+                raise
+            if conn is not self._meta:
+                try:
+                    self._seal_pending_blocks()
+                except Exception as e:
+                    # the entries are committed; blocks catch up on a later append
+                    print(f"[DB] Merkle sealing deferred: {e}")
+                    self._reset()
+            return results
+
+_writer = ChainWriter()
 
 # --- Insert new action into audit log ---
 def log_action(action):
-    timestamp = datetime.utcnow().isoformat()
-    prev_hash = get_last_hash()
-    hash_val = calculate_hash(prev_hash, timestamp, action)
+    return _writer.append([action])[0]
+
+# --- Insert a batch of actions in one transaction ---
+def log_actions(actions, fsync=False):
+    return _writer.append(actions, fsync)
+
+# --- Verify a run of entries (streams rows, never loads the whole table) ---
+def _derived_intact(row):
+    """True if the row's parsed columns are what its action parses to (see _parsed_rows)."""
+    fields, activity = _parsed_rows([(row['id'], row['timestamp'], row['action'])])
+    stored = (row['event_type'], row['exe'], row['title'], row['path'], row['duration'], row['pid'])
+    if fields[0][1:] != stored:
+        return False
+    counts = (row['bucket_ts'], row['keys'], row['clicks'], row['scrolls'], row['moves'], row['seconds'])
+    return (activity[0][1:] if activity else (None,) * 6) == counts
+
+def check_range(conn, from_id=None, to_id=None, prev_hash=None):
+    """
+    Rehash entries with from_id <= id <= to_id in order. `prev_hash` is the
+    hash the first entry must chain from; None trusts its stored prev_hash.
+    The unhashed columns reports read (event_type ... pid, input_activity)
+    must match what parsing the hashed action gives.
+    """
+    # "Input events" rows also need their blob to match the digest the action carries
+    q = ("SELECT a.id, a.timestamp, a.action, a.prev_hash, a.hash, b.data AS blob, "
+         "a.event_type, a.exe, a.title, a.path, a.duration, a.pid, "
+         "i.bucket_ts, i.keys, i.clicks, i.scrolls, i.moves, i.seconds "
+         "FROM audit_logs a LEFT JOIN input_event_blobs b ON b.log_id = a.id "
+         "LEFT JOIN input_activity i ON i.log_id = a.id WHERE a.id >= ?")
+    params = [from_id or 0]
+    if to_id is not None:
+        q += " AND a.id <= ?"; params.append(to_id)
+    q += " ORDER BY a.id ASC"
 
+    result = {"ok": True, "bad_id": None, "checked": 0, "first_id": None,
+              "first_prev_hash": None, "last_id": None, "last_hash": prev_hash}
+    for row in conn.execute(q, params):
+        if result["first_id"] is None:
+            result["first_id"] = row['id']
+            result["first_prev_hash"] = row['prev_hash']
+            if prev_hash is None:
+                prev_hash = row['prev_hash']
+        intact = row['hash'] == calculate_hash(prev_hash, row['timestamp'], row['action'])
+        if intact and (row['blob'] is not None or row['action'].startswith("Input events:")):
+            digest = blob_digest(row['action'])
+            intact = (digest is None and row['blob'] is None) or (
+                row['blob'] is not None and hashlib.sha256(row['blob']).hexdigest() == digest)
+        if intact:
+            intact = _derived_intact(row)
+        if not intact:
+            result["ok"] = False
+            result["bad_id"] = row['id']
+            return result
+        prev_hash = row['hash']
+        result["checked"] += 1
+        result["last_id"] = row['id']
+        result["last_hash"] = prev_hash
+    return result
+
+def check_shards(from_id=None, to_id=None, prev_hash=None):
+    """check_range across every shard overlapping the id range, carrying the chain between them."""
+    with get_db() as meta:
+        shards = list_shards(meta, from_id=from_id, to_id=to_id)
+    result = {"ok": True, "bad_id": None, "checked": 0, "first_id": None,
+              "first_prev_hash": None, "last_id": None, "last_hash": prev_hash}
+    for shard in shards:
+        with shard_db(shard) as conn:
+            part = check_range(conn, from_id, to_id, result["last_hash"])
+        result["checked"] += part["checked"]
+        if result["first_id"] is None and part["first_id"] is not None:
+            result["first_id"], result["first_prev_hash"] = part["first_id"], part["first_prev_hash"]
+        if not part["ok"]:
+            result["ok"], result["bad_id"] = False, part["bad_id"]
+            return result
+        if part["last_id"] is not None:
+            result["last_id"], result["last_hash"] = part["last_id"], part["last_hash"]
+    return result
+
+# --- Verification checkpoints ---
+def get_checkpoint(conn):
+    return conn.execute(
+        "SELECT last_id, last_hash, verified_at FROM verify_checkpoints ORDER BY id DESC LIMIT 1"
+    ).fetchone()
+
+def save_checkpoint(last_id, last_hash):
     with get_db() as conn:
         conn.execute(
-            "INSERT INTO audit_logs (timestamp, action, prev_hash, hash) VALUES (?, ?, ?, ?)",
-            (timestamp, action, prev_hash, hash_val)
+            "INSERT INTO verify_checkpoints (last_id, last_hash, verified_at) VALUES (?, ?, ?)",
+            (last_id, last_hash, datetime.utcnow().isoformat())
         )
+
+# --- Verify the chain (incremental by default) ---
+def verify_chain(from_id=None, to_id=None, full=False):
+    """
+    Modes:
+      incremental (default) - only entries after the last checkpoint
+      range                 - from_id/to_id given; checkpoint is left alone
+      full                  - whole history
+    Incremental and full runs advance the checkpoint when they succeed.
+    Only shards overlapping the checked id range are opened.
+    """
+    ranged = from_id is not None or to_id is not None
+    mode = "full" if full else ("range" if ranged else "incremental")
+
+    prev_hash = None
+    if mode == "range":
+        if from_id is not None and from_id > 1:
+            row = get_entry(from_id - 1)
+            prev_hash = row['hash'] if row else None
+    elif mode == "incremental":
+        with get_db() as conn:
+            cp = get_checkpoint(conn)
+        if cp:
+            row = get_entry(cp['last_id'])
+            if not row or row['hash'] != cp['last_hash']:
+                return {"mode": mode, "ok": False, "bad_id": cp['last_id'], "checked": 0,
+                        "first_id": cp['last_id'], "first_prev_hash": None,
+                        "last_id": None, "last_hash": None}
+            from_id, prev_hash = cp['last_id'] + 1, cp['last_hash']
+    result = check_shards(from_id, to_id, prev_hash)
+
+    result["mode"] = mode
+    if result["ok"] and mode != "range" and result["last_id"] is not None:
+        save_checkpoint(result["last_id"], result["last_hash"])
+    return result
+
+# --- Merkle inclusion proof for one entry ---
+def get_proof(entry_id):
+    """
+    Returns None if the entry does not exist; "block" is None while the
+    entry is not yet covered by a sealed Merkle block.
+    """
+    entry = get_entry(entry_id)
+    if not entry:
+        return None
+    with get_db() as conn:
+        block = conn.execute(
+            "SELECT * FROM merkle_blocks WHERE last_id >= ? ORDER BY last_id ASC LIMIT 1", (entry_id,)
+        ).fetchone()
+    if not block or block['first_id'] > entry_id:
+        return {"entry": dict(entry), "block": None, "index": None, "audit_path": None}
+    leaves, index = [], None
+    for row in iter_entries(block['first_id'], block['last_id'], columns="id, hash"):
+        if row['id'] == entry_id:
+            index = len(leaves)
+        leaves.append(row['hash'])
     return {
-        "timestamp": timestamp,
-        "action": action,
-        "hash": hash_val
+        "entry": dict(entry),
+        "block": dict(block),
+        "index": index,
+        "audit_path": merkle.audit_path(leaves, index)
     }
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser(description="Audit DB maintenance (no arguments: create / migrate the schema)")
+    sub = p.add_subparsers(dest="cmd")
+    sub.add_parser("shards", help="List shard files from the manifest")
+    seal = sub.add_parser("seal", help="Make a closed shard read-only")
+    seal.add_argument("key", help="Shard key, e.g. 2026-09")
+    seal.add_argument("--compress", action="store_true", help="Also gzip it (inflated on demand for reads)")
+    args = p.parse_args()
+
+    init_db()
+    if args.cmd == "seal":
+        seal_shard(args.key, compress=args.compress)
+        print(f"✅ Sealed shard {args.key}")
+    elif args.cmd == "shards":
+        with get_db() as conn:
+            for s in list_shards(conn):
+                print(f"{s['shard_key'] or '(main)':10} {s['state']:10} ids {s['first_id']}–{s['last_id'] or '…'}"
+                      f"  {s['first_ts']} → {s['last_ts'] or 'now'}  {s['file']}")
+    else:
+        print(f"✅ Database ready: {DB_FILE}")
+
+if __name__ == '__main__':
+    main()
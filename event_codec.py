@@ -0,0 +1,137 @@
+import json, struct, sys, zlib
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+# Compact encoding for the per-event lists of "Input events" windows
+# (monitor/input_summary_logger.py). Events are stored column by column:
+#
+#   codes    1 byte per event    (key/click/scroll/move)
+#   deltas   int32 per event     ms since the previous event (the first:
+#                                since the window start)
+#   names    uint16 per key/click index into a name dictionary
+#   scrolls  int16 dx, dy per scroll
+#
+# and the whole body is zlib-compressed. Fixed-width columns decode with
+# array.frombytes in C, and their small, repetitive values compress far
+# better than the JSON text. encode() refuses (ValueError) anything it
+# cannot reproduce exactly; pack() then falls back to zlib-compressed JSON
+# (codec 0) so every payload can be stored the same way.
+
+VERSION = 1
+JSON_CODEC = 0
+CODES = ("key", "click", "scroll", "move")
+_CODE_OF = {name: i for i, name in enumerate(CODES)}
+_FIELDS = ({"t", "e", "k"}, {"t", "e", "b"}, {"t", "e", "dx", "dy"}, {"t", "e"})
+_HEADER = struct.Struct("<BIH")  # version, events, names
+
+def _le(arr):
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+_MS = [f".{ms:03d}" for ms in range(1000)]
+
+def _timestamps(start, deltas):
+    """Delta-coded ms offsets -> ISO timestamps with millisecond precision."""
+    base = start.replace(microsecond=0)
+    ms_since_base = list(accumulate(deltas, initial=start.microsecond // 1000))[1:]
+    if not ms_since_base:
+        return []
+    # a window spans a few seconds, so format each second once
+    first = min(ms_since_base) // 1000
+    prefixes = [(base + timedelta(seconds=sec)).isoformat()
+                for sec in range(first, max(ms_since_base) // 1000 + 1)]
+    return [prefixes[ms // 1000 - first] + _MS[ms % 1000] for ms in ms_since_base]
+
+def encode(window_start, events):
+    """window_start: ISO string the offsets are relative to; events: list of dicts."""
+    codes, deltas, name_idx, scrolls = bytearray(), array("i"), array("H"), array("h")
+    names, name_of = [], {}
+    prev = 0
+    try:
+        start = datetime.fromisoformat(window_start)
+        for ev in events:
+            code = _CODE_OF[ev["e"]]
+            if ev.keys() != _FIELDS[code]:
+                raise ValueError(f"unexpected fields {sorted(ev)}")
+            t = datetime.fromisoformat(ev["t"])
+            offset = (t - start) // timedelta(milliseconds=1)
+            codes.append(code)
+            deltas.append(offset - prev)
+            prev = offset
+            if code <= 1:
+                name = ev["k" if code == 0 else "b"]
+                if not isinstance(name, str):
+                    raise TypeError(f"name {name!r} is not a string")
+                if name not in name_of:
+                    name_of[name] = len(names)
+                    names.append(name)
+                name_idx.append(name_of[name])
+            elif code == 2:
+                scrolls.append(ev["dx"])
+                scrolls.append(ev["dy"])
+    except (KeyError, TypeError, AttributeError, OverflowError) as e:
+        raise ValueError(f"cannot encode event: {e}") from e
+
+    if len(names) > 0xFFFF:
+        raise ValueError("too many distinct names")
+    body = bytearray(_HEADER.pack(VERSION, len(codes), len(names)))
+    for name in names:
+        raw = name.encode("utf-8")
+        if len(raw) > 255:
+            raise ValueError("name too long")
+        body.append(len(raw))
+        body += raw
+    body += codes
+    body += _le(deltas).tobytes()
+    body += _le(name_idx).tobytes()
+    body += _le(scrolls).tobytes()
+    data = zlib.compress(bytes(body), 6)
+    if decode(window_start, data) != events:
+        raise ValueError("events do not round-trip")  # e.g. timestamps finer than 1 ms
+    return data
+
+def decode(window_start, data):
+    body = zlib.decompress(data)
+    version, n, n_names = _HEADER.unpack_from(body)
+    if version != VERSION:
+        raise ValueError(f"unknown event codec version {version}")
+    pos = _HEADER.size
+    names = []
+    for _ in range(n_names):
+        size = body[pos]
+        names.append(body[pos + 1:pos + 1 + size].decode("utf-8"))
+        pos += 1 + size
+    codes = body[pos:pos + n]
+    pos += n
+    deltas = array("i")
+    deltas.frombytes(body[pos:pos + 4 * n])
+    pos += 4 * n
+    n_named = sum(1 for c in codes if c <= 1)
+    name_idx = array("H")
+    name_idx.frombytes(body[pos:pos + 2 * n_named])
+    pos += 2 * n_named
+    scrolls = array("h")
+    scrolls.frombytes(body[pos:])
+    _le(deltas); _le(name_idx); _le(scrolls)
+
+    named = iter([names[i] for i in name_idx])
+    sc = iter(scrolls)
+    return [{"t": t, "e": "key", "k": next(named)} if code == 0 else
+            {"t": t, "e": "click", "b": next(named)} if code == 1 else
+            {"t": t, "e": "scroll", "dx": next(sc), "dy": next(sc)} if code == 2 else
+            {"t": t, "e": "move"}
+            for code, t in zip(codes, _timestamps(datetime.fromisoformat(window_start), deltas))]
+
+def pack(window_start, events):
+    """-> (codec, data): the columnar encoding when it is lossless, else JSON."""
+    try:
+        return VERSION, encode(window_start, events)
+    except ValueError:
+        return JSON_CODEC, zlib.compress(json.dumps(events, separators=(",", ":")).encode("utf-8"), 6)
+
+def unpack(codec, window_start, data):
+    if codec == JSON_CODEC:
+        return json.loads(zlib.decompress(data))
+    return decode(window_start, data)
@@ -0,0 +1,137 @@
+import threading, time, queue, atexit, uuid, sqlite3
+
+from db import log_actions
+
+# --- Asynchronous ingest with group commit ---
+class GroupCommitIngest:
+    """
+    Requests hand their actions to submit() and get sequence numbers back
+    immediately; a background thread appends everything that queued within
+    `window` seconds as one fsynced transaction. Sequence numbers are per
+    process, so responses also carry an `epoch` that changes on every restart.
+    An entry the DB rejects on its own is recorded as failed and skipped;
+    only the newest `max_failed` failures are kept, and status() answers
+    "unknown" at or below the newest one forgotten.
+    """
+
+    def __init__(self, window=0.02, max_batch=5000, max_pending=100000, max_failed=1000):
+        self.window = window
+        self.max_batch = max_batch
+        self.epoch = uuid.uuid4().hex[:12]
+        self._q = queue.Queue(maxsize=max_pending)
+        self._seq_lock = threading.Lock()
+        self._assigned = 0
+        self._durable = 0
+        self._failed = {}           # seq -> error, for entries that could not be appended (oldest first)
+        self._max_failed = max_failed
+        self._forgotten = 0         # newest failed seq dropped from _failed
+        self._durable_cv = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def submit(self, actions):
+        """Queue actions; returns (first_seq, last_seq). Raises queue.Full when saturated."""
+        with self._seq_lock:
+            # all-or-nothing: only producers hold this lock, so free space can only grow
+            if self._q.maxsize - self._q.qsize() < len(actions):
+                raise queue.Full
+            first = self._assigned + 1
+            # put under the lock so queue order matches sequence order
+            for i, action in enumerate(actions):
+                self._q.put_nowait((first + i, action))
+                self._assigned = first + i
+        return first, first + len(actions) - 1
+
+    @property
+    def assigned_seq(self):
+        return self._assigned
+
+    @property
+    def durable_seq(self):
+        return self._durable
+
+    @property
+    def failed(self):
+        return dict(self._failed)
+
+    def status(self, seq):
+        if seq in self._failed:
+            return "failed"
+        if seq <= self._forgotten:
+            return "unknown"
+        if seq <= self._durable:
+            return "durable"
+        if seq <= self._assigned:
+            return "pending"
+        return "unknown"
+
+    def wait_durable(self, seq, timeout=None):
+        with self._durable_cv:
+            return self._durable_cv.wait_for(lambda: self._durable >= seq, timeout)
+
+    def _collect(self):
+        try:
+            batch = [self._q.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _append(self, actions):
+        """None once appended, else why the DB rejects these actions themselves."""
+        backoff = 0.1
+        while True:
+            try:
+                log_actions(actions, fsync=True)
+                return None
+            except sqlite3.OperationalError as e:
+                # locked, disk full, I/O error: the entries were acknowledged, so they must reach disk
+                print(f"[INGEST ERROR] {e}; retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+            except Exception as e:
+                # retrying would fail the same way
+                return f"{type(e).__name__}: {e}"
+
+    def _fail(self, seq, error):
+        print(f"[INGEST ERROR] skipped seq={seq}: {error}")
+        self._failed[seq] = error
+        while len(self._failed) > self._max_failed:
+            oldest = next(iter(self._failed))
+            del self._failed[oldest]
+            self._forgotten = oldest
+
+    def _commit(self, batch):
+        error = self._append([action for _, action in batch])
+        if error and len(batch) > 1:
+            # find the bad entries and keep the rest
+            print(f"[INGEST ERROR] {error}; appending the batch entry by entry")
+            for seq, action in batch:
+                error = self._append([action])
+                if error:
+                    self._fail(seq, error)
+        elif error:
+            self._fail(batch[0][0], error)
+        with self._durable_cv:
+            self._durable = batch[-1][0]
+            self._durable_cv.notify_all()
+
+    def _run(self):
+        while self._running or not self._q.empty():
+            batch = self._collect()
+            if batch:
+                self._commit(batch)
+
+    def stop(self, timeout=10.0):
+        self._running = False
+        self._thread.join(timeout)
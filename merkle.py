@@ -0,0 +1,86 @@
+import argparse, hashlib, json, sys
+
+# Merkle trees over runs of audit entries. Leaves are the entries' chain
+# hashes; leaf and inner nodes are domain-separated (0x00 / 0x01 prefix) so
+# an inner node can never be passed off as an entry. An odd node at the end
+# of a level is promoted unchanged.
+#
+# This module has no dependency on the DB, so `python merkle.py proof.json`
+# can check a proof from /proof/<id> on any machine.
+
+def _leaf(entry_hash):
+    return hashlib.sha256(b"\x00" + bytes.fromhex(entry_hash)).digest()
+
+def _node(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+def _levels(entry_hashes):
+    level = [_leaf(h) for h in entry_hashes]
+    levels = [level]
+    while len(level) > 1:
+        nxt = [_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        levels.append(nxt)
+        level = nxt
+    return levels
+
+def merkle_root(entry_hashes):
+    if not entry_hashes:
+        raise ValueError("Cannot build a Merkle root over zero entries")
+    return _levels(entry_hashes)[-1][0].hex()
+
+def audit_path(entry_hashes, index):
+    """Sibling hashes from leaf `index` up to the root, as [{"side", "hash"}]."""
+    path = []
+    for level in _levels(entry_hashes)[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append({"side": "L" if sibling < index else "R", "hash": level[sibling].hex()})
+        index //= 2
+    return path
+
+def block_hash(prev_block_hash, root):
+    return hashlib.sha256(f"{prev_block_hash}{root}".encode("utf-8")).hexdigest()
+
+def verify_proof(entry_hash, path, root):
+    node = _leaf(entry_hash)
+    for step in path:
+        sibling = bytes.fromhex(step["hash"])
+        node = _node(sibling, node) if step["side"] == "L" else _node(node, sibling)
+    return node.hex() == root
+
+def check_proof(proof):
+    """
+    Check a /proof/<id> response: the entry hash matches its content, the
+    audit path leads to the block root, and the block hash commits to the
+    root. Returns (ok, message).
+    """
+    entry, block = proof["entry"], proof["block"]
+    data = f'{entry["prev_hash"]}{entry["timestamp"]}{entry["action"]}'.encode("utf-8")
+    if hashlib.sha256(data).hexdigest() != entry["hash"]:
+        return False, f"Entry {entry['id']} does not match its hash"
+    if not verify_proof(entry["hash"], proof["audit_path"], block["root"]):
+        return False, f"Audit path for entry {entry['id']} does not lead to block root"
+    if block_hash(block["prev_block_hash"], block["root"]) != block["block_hash"]:
+        return False, f"Block {block['block_no']} hash does not commit to its root"
+    return True, f"Entry {entry['id']} is included in block {block['block_no']}"
+
+def main():
+    p = argparse.ArgumentParser(description="Verify a Merkle inclusion proof returned by /proof/<id>")
+    p.add_argument("proof", nargs="?", help="JSON file with the proof (default: stdin)")
+    args = p.parse_args()
+
+    if args.proof:
+        with open(args.proof, "r", encoding="utf-8") as f:
+            proof = json.load(f)
+    else:
+        proof = json.load(sys.stdin)
+
+    ok, message = check_proof(proof)
+    print(("✅ " if ok else "❌ ") + message)
+    if not ok:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
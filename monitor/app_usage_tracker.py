@@ -1,11 +1,11 @@
 # monitor/app_usage_tracker.py
-import os, time, threading, queue, requests, psutil
+import os, time, threading, queue, psutil
 from datetime import datetime
+from spool import Spool
 
 # ====== Config ======
 API_URL = "http://127.0.0.1:5000/log-batch"
 API_TOKEN = "supersecrettoken123"
-FLUSH_INTERVAL = 1.0
 POLL_INTERVAL  = 0.15
 MIN_SESSION_SECONDS = 0.3
 IDLE_IGNORE_SECONDS = 0         # set >0 to ignore changes while idle
@@ -22,32 +22,12 @@ import win32gui, win32process, ctypes, win32api
 import wmi, win32evtlog
 import pythoncom  # COM init for WMI threads
 
-EVENT_Q   = queue.Queue()
+SPOOL     = None  # Spool, started in main(); survives backend outages and restarts
 CONTROL_Q = queue.Queue()
 
 # ---------- Utils ----------
 def enqueue(action: str, detail: str):
-    EVENT_Q.put(f"{action}: {detail}")
-
-def flush_loop():
-    headers = {"Authorization": f"Bearer {API_TOKEN}"}
-    buf, last_send = [], time.time()
-    while True:
-        timeout = max(0.1, FLUSH_INTERVAL - (time.time() - last_send))
-        try:
-            item = EVENT_Q.get(timeout=timeout)
-            buf.append(item)
-            while True:
-                buf.append(EVENT_Q.get_nowait())
-        except queue.Empty:
-            pass
-        if buf and (time.time() - last_send >= FLUSH_INTERVAL):
-            try:
-                requests.post(API_URL, json={"actions": buf}, headers=headers, timeout=5)
-                print(f"[BATCH] sent {len(buf)} events")
-            except Exception as e:
-                print(f"[BATCH ERROR] {e}")
-            buf, last_send = [], time.time()
+    SPOOL.put([f"{action}: {detail}"])
 
 class LASTINPUTINFO(ctypes.Structure):
     _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
@@ -228,10 +208,11 @@ def security_log_poller():
 
 # ---------- Main loop ----------
 def main():
+    global SPOOL
     print("🖥️ App Usage Tracker ++ (durations, lock/unlock, USB, logon/logoff, smoothing). Ctrl+C to stop.")
 
     # start background workers ONCE
-    threading.Thread(target=flush_loop, daemon=True).start()
+    SPOOL = Spool("app_usage_tracker", API_URL, API_TOKEN)
     threading.Thread(target=session_wmi_watcher, daemon=True).start()
     threading.Thread(target=usb_wmi_watcher, daemon=True).start()
     threading.Thread(target=security_log_poller, daemon=True).start()
@@ -336,7 +317,7 @@ def main():
         print("\n👋 Stopping…")
     finally:
         end_session("shutdown")
-        time.sleep(0.5)
+        SPOOL.close()
 
 if __name__ == "__main__":
     main()
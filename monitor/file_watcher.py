@@ -1,121 +1,241 @@
-import os, time, json, requests, sys
+import os, re, time, json, sys, threading, hashlib
+from collections import Counter
 from watchdog.observers import Observer
 from watchdog.events import (
     FileSystemEventHandler,
     FileCreatedEvent, FileModifiedEvent, FileDeletedEvent, FileMovedEvent,
     DirCreatedEvent, DirDeletedEvent, DirMovedEvent
 )
+from spool import Spool, SPOOL_DIR
+from tree_index import TreeIndex
+from watch_rules import Rules, DEFAULT_RULES, plan_watches
 
 # -------------------- Config --------------------
-API_URL   = "http://127.0.0.1:5000/log"
+API_URL   = "http://127.0.0.1:5000/log-batch"
 API_TOKEN = "supersecrettoken123"       # must match Flask's token
 DB_PATH   = r"C:\AuditData\logs.db"     # must match db.py
 CONFIG    = os.path.join(os.path.expanduser("~"), ".secure_audit_watcher.json")
-DEBOUNCE_SECS = 0.3                     # de-dupe identical events within this window
+COALESCE_SECS = 1.0                     # merge events on the same path within this window
+BURST_MIN     = 25                      # events in one folder per window summarized as one "File burst"
+MAX_PENDING   = 50000                   # events held for coalescing; beyond it the oldest go out early
+STATS_SECS    = 600                     # print exclusion rule hit counts this often
+# Exclusions: "rules" in CONFIG replaces DEFAULT_RULES (syntax in watch_rules.py)
 # ------------------------------------------------
 
-IGNORED_FILENAMES = {"desktop.ini", "thumbs.db"}
-IGNORED_SUFFIXES  = (".tmp", ".crdownload")
-
 def norm(p: str) -> str:
     return os.path.abspath(p).replace("\\", "/").lower()
 
-EXCLUDED = {
-    norm(DB_PATH),
-    norm(DB_PATH + "-journal"),
-    norm(DB_PATH + "-wal"),
-    norm(DB_PATH + "-shm"),
+def own_files_rules(*paths):
+    """Exact-path rules for the audit DB and our spool, which must never be logged."""
+    return [f"re:^{re.escape(norm(p + s))}$" for p in paths for s in ("", "-journal", "-wal", "-shm")]
+
+RULES = None          # Rules, built below for the watched folder
+FLAT_WATCHES = set()  # norm(folder) watched non-recursively because an excluded folder sits below it
+
+SPOOL = None  # Spool, started below; survives backend outages and restarts
+INDEX = None  # TreeIndex of the watched folder, rescanned at startup
+
+# -------------------- Coalescing --------------------
+# Events wait one to two windows in a time wheel (one slot per COALESCE_SECS)
+# before they are sent. Meanwhile, on the same path:
+#   created + modified...  -> File created       modified + modified -> File modified
+#   renamed a->b + b->c    -> File renamed a->c   identical repeats   -> one event
+# and when a slot holds BURST_MIN or more events in one folder (a build, an
+# unzip), they go out as a single "File burst" line with counts per kind.
+# Nothing is kept once a slot is flushed, so memory is bounded by the event
+# rate (and MAX_PENDING), not by how many paths were ever touched.
+
+MERGES = {
+    ("created", "modified"): "created",
+    ("created", "created"): "created",
+    ("modified", "modified"): "modified",
+    ("deleted", "deleted"): "deleted",
 }
 
-# tiny de-dupe so we don’t spam identical rapid events
-_LAST: dict[str, float] = {}
-def dedupe(key: str) -> bool:
-    now = time.time()
-    t = _LAST.get(key, 0)
-    if now - t < DEBOUNCE_SECS:
-        return False
-    _LAST[key] = now
-    return True
-
-def post_action(action: str, detail: str):
-    """
-    action: label (e.g., 'File created', 'Folder renamed (from: A to: B)')
-    detail: path or 'old -> new' string
-    """
-    key = f"{action}:{norm(detail)}"
-    if not dedupe(key):
-        return
-    try:
-        r = requests.post(
-            API_URL,
-            json={"action": f"{action}: {detail}"},
-            headers={"Authorization": f"Bearer {API_TOKEN}"},
-            timeout=3
-        )
-        print(f"[LOGGED] {action}: {detail} - Status: {r.status_code}")
-    except Exception as e:
-        print(f"[ERROR] {e}")
+def describe(e):
+    """(action, detail) in the formats the audit log has always used."""
+    kind, src, dst = e["kind"], e["src"], e["dst"]
+    if e["is_dir"]:
+        if kind == "renamed":
+            return (f"Folder renamed (from: {os.path.basename(src)} to: {os.path.basename(dst)})",
+                    f"{src} -> {dst}")
+        return f"Folder {kind} (name: {os.path.basename(src)})", src
+    if kind == "renamed":
+        return f"File renamed (from: {os.path.basename(src)} to: {os.path.basename(dst)})", f"{src} -> {dst}"
+    return f"File {kind}", src
+
+class Coalescer:
+    def __init__(self, emit, window=COALESCE_SECS, burst_min=BURST_MIN, max_pending=MAX_PENDING, track=None):
+        self.emit = emit            # emit(list of action lines)
+        self.track = track          # track(list of merged entries), called under the lock, so it must only
+                                    # hand them off (TreeIndex.apply queues them for its own thread)
+        self.window = window
+        self.burst_min = burst_min
+        self.max_pending = max_pending
+        self._slots = {}            # slot number -> [entry, ...] in arrival order
+        self._open = {}             # norm(path) -> pending entry further events may merge into
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="coalescer", daemon=True)
+        self._thread.start()
+
+    def add(self, kind, path, dest=None, is_dir=False):
+        """kind: created / modified / deleted / renamed (with dest)."""
+        with self._lock:
+            if kind == "renamed":
+                prev = self._open.pop(norm(path), None)
+                if prev and prev["kind"] == "renamed" and prev["is_dir"] == is_dir and norm(prev["src"]) != norm(dest):
+                    prev["dst"] = dest  # rename chain: a->b, b->c
+                    self._open[norm(dest)] = prev
+                    return
+                key, entry = norm(dest), {"kind": kind, "src": path, "dst": dest, "is_dir": is_dir}
+            else:
+                key = norm(path)
+                prev = self._open.get(key)
+                if prev and prev["is_dir"] == is_dir and (prev["kind"], kind) in MERGES:
+                    prev["kind"] = MERGES[(prev["kind"], kind)]
+                    return
+                entry = {"kind": kind, "src": path, "dst": None, "is_dir": is_dir}
+            self._slots.setdefault(int(time.monotonic() / self.window), []).append(entry)
+            self._open[key] = entry
+            self._pending += 1
+            if self._pending > self.max_pending:
+                self._flush(min(self._slots))
+
+    def _flush(self, slot):
+        # caller holds self._lock
+        entries = self._slots.pop(slot)
+        self._pending -= len(entries)
+        for e in entries:
+            key = norm(e["dst"] or e["src"])
+            if self._open.get(key) is e:
+                del self._open[key]
+        if self.track:
+            self.track(entries)
+        folders = Counter(os.path.dirname(e["dst"] or e["src"]) for e in entries)
+        lines, summarized = [], set()
+        for e in entries:
+            folder = os.path.dirname(e["dst"] or e["src"])
+            if folders[folder] < self.burst_min:
+                action, detail = describe(e)
+                lines.append(f"{action}: {detail}")
+            elif folder not in summarized:
+                summarized.add(folder)
+                kinds = Counter(x["kind"] for x in entries if os.path.dirname(x["dst"] or x["src"]) == folder)
+                lines.append(f'File burst: path="{folder}" | events={folders[folder]} | created={kinds["created"]} | '
+                             f'modified={kinds["modified"]} | deleted={kinds["deleted"]} | '
+                             f'renamed={kinds["renamed"]} | window={self.window:.1f}s')
+        self.emit(lines)
+
+    def _run(self):
+        while not self._stop.wait(self.window / 4):
+            with self._lock:
+                ready = int(time.monotonic() / self.window) - 1  # every event waited at least one window
+                for slot in sorted(s for s in self._slots if s < ready):
+                    self._flush(slot)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        with self._lock:
+            for slot in sorted(self._slots):
+                self._flush(slot)
+
+COALESCER = None  # Coalescer, started below
+
+# -------------------- Offline changes --------------------
+def index_path(folder):
+    return os.path.join(SPOOL_DIR, f"tree-{hashlib.sha1(norm(folder).encode('utf-8')).hexdigest()[:16]}.db")
+
+def report_offline(index, stats):
+    """Queues what changed under the watched folder since the last run (as found by index.rescan)."""
+    total = sum(stats[k] for k in ("created", "modified", "deleted", "renamed"))
+    if not total:
+        return 0
+    lines = [f'Offline changes: path="{stats["root"]}" | since={stats["since"]} | created={stats["created"]} | '
+             f'modified={stats["modified"]} | deleted={stats["deleted"]} | renamed={stats["renamed"]} | '
+             f'entries={stats["entries"]}']
+    for kind, *rest in index.changes(BURST_MIN):
+        if kind == "burst":
+            folder, kinds = rest
+            lines.append(f'File burst (offline): path="{folder}" | events={sum(kinds.values())} | '
+                         f'created={kinds["created"]} | modified={kinds["modified"]} | '
+                         f'deleted={kinds["deleted"]} | renamed={kinds["renamed"]}')
+        else:
+            action, detail = describe(rest[0])
+            # "File created" -> "File created (offline)", ahead of any "(from: ...)" label
+            head, _, label = action.partition(" (")
+            lines.append(f"{head} (offline){' (' + label if label else ''}: {detail}")
+        if len(lines) >= 1000:
+            SPOOL.put(lines)
+            lines = []
+    SPOOL.put(lines)
+    return total
 
 class Handler(FileSystemEventHandler):
+    def __init__(self, observer):
+        self.observer = observer
+
     def on_any_event(self, event):
         path = event.src_path
-        p = norm(path)
 
-        if p in EXCLUDED:
+        if isinstance(event, (FileMovedEvent, DirMovedEvent)):
+            # moving across an exclusion boundary is a create or a delete
+            # (e.g. "report.pdf.crdownload" -> "report.pdf")
+            src_out, dest_out = RULES.excluded(norm(path)), RULES.excluded(norm(event.dest_path))
+            if src_out and dest_out:
+                return
+            is_dir = isinstance(event, DirMovedEvent)
+            if src_out:
+                COALESCER.add("created", event.dest_path, is_dir=is_dir)
+                self.watch_new_folder(event.dest_path, is_dir)
+                return
+            if dest_out:
+                COALESCER.add("deleted", path, is_dir=is_dir)
+                return
+            self.watch_new_folder(event.dest_path, is_dir)
+        elif RULES.excluded(norm(path)):
             return
 
         # -------- Folder events --------
         if isinstance(event, DirCreatedEvent):
-            base = os.path.basename(path)
-            # Scenario 1 + 2: always log creation immediately (default or custom)
-            post_action(f"Folder created (name: {base})", path)
+            # Scenario 1 + 2: always log creation (default or custom)
+            COALESCER.add("created", path, is_dir=True)
+            self.watch_new_folder(path, True)
             return
 
         if isinstance(event, DirDeletedEvent):
-            base = os.path.basename(path)
-            post_action(f"Folder deleted (name: {base})", path)
+            COALESCER.add("deleted", path, is_dir=True)
             return
 
         if isinstance(event, DirMovedEvent):
             # Scenario 3: any folder rename
-            old_name = os.path.basename(event.src_path)
-            new_name = os.path.basename(event.dest_path)
-            post_action(f"Folder renamed (from: {old_name} to: {new_name})",
-                        f"{event.src_path} -> {event.dest_path}")
+            COALESCER.add("renamed", event.src_path, event.dest_path, is_dir=True)
             return
 
         # -------- File events --------
-        if isinstance(event, FileCreatedEvent):
-            name = os.path.basename(path).lower()
-            if name in IGNORED_FILENAMES or name.endswith(IGNORED_SUFFIXES):
-                return
-            post_action("File created", path)
-            return
-
-        if isinstance(event, FileModifiedEvent):
-            name = os.path.basename(path).lower()
-            if name in IGNORED_FILENAMES or name.endswith(IGNORED_SUFFIXES):
-                return
-            post_action("File modified", path)
-            return
-
-        if isinstance(event, FileDeletedEvent):
-            name = os.path.basename(path).lower()
-            if name in IGNORED_FILENAMES or name.endswith(IGNORED_SUFFIXES):
-                return
-            post_action("File deleted", path)
+        if isinstance(event, (FileCreatedEvent, FileModifiedEvent, FileDeletedEvent)):
+            kind = ("created" if isinstance(event, FileCreatedEvent)
+                    else "modified" if isinstance(event, FileModifiedEvent) else "deleted")
+            COALESCER.add(kind, path)
             return
 
         if isinstance(event, FileMovedEvent):
             # Scenario 3: any file rename
-            old_name = os.path.basename(event.src_path)
-            new_name = os.path.basename(event.dest_path)
-            post_action(f"File renamed (from: {old_name} to: {new_name})",
-                        f"{event.src_path} -> {event.dest_path}")
+            COALESCER.add("renamed", event.src_path, event.dest_path)
             return
 
         return
 
+    def watch_new_folder(self, path, is_dir):
+        # folders appearing next to a pruned one are not covered by any recursive watch
+        if is_dir and norm(os.path.dirname(path)) in FLAT_WATCHES:
+            try:
+                self.observer.schedule(self, path=path, recursive=True)
+            except OSError:
+                pass
+
 # ---- GUI folder picker (no typing) ----
 def pick_directory():
     try:
@@ -134,19 +254,24 @@ def pick_directory():
         save_last_dir(d)
     return d
 
-def load_last_dir():
+def load_config():
     if os.path.exists(CONFIG):
         try:
             with open(CONFIG, "r", encoding="utf-8") as f:
-                return json.load(f).get("last_dir")
+                return json.load(f)
         except:
             pass
-    return None
+    return {}
+
+def load_last_dir():
+    return load_config().get("last_dir")
 
 def save_last_dir(d):
     try:
+        config = load_config()
+        config["last_dir"] = d
         with open(CONFIG, "w", encoding="utf-8") as f:
-            json.dump({"last_dir": d}, f)
+            json.dump(config, f)
     except:
         pass
 
@@ -158,16 +283,47 @@ if __name__ == "__main__":
             print("No folder selected and no valid fallback. Exiting.")
             sys.exit(1)
 
+    SPOOL = Spool("file_watcher", API_URL, API_TOKEN)
+    INDEX = TreeIndex(index_path(selected))
+    RULES = Rules(own_files_rules(DB_PATH, SPOOL.path, INDEX.path) + load_config().get("rules", DEFAULT_RULES),
+                  root=selected)
+
+    # what changed while we were not running, and the folder listing for the watch plan
+    stats, tree = INDEX.rescan(selected, RULES)
+    if stats["baseline"]:
+        print(f"[INDEX] baseline of {stats['entries']:,} entries in {stats['seconds']:.1f}s")
+    else:
+        changed = report_offline(INDEX, stats)
+        print(f"[INDEX] {stats['entries']:,} entries scanned in {stats['seconds']:.1f}s; "
+              f"{changed:,} changed while offline (since {stats['since']} UTC)")
+    if stats["unreadable"]:
+        print(f"[INDEX] {stats['unreadable']} folder(s) could not be listed; kept their previous entries")
+    INDEX.commit()
+    COALESCER = Coalescer(SPOOL.put, track=INDEX.apply)
+
     observer = Observer()
-    handler = Handler()
-    observer.schedule(handler, path=selected, recursive=True)
+    handler = Handler(observer)
+    watches = plan_watches(selected, RULES, tree)
+    for folder, recursive in watches:
+        observer.schedule(handler, path=folder, recursive=recursive)
+        if not recursive:
+            FLAT_WATCHES.add(norm(folder))
     observer.start()
-    print(f"🔍 Watching folder: {selected}  (recursive)")
+    print(f"🔍 Watching folder: {selected}  (recursive; {len(watches)} watch(es) around excluded folders)")
 
     try:
+        ticks = 0
         while True:
             time.sleep(1)
+            ticks += 1
+            if ticks % STATS_SECS == 0 and RULES.hits:
+                print(f"[RULES] {RULES.report()}")
     except KeyboardInterrupt:
         observer.stop()
     observer.join()
+    COALESCER.close()
+    INDEX.close()
+    SPOOL.close()
+    if RULES.hits:
+        print(f"[RULES] {RULES.report()}")
     print("👋 Stopped monitoring.")
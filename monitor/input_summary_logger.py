@@ -2,9 +2,10 @@
 # Timestamped input activity (keys/clicks/scrolls/moves) with privacy-first defaults.
 # Sends both a rollup summary and a compact per-event list (with timestamps) to /log-batch.
 
-import time, threading, atexit, json, requests
+import time, threading, atexit, json
 from datetime import datetime
 from pynput import keyboard, mouse
+from spool import Spool
 
 # ====== Config ======
 API_URL   = "http://127.0.0.1:5000/log-batch"   # Flask batch endpoint
@@ -17,6 +18,7 @@ MAX_EVENTS_PER_FLUSH = 400                      # safety cap for payload size
 
 _lock = threading.Lock()
 _running = True
+SPOOL = None  # Spool, started in main(); survives backend outages and restarts
 
 # rollup counters
 counts = {"keys": 0, "clicks": 0, "scrolls": 0, "moves": 0}
@@ -72,16 +74,8 @@ def _post_summary(snap_counts, snap_events, started_ts, ended_ts):
     }
     actions.append("Input events: " + json.dumps(payload, separators=(",", ":")))
 
-    try:
-        r = requests.post(
-            API_URL,
-            json={"actions": actions},
-            headers={"Authorization": f"Bearer {API_TOKEN}", "Content-Type": "application/json"},
-            timeout=8
-        )
-        print(f"[INPUT] sent {len(actions)} action(s) -> HTTP {r.status_code} | {summary_detail}")
-    except Exception as e:
-        print(f"[INPUT ERROR] {e}")
+    SPOOL.put(actions)  # delivered (and retried) by the spool's sender thread
+    print(f"[INPUT] queued {len(actions)} action(s) | {summary_detail}")
 
 def _flusher():
     while _running:
@@ -148,12 +142,17 @@ def _on_move(x, y):
 
 def _shutdown():
     global _running
+    if not _running:  # Ctrl+C, then again from atexit
+        return
     _running = False
     snap_counts, snap_events, st, en = _reset_window()
     _post_summary(snap_counts, snap_events, st, en)
+    SPOOL.close()
     print("👋 Input Summary Logger stopped.")
 
 def main():
+    global SPOOL
+    SPOOL = Spool("input_summary_logger", API_URL, API_TOKEN)
     print("⌨️ Input Summary Logger (timestamped; privacy-first). Ctrl+C to stop.")
     kb_listener = keyboard.Listener(on_press=_on_key_press)
     ms_listener = mouse.Listener(on_click=_on_click, on_scroll=_on_scroll, on_move=_on_move)
@@ -0,0 +1,168 @@
+# monitor/spool.py
+# Durable client-side queue shared by the monitors.
+#
+# Actions are appended to a local SQLite file before anything is sent; a
+# background thread posts the oldest ones to /log-batch (see transport.py)
+# and deletes them only once the server has acknowledged them. While the
+# backend is down the spool grows on disk (not in memory) and is replayed
+# with exponential backoff, also after the monitor itself restarts.
+# Delivery is at-least-once: a batch whose acknowledgement is lost in
+# transit is sent again. A batch the server rejects outright (a 4xx other
+# than those in transport.RETRY_4XX) is dropped and replaced by a
+# "Spool error" entry, so it cannot block everything queued behind it.
+
+import os, random, sqlite3, threading, time
+from transport import Transport, Rejected, MAX_BATCH
+
+# ====== Config ======
+SPOOL_DIR      = os.getenv("AUDIT_SPOOL_DIR", os.path.join(os.path.expanduser("~"), ".secure_audit_spool"))
+MAX_DISK_BYTES = int(float(os.getenv("AUDIT_SPOOL_MB", "256")) * 1024 * 1024)
+MAX_MEMORY     = 2000        # actions buffered in memory before the producer writes them itself
+FLUSH_INTERVAL = 1.0         # seconds between disk writes / send attempts
+BACKOFF_MIN    = 1.0
+BACKOFF_MAX    = 300.0
+# ====================
+
+class Spool:
+    def __init__(self, name, url, token, path=None):
+        self.transport = Transport(url, token)
+        self.path = path or os.path.join(SPOOL_DIR, f"{name}.db")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._pending = []
+        self._failures = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                action TEXT NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._bytes = self._size()
+        backlog = self.backlog()
+        if backlog:
+            print(f"[SPOOL] resuming with {backlog} unsent action(s) from {self.path}")
+        self._thread = threading.Thread(target=self._run, name=f"spool-{name}", daemon=True)
+        self._thread.start()
+
+    # ---------- producers ----------
+    def put(self, actions):
+        """Queue action lines for delivery. Never blocks on the network."""
+        with self._lock:
+            self._pending.extend(actions)
+            if len(self._pending) >= MAX_MEMORY:
+                self._persist()  # keep memory bounded: the producer pays for the disk write
+
+    def backlog(self):
+        with self._lock:
+            on_disk = self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+            return on_disk + len(self._pending)
+
+    def close(self, timeout=5.0):
+        """Write out buffered actions and give the sender `timeout` seconds to drain."""
+        with self._lock:
+            self._persist()
+        deadline = time.time() + timeout
+        while time.time() < deadline and self.backlog() and self._failures == 0:
+            self._wake.set()
+            time.sleep(0.1)
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=2)
+        if not self._thread.is_alive():  # else a send is still in flight; its ack needs the connection
+            with self._lock:
+                self._conn.close()
+            self.transport.close()
+
+    # ---------- disk ----------
+    def _persist(self):
+        # caller holds self._lock
+        if not self._pending:
+            return
+        rows = [(a, len(a.encode("utf-8"))) for a in self._pending]
+        self._conn.executemany("INSERT INTO spool (action, size) VALUES (?, ?)", rows)
+        self._bytes += sum(size for _, size in rows)
+        self._pending = []
+        if self._bytes > MAX_DISK_BYTES:
+            self._trim()
+        self._conn.commit()
+
+    def _trim(self):
+        # over the disk cap: drop the oldest actions, and leave a record of the gap
+        # so it shows up in the audit log once the backend is reachable again
+        target, dropped, freed = MAX_DISK_BYTES * 0.9, 0, 0
+        last_id = None
+        cur = self._conn.execute("SELECT id, size FROM spool ORDER BY id")
+        for row_id, size in cur:
+            if self._bytes - freed <= target:
+                break
+            last_id, dropped, freed = row_id, dropped + 1, freed + size
+        cur.close()
+        if last_id is None:
+            return
+        self._conn.execute("DELETE FROM spool WHERE id <= ?", (last_id,))
+        note = f"Spool overflow: dropped={dropped} | bytes={freed} | cap_mb={MAX_DISK_BYTES // (1024 * 1024)}"
+        self._conn.execute("INSERT INTO spool (action, size) VALUES (?, ?)", (note, len(note)))
+        self._bytes = self._size()
+        print(f"[SPOOL] disk cap reached; dropped {dropped} oldest action(s)")
+
+    def _size(self):
+        # caller holds self._lock
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM spool").fetchone()[0]
+
+    # ---------- sender ----------
+    def _next_batch(self):
+        with self._lock:
+            self._persist()
+            rows = self._conn.execute("SELECT id, action, size FROM spool ORDER BY id LIMIT ?",
+                                      (MAX_BATCH,)).fetchall()
+        return rows[:Transport.fit([size for _, _, size in rows])]
+
+    def _ack(self, batch):
+        with self._lock:
+            self._conn.execute("DELETE FROM spool WHERE id <= ?", (batch[-1][0],))
+            self._conn.commit()
+            self._bytes -= sum(size for _, _, size in batch)
+
+    def _reject(self, batch, error):
+        # the server will never take this batch; record the loss in its place
+        with self._lock:
+            self._conn.execute("DELETE FROM spool WHERE id <= ?", (batch[-1][0],))
+            note = (f"Spool error: rejected={len(batch)} | bytes={sum(size for _, _, size in batch)} | "
+                    f"status={error}")
+            self._conn.execute("INSERT INTO spool (action, size) VALUES (?, ?)", (note, len(note)))
+            self._bytes = self._size()
+            self._conn.commit()
+        print(f"[SPOOL] server rejected a batch ({error}); dropped {len(batch)} action(s)")
+
+    def _run(self):
+        delay = 0.0
+        while not self._closed:
+            self._wake.wait(max(delay, FLUSH_INTERVAL))
+            self._wake.clear()
+            while not self._closed:
+                batch = self._next_batch()
+                if not batch:
+                    delay = 0.0
+                    break
+                error = self.transport.send([action for _, action, _ in batch])
+                if isinstance(error, Rejected):
+                    self._reject(batch, error)
+                    self._failures, delay = 0, 0.0
+                    continue
+                if error:
+                    self._failures += 1
+                    delay = min(BACKOFF_MAX, BACKOFF_MIN * 2 ** (self._failures - 1)) * random.uniform(0.5, 1.0)
+                    print(f"[SPOOL] send failed ({error}); {self.backlog()} queued, retrying in {delay:.1f}s")
+                    break
+                if self._failures:
+                    print(f"[SPOOL] backend reachable again after {self._failures} failed attempt(s)")
+                self._failures, delay = 0, 0.0
+                self._ack(batch)
+                print(f"[BATCH] sent {len(batch)} events")
@@ -0,0 +1,66 @@
+# monitor/transport.py
+# HTTP transport shared by the monitors (used by spool.py's sender thread).
+#
+# One keep-alive requests.Session per monitor instead of a new TCP connection
+# per POST; batches capped by entry count and by bytes, so a burst (say a
+# `git checkout` touching 20k files) goes out as a few large requests; and
+# bodies gzip-compressed (Content-Encoding: gzip, decoded by app.py) once
+# they are big enough for it to pay off.
+
+import gzip, json, requests
+from requests.adapters import HTTPAdapter
+
+# ====== Config ======
+MAX_BATCH       = 2000          # actions per POST
+MAX_BATCH_BYTES = 1024 * 1024   # uncompressed action bytes per POST
+GZIP_MIN_BYTES  = 1024          # smaller bodies go out uncompressed
+TIMEOUT         = (5, 30)       # connect, read
+# 4xx answers worth retrying: timeouts, rate limits, and auth (a bad token is
+# fixed by the operator, not by changing the batch)
+RETRY_4XX       = (401, 403, 408, 429)
+# ====================
+
+class Rejected(str):
+    """send() error for a batch the server will refuse again however often it is retried."""
+
+class Transport:
+    def __init__(self, url, token):
+        self.url = url
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+        # the spool sends one batch at a time; retries are its job, not urllib3's
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+
+    @staticmethod
+    def fit(sizes):
+        """How many of the leading entries (by byte size) make one batch; at least one."""
+        total = 0
+        for n, size in enumerate(sizes[:MAX_BATCH]):
+            total += size
+            if total > MAX_BATCH_BYTES and n:
+                return n
+        return min(len(sizes), MAX_BATCH)
+
+    def send(self, actions):
+        """
+        POST one batch to /log-batch; None on success, else a short error
+        description, a Rejected one for a permanent 4xx.
+        """
+        body = json.dumps({"actions": actions}, separators=(",", ":")).encode("utf-8")
+        headers = {}
+        if len(body) >= GZIP_MIN_BYTES:
+            body = gzip.compress(body, 6)
+            headers["Content-Encoding"] = "gzip"
+        try:
+            r = self.session.post(self.url, data=body, headers=headers, timeout=TIMEOUT)
+        except requests.RequestException as e:
+            return type(e).__name__
+        if r.status_code in (200, 201, 202):
+            return None
+        if 400 <= r.status_code < 500 and r.status_code not in RETRY_4XX:
+            return Rejected(f"HTTP {r.status_code}")
+        return f"HTTP {r.status_code}"
+
+    def close(self):
+        self.session.close()
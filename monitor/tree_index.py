@@ -0,0 +1,289 @@
+# monitor/tree_index.py
+# Persistent index of the watched tree, so file_watcher can report what
+# changed while it was not running.
+#
+# At startup the whole tree is listed by a pool of threads, one os.scandir()
+# per folder (no os.walk, no separate stat pass: size and mtime come with the
+# listing), into a fresh table. SQL then diffs it against the previous run's
+# table, which yields created / modified / deleted entries, plus renames where
+# a deleted and a created path share an inode. After that the index follows
+# the live events (apply()), so the next start only reports what happened
+# while the watcher was down.
+#
+# On Windows the listing has no inode numbers (st_ino is 0 without an extra
+# open per file), so offline renames show up as a delete plus a create there.
+
+import os, queue, sqlite3, threading, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# ====== Config ======
+SCAN_WORKERS = 32      # folders listed concurrently; mostly waiting on the disk or the file server
+# ====================
+
+def _key(path):
+    # Rules match on lower-case forward-slash paths; entry paths are already absolute
+    return path.replace("\\", "/").lower()
+
+def _under(path):
+    """(low, high) bounds of the paths below folder `path` for a range query."""
+    return path + os.sep, path + chr(ord(os.sep) + 1)
+
+def _row(path, st, is_dir):
+    return (path, 0 if is_dir else st.st_size, st.st_mtime_ns, st.st_ino, int(is_dir))
+
+def scan(root, rules, workers=SCAN_WORKERS):
+    """
+    Lists the tree under root in parallel, skipping (and not entering) what the
+    rules exclude. Yields (folder, rows, subdirs, pruned, ok) per folder, in no
+    particular order; rows are (path, size, mtime_ns, inode, is_dir).
+    """
+    results = queue.SimpleQueue()
+
+    def list_dir(folder):
+        try:
+            results.put(listing(folder))
+        except BaseException as e:  # never leave the loop below waiting
+            results.put(e)
+
+    def listing(folder):
+        rows, subdirs, pruned = [], [], False
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if rules.excluded(_key(entry.path)):
+                            pruned = pruned or is_dir
+                            continue
+                        rows.append(_row(entry.path, entry.stat(follow_symlinks=False), is_dir))
+                    except OSError:
+                        continue  # vanished while we were listing
+                    if is_dir:
+                        subdirs.append(entry.path)
+        except OSError:
+            return folder, rows, subdirs, pruned, False
+        return folder, rows, subdirs, pruned, True
+
+    # results come back through a queue: wait(FIRST_COMPLETED) over the
+    # pending futures costs O(pending) per call, quadratic on a wide tree
+    with ThreadPoolExecutor(workers, thread_name_prefix="scan") as pool:
+        pool.submit(list_dir, os.path.abspath(root))
+        pending = 1
+        while pending:
+            result = results.get()
+            if isinstance(result, BaseException):
+                raise result
+            pending += len(result[2]) - 1
+            for d in result[2]:
+                pool.submit(list_dir, d)
+            yield result
+
+class TreeIndex:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.create_function("dirname", 1, os.path.dirname, deterministic=True)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, inode INTEGER, is_dir INTEGER
+            ) WITHOUT ROWID;
+        """)
+        self._conn.commit()
+        # live updates are applied by a thread of their own, never on the caller's
+        self._updates = queue.SimpleQueue()
+        self._updater = threading.Thread(target=self._run, name="tree-index", daemon=True)
+        self._updater.start()
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row and row[0]
+
+    # ---------- startup rescan ----------
+    def rescan(self, root, rules, workers=SCAN_WORKERS):
+        """
+        Scans root and diffs it against the stored index; the differences are
+        read with changes() and the scan replaces the index on commit(). Returns
+        (stats, tree) where tree maps each listed folder to (subdirs, pruned)
+        for watch_rules.plan_watches().
+        """
+        started = time.perf_counter()
+        root = os.path.abspath(root)
+        conn, tree, failed, entries = self._conn, {}, [], 0
+        conn.executescript("""
+            DROP TABLE IF EXISTS scan;
+            CREATE TABLE scan (
+                path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, inode INTEGER, is_dir INTEGER
+            ) WITHOUT ROWID;
+        """)
+        for folder, rows, subdirs, pruned, ok in scan(root, rules, workers):
+            conn.executemany("INSERT OR REPLACE INTO scan VALUES (?, ?, ?, ?, ?)", rows)
+            entries += len(rows)
+            if ok:
+                tree[folder] = (subdirs, pruned)
+            else:
+                failed.append(folder)
+        for folder in failed:
+            # unreadable right now (permissions, a share hiccup): keep what we knew
+            conn.execute("INSERT OR IGNORE INTO scan SELECT * FROM files WHERE path > ? AND path < ?", _under(folder))
+
+        baseline = self._meta("scanned_at") is None or self._meta("root") != root
+        conn.executescript("""
+            DROP TABLE IF EXISTS changes;
+            CREATE TEMP TABLE changes (
+                kind TEXT, src TEXT, dst TEXT, is_dir INTEGER, inode INTEGER, size INTEGER, mtime INTEGER, folder TEXT
+            );
+        """)
+        if not baseline:
+            conn.executescript("""
+                INSERT INTO changes SELECT 'created', s.path, NULL, s.is_dir, s.inode, s.size, s.mtime, dirname(s.path)
+                    FROM scan s
+                    WHERE NOT EXISTS (SELECT 1 FROM files f WHERE f.path = s.path);
+                INSERT INTO changes SELECT 'deleted', f.path, NULL, f.is_dir, f.inode, f.size, f.mtime, dirname(f.path)
+                    FROM files f
+                    WHERE NOT EXISTS (SELECT 1 FROM scan s WHERE s.path = f.path);
+                INSERT INTO changes SELECT 'modified', s.path, NULL, 0, s.inode, s.size, s.mtime, dirname(s.path)
+                    FROM scan s JOIN files f ON f.path = s.path
+                    WHERE s.is_dir = 0 AND f.is_dir = 0 AND (s.size != f.size OR s.mtime != f.mtime);
+            """)
+            # a path that a rule excludes now was not deleted, it just stopped being watched
+            conn.create_function("excluded", 1, lambda p: rules.excluded(_key(p), count=False))
+            conn.execute("DELETE FROM changes WHERE kind = 'deleted' AND excluded(src)")
+            conn.execute("CREATE INDEX changes_inode ON changes (inode, kind)")
+            self._pair_renames()
+        counts = Counter(dict(conn.execute("SELECT kind, COUNT(*) FROM changes GROUP BY kind")))
+        stats = {"entries": entries, "seconds": time.perf_counter() - started, "baseline": baseline,
+                 "since": self._meta("scanned_at"), "unreadable": len(failed), "root": root}
+        for kind in ("created", "modified", "deleted", "renamed"):
+            stats[kind] = counts[kind]
+        self._root, self._rules = root, rules
+        return stats, tree
+
+    def _pair_renames(self):
+        conn = self._conn
+        # a deleted and a created entry with the same (unique) inode is one rename;
+        # files must also keep size and mtime, or it is a freed inode handed out again
+        conn.executescript("""
+            INSERT INTO changes
+                SELECT 'renamed', d.src, c.src, c.is_dir, c.inode, c.size, c.mtime, dirname(c.src)
+                FROM changes d JOIN changes c ON c.inode = d.inode AND c.is_dir = d.is_dir
+                WHERE d.kind = 'deleted' AND c.kind = 'created' AND d.inode != 0
+                  AND (c.is_dir OR (c.size = d.size AND c.mtime = d.mtime))
+                  AND (SELECT COUNT(*) FROM changes x WHERE x.inode = d.inode AND x.kind = 'deleted') = 1
+                  AND (SELECT COUNT(*) FROM changes x WHERE x.inode = c.inode AND x.kind = 'created') = 1;
+            DELETE FROM changes WHERE kind = 'deleted' AND src IN (SELECT src FROM changes WHERE kind = 'renamed');
+            DELETE FROM changes WHERE kind = 'created' AND src IN (SELECT dst FROM changes WHERE kind = 'renamed');
+        """)
+        # everything below a renamed folder moved along with it: report the folder only
+        moved, implied = {}, []
+        for rowid, src, dst, is_dir in conn.execute(
+                "SELECT rowid, src, dst, is_dir FROM changes WHERE kind = 'renamed' ORDER BY src").fetchall():
+            parent = os.path.dirname(src)
+            while parent not in moved and os.path.dirname(parent) != parent:
+                parent = os.path.dirname(parent)
+            if parent in moved and dst == moved[parent] + src[len(parent):]:
+                implied.append((rowid,))
+            elif is_dir:
+                moved[src] = dst
+        conn.executemany("DELETE FROM changes WHERE rowid = ?", implied)
+
+    def changes(self, burst_min):
+        """
+        The offline changes found by rescan(), oldest path first: ("burst",
+        folder, Counter of kinds) for folders with burst_min or more changes,
+        else ("event", {"kind", "src", "dst", "is_dir"}).
+        """
+        conn = self._conn
+        bursts = {}
+        for folder, kind, n in conn.execute("""
+                SELECT folder, kind, COUNT(*) FROM changes
+                WHERE folder IN (SELECT folder FROM changes GROUP BY folder HAVING COUNT(*) >= ?)
+                GROUP BY folder, kind""", (burst_min,)):
+            bursts.setdefault(folder, Counter())[kind] = n
+        for folder in sorted(bursts):
+            yield "burst", folder, bursts[folder]
+        for kind, src, dst, is_dir, folder in conn.execute(
+                "SELECT kind, src, dst, is_dir, folder FROM changes ORDER BY src"):
+            if folder not in bursts:
+                yield "event", {"kind": kind, "src": src, "dst": dst, "is_dir": bool(is_dir)}
+
+    def commit(self):
+        """Makes the last rescan the index."""
+        with self._lock:
+            self._conn.executescript("""
+                BEGIN;
+                DROP TABLE files;
+                ALTER TABLE scan RENAME TO files;
+                DROP TABLE changes;
+                COMMIT;
+            """)
+            self._conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+                ("root", self._root), ("scanned_at", datetime.utcnow().isoformat(timespec="seconds"))])
+            self._conn.commit()
+
+    # ---------- live updates ----------
+    def apply(self, entries):
+        """Queues coalesced live events (file_watcher's Coalescer entries) for the updater thread."""
+        self._updates.put(entries)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            # everything queued meanwhile goes into one transaction
+            batches = [self._updates.get()]
+            while True:
+                try:
+                    batches.append(self._updates.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batches
+            entries = [e for batch in batches if batch for e in batch]
+            if entries:
+                try:
+                    self._apply(entries)
+                except (OSError, sqlite3.Error) as e:
+                    with self._lock:
+                        if self._conn.in_transaction:
+                            self._conn.rollback()
+                    print(f"[INDEX] update failed ({e}); the next rescan catches up")
+
+    def _apply(self, entries):
+        with self._lock:
+            conn = self._conn
+            for e in entries:
+                kind, src, dst = e["kind"], e["src"], e["dst"]
+                if kind in ("deleted", "renamed"):
+                    conn.execute("DELETE FROM files WHERE path = ?", (src,))
+                    if e["is_dir"] and kind == "deleted":
+                        conn.execute("DELETE FROM files WHERE path > ? AND path < ?", _under(src))
+                    elif e["is_dir"]:
+                        conn.execute("DELETE FROM files WHERE path > ? AND path < ?", _under(dst))
+                        conn.execute("UPDATE files SET path = ? || substr(path, ?) WHERE path > ? AND path < ?",
+                                     (dst, len(src) + 1) + _under(src))
+                    if kind == "deleted":
+                        continue
+                path = dst or src
+                try:
+                    st = os.stat(path, follow_symlinks=False)
+                except OSError:
+                    conn.execute("DELETE FROM files WHERE path = ?", (path,))  # already gone again
+                    continue
+                conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", _row(path, st, e["is_dir"]))
+                if e["is_dir"] and kind == "created":
+                    # a folder moved in from outside arrives as one event; index what it holds
+                    for _, rows, _, _, _ in scan(path, self._rules, workers=4):
+                        conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", rows)
+            conn.commit()
+
+    def close(self):
+        """Applies the queued updates and closes the index."""
+        self._updates.put(None)
+        self._updater.join()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,113 @@
+import hashlib, json, os, sqlite3, time
+from db import MIGRATIONS
+
+# Persistent result cache for the summary tools.
+#
+# An entry holds a report's aggregate together with the newest audit_logs id
+# (and that entry's hash) it covers. Entries are never changed once logged,
+# so a repeat run only has to fold in the rows with higher ids; the stored
+# hash catches a log that was replaced or rebuilt underneath the cache, and
+# keys include the schema version, since a migration may rewrite the derived
+# columns reports group by.
+# Least recently used entries are evicted past the size cap.
+
+CACHE_FILE = os.getenv("AUDIT_REPORT_CACHE")  # default: report_cache.db next to the log
+MAX_BYTES = int(float(os.getenv("AUDIT_REPORT_CACHE_MB", "64")) * 1024 * 1024)
+MAX_ENTRIES = 512
+
+def high_water(conns, check_id=None):
+    """
+    (newest id, its hash, hash of entry check_id) across the given shard
+    connections, which are closed afterwards. (0, None, None) for an empty log.
+    """
+    top, top_hash, check_hash = 0, None, None
+    for conn in conns:
+        try:
+            row = conn.execute("SELECT id, hash FROM audit_logs ORDER BY id DESC LIMIT 1").fetchone()
+            if row and row[0] > top:
+                top, top_hash = row[0], row[1]
+            if check_id:
+                row = conn.execute("SELECT hash FROM audit_logs WHERE id = ?", (check_id,)).fetchone()
+                if row:
+                    check_hash = row[0]
+        finally:
+            conn.close()
+    return top, top_hash, check_hash
+
+class ReportCache:
+    def __init__(self, db_file, path=None):
+        self.db_file = os.path.abspath(db_file)
+        self.path = path or CACHE_FILE or os.path.join(os.path.dirname(self.db_file), "report_cache.db")
+        self.conn = sqlite3.connect(self.path, timeout=10)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS report_cache (
+                key TEXT PRIMARY KEY,
+                hwm INTEGER NOT NULL,
+                hwm_hash TEXT,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                used REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def key(self, report, **params):
+        raw = json.dumps([self.db_file, len(MIGRATIONS), report, params], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """-> (hwm, hwm_hash, value) or None."""
+        row = self.conn.execute("SELECT hwm, hwm_hash, value FROM report_cache WHERE key = ?", (key,)).fetchone()
+        return row and (row[0], row[1], json.loads(row[2]))
+
+    def put(self, key, hwm, hwm_hash, value):
+        data = json.dumps(value, separators=(",", ":"))
+        if len(data) > MAX_BYTES:
+            self.conn.execute("DELETE FROM report_cache WHERE key = ?", (key,))
+        else:
+            self.conn.execute("INSERT OR REPLACE INTO report_cache VALUES (?, ?, ?, ?, ?, ?)",
+                              (key, hwm, hwm_hash, data, len(data), time.time()))
+            self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        total, stale = 0, []
+        for n, (key, size) in enumerate(self.conn.execute("SELECT key, size FROM report_cache ORDER BY used DESC")):
+            total += size
+            if total > MAX_BYTES or n >= MAX_ENTRIES:
+                stale.append((key,))
+        self.conn.executemany("DELETE FROM report_cache WHERE key = ?", stale)
+
+    def close(self):
+        self.conn.close()
+
+def open_cache(db_file):
+    """The cache for db_file, or None when it cannot be opened (e.g. read-only folder)."""
+    try:
+        return ReportCache(db_file)
+    except sqlite3.Error:
+        return None
+
+def cached_report(cache, key, shards, compute, fold):
+    """
+    Run a report through the cache.
+
+    shards():              fresh connections to every shard (for high_water)
+    compute():             the full result, JSON-serialisable
+    fold(value, lo, hi):   value extended with the entries whose id is in (lo, hi]
+    """
+    if cache is None:
+        return compute()
+    entry = cache.get(key)
+    hwm, hwm_hash, seen = high_water(shards(), entry and entry[0])
+    if entry and entry[0] <= hwm and seen == entry[1]:
+        value = entry[2]
+        if hwm > entry[0]:
+            value = fold(value, entry[0], hwm)
+        cache.put(key, hwm, hwm_hash, value)  # also marks the entry recently used
+        return value
+    value = compute()
+    # only store a result that cannot include entries logged while it ran
+    if high_water(shards())[:2] == (hwm, hwm_hash):
+        cache.put(key, hwm, hwm_hash, value)
+    return value
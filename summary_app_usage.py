@@ -1,13 +1,15 @@
-import argparse, sqlite3, os, re, csv
+import argparse, sqlite3, os, csv, json, heapq
 from datetime import datetime, timedelta
 from collections import defaultdict
+from urllib.parse import quote
+from db import report_shards, rollup_span
+import columnar, report_cache
 
 DB_FILE = r"C:\AuditData\logs.db"  
-
-RE_EXE   = re.compile(r'exe="([^"]+)"')
-RE_TITLE = re.compile(r'title="([^"]*)"')
-RE_PATH  = re.compile(r'path="([^"]*)"')
-RE_DUR   = re.compile(r'duration=([\d.]+)s')
+SCHEMA_VERSION = 4  # needs the parsed columns and rollup tables added by db.py migrations
+FETCH_CHUNK = 5000  # rows pulled from each shard cursor at a time
+PARQUET_COLUMNS = [("id", "int64"), ("timestamp", "timestamp"), ("exe", "dictionary"),
+                   ("title", "string"), ("path", "string"), ("duration", "float64")]
 
 def parse_args():
     p = argparse.ArgumentParser(
@@ -19,6 +21,12 @@ def parse_args():
                    help="Group by executable only, or executable + window title")
     p.add_argument("--top", type=int, default=25, help="Show top N (default 25)")
     p.add_argument("--export-csv", metavar="FILE", help="Export detailed rows to CSV")
+    p.add_argument("--export-jsonl", metavar="FILE", help="Export detailed rows to JSON Lines")
+    p.add_argument("--export-parquet", metavar="DIR",
+                   help="Append focus sessions logged since the last run to a day-partitioned Parquet dataset")
+    p.add_argument("--raw", action="store_true", help="Aggregate raw rows even where hourly rollups could be used (skips the result cache)")
+    p.add_argument("--no-cache", action="store_true", help="Recompute instead of reusing and updating cached results")
+    p.add_argument("--explain", action="store_true", help="Print the SQLite query plan")
     return p.parse_args()
 
 def resolve_relative(ts):
@@ -32,23 +40,125 @@ def resolve_relative(ts):
         return (y - timedelta(days=1)).isoformat()
     return ts  # assume ISO
 
-def connect():
-    if not os.path.exists(DB_FILE):
-        raise SystemExit(f"DB not found: {DB_FILE}")
-    conn = sqlite3.connect(DB_FILE)
+def connect(path=None, readonly=False):
+    path = path or DB_FILE
+    if not os.path.exists(path):
+        raise SystemExit(f"DB not found: {path}")
+    if readonly:  # sealed shard
+        conn = sqlite3.connect(f"file:{quote(path.replace(os.sep, '/'), safe='/:')}?mode=ro&immutable=1", uri=True)
+    else:
+        conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        raise SystemExit("DB schema is out of date; run `python db.py` (or start app.py) to migrate it")
     return conn
 
-def fetch_focus_ends(since, until):
-    q = "SELECT timestamp, action FROM audit_logs WHERE action LIKE 'App focus end:%'"
+def shard_connections(since=None, until=None):
+    # only the shard files whose time range overlaps [since, until]
+    if not os.path.exists(DB_FILE):
+        raise SystemExit(f"DB not found: {DB_FILE}")
+    for path, readonly in report_shards(DB_FILE, since, until):
+        yield connect(path, readonly)
+
+def _cursor_rows(conn, cur):
+    # stream a result set in chunks; the connection closes once it is drained
+    try:
+        while True:
+            chunk = cur.fetchmany(FETCH_CHUNK)
+            if not chunk:
+                break
+            yield from chunk
+    finally:
+        conn.close()
+
+def print_plan(conn, q, params):
+    print(f"\n🔎 Query plan ({os.path.basename(conn.execute('PRAGMA database_list').fetchone()[2])}):")
+    depth = {0: -1}
+    for node_id, parent, _, detail in conn.execute("EXPLAIN QUERY PLAN " + q, params):
+        depth[node_id] = depth.get(parent, -1) + 1
+        print("   " + "  " * depth[node_id] + detail)
+
+def fetch_focus_ends(since, until, explain=False, before=None, ids=None):
+    # ids=(lo, hi): only entries with lo < id <= hi, found by rowid instead of the time index
+    q = (f"SELECT timestamp, exe, title, path, duration FROM audit_logs{' NOT INDEXED' if ids else ''} "
+         "WHERE event_type = 'App focus end' AND duration IS NOT NULL")
     params = []
+    if ids:
+        q += " AND id > ? AND id <= ?"; params += ids
     if since:
         q += " AND timestamp >= ?"; params.append(since)
     if until:
         q += " AND timestamp <= ?"; params.append(until)
-    q += " ORDER BY timestamp ASC"
-    with connect() as conn:
-        return conn.execute(q, params).fetchall()
+    if before:
+        q += " AND timestamp < ?"; params.append(before)
+    q += " ORDER BY timestamp ASC"  # served in order by idx_audit_logs_type_ts
+    streams = []
+    for conn in shard_connections(since, until or before):  # `before` bounds the shards too
+        if explain:
+            print_plan(conn, q, params)
+        streams.append(_cursor_rows(conn, conn.execute(q, params)))
+    return heapq.merge(*streams, key=lambda r: r["timestamp"])
+
+def fetch_hourly(lo, hi, explain=False):
+    # whole hours in [lo, hi), pre-aggregated at ingest (app_usage_hourly in db.py)
+    q = ("SELECT exe, SUM(sessions) AS sessions, SUM(seconds) AS seconds, "
+         "MIN(first_ts) AS first, MAX(last_ts) AS last FROM app_usage_hourly")
+    clauses, params = [], []
+    if lo:
+        clauses.append("hour >= ?"); params.append(lo)
+    if hi:
+        clauses.append("hour < ?"); params.append(hi)
+    if clauses:
+        q += " WHERE " + " AND ".join(clauses)
+    q += " GROUP BY exe"
+    rows = []
+    for conn in shard_connections(lo, hi):
+        with conn:
+            if explain:
+                print_plan(conn, q, params)
+            rows += conn.execute(q, params).fetchall()
+    return rows
+
+def detail_rows(since, until):
+    for r in fetch_focus_ends(since, until):
+        yield {
+            "timestamp": r["timestamp"],
+            "exe": (r["exe"] or "").lower(),
+            "title": r["title"] or "",
+            "path": r["path"] or "",
+            "duration_s": f"{r['duration']:.2f}"
+        }
+
+def export_csv(rows, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=["timestamp","exe","title","path","duration_s"])
+        w.writeheader()
+        for r in rows:
+            w.writerow(r)
+    print(f"\n✅ Exported details to: {path}")
+
+def export_jsonl(rows, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r, ensure_ascii=False))
+            f.write("\n")
+    print(f"\n✅ Exported details to: {path}")
+
+def export_parquet(path, explain=False):
+    # every shard in id order, picking up after the dataset's high-water mark
+    columnar.require()
+    last_id = columnar.last_exported_id(path, PARQUET_COLUMNS)
+    q = ("SELECT id, timestamp, exe, title, path, duration FROM audit_logs "
+         "WHERE event_type = 'App focus end' AND duration IS NOT NULL AND id > ? ORDER BY id")
+    def rows():
+        for conn in shard_connections():
+            conn.row_factory = None
+            if explain:
+                print_plan(conn, q, (last_id,))
+            for r in _cursor_rows(conn, conn.execute(q, (last_id,))):
+                yield (r[0], r[1], (r[2] or "").lower()) + r[3:]
+    n = columnar.write_dataset(path, PARQUET_COLUMNS, rows())
+    print(f"\n✅ Exported {n} new sessions to: {path}")
 
 def humanize_seconds(s):
     s = int(round(s))
@@ -72,42 +182,76 @@ def print_table(rows, headers):
     for r in rows: row(r)
     line()
 
-def main():
-    args = parse_args()
-    since = resolve_relative(args.since)
-    until = resolve_relative(args.until)
-
-    rows = fetch_focus_ends(since, until)
-
-    # Aggregate
-    agg = defaultdict(lambda: {"sessions": 0, "seconds": 0.0, "first": None, "last": None})
-    detailed_rows = []  # for CSV export
+def new_totals():
+    return defaultdict(lambda: {"sessions": 0, "seconds": 0.0, "first": None, "last": None})
 
+def add_rows(agg, rows, by):
     for r in rows:
         ts = r["timestamp"]
-        action = r["action"]
-        exe   = (RE_EXE.search(action).group(1) if RE_EXE.search(action) else "").lower()
-        title = RE_TITLE.search(action).group(1) if RE_TITLE.search(action) else ""
-        path  = RE_PATH.search(action).group(1) if RE_PATH.search(action) else ""
-        dur_m = RE_DUR.search(action)
-        if not dur_m:
-            continue
-        dur = float(dur_m.group(1))
-
-        key = exe if args.by == "exe" else f"{exe} | {title}"
+        exe   = (r["exe"] or "").lower()
+        title = r["title"] or ""
+        dur   = r["duration"]
+
+        key = exe if by == "exe" else f"{exe} | {title}"
         a = agg[key]
         a["sessions"] += 1
         a["seconds"]  += dur
         a["first"] = ts if not a["first"] else min(a["first"], ts)
         a["last"]  = ts if not a["last"]  else max(a["last"], ts)
+    return agg
+
+def summarize(since, until, by, raw=False, explain=False):
+    # Per-exe totals can come from the hourly rollups; only the partial hours
+    # at either end of the range are read row by row
+    span = None
+    if by == "exe" and not raw:
+        span = rollup_span(since, until, "hour")
+
+    agg = new_totals()
+
+    if span:
+        lo, hi = span
+        rows = []
+        if lo:
+            rows += fetch_focus_ends(since, None, explain=explain, before=lo)
+        if hi:
+            rows += fetch_focus_ends(hi, until, explain=explain)
+        for r in fetch_hourly(lo, hi, explain=explain):
+            a = agg[r["exe"]]
+            a["sessions"] += r["sessions"]
+            a["seconds"]  += r["seconds"]
+            a["first"] = r["first"] if not a["first"] else min(a["first"], r["first"])
+            a["last"]  = r["last"]  if not a["last"]  else max(a["last"], r["last"])
+    else:
+        rows = fetch_focus_ends(since, until, explain=explain)
+
+    return dict(add_rows(agg, rows, by))
+
+def app_totals(since, until, by="exe", raw=False, use_cache=True, explain=False):
+    """{key: {"sessions", "seconds", "first", "last"}}, through the result cache (--raw skips it)."""
+    # a repeat of an earlier report only reads the sessions logged since
+    def fold(totals, lo, hi):
+        rows = fetch_focus_ends(since, until, explain=explain, ids=(lo, hi))
+        return dict(add_rows(new_totals() | totals, rows, by))
+
+    cache = report_cache.open_cache(DB_FILE) if use_cache and not raw else None
+    try:
+        return report_cache.cached_report(
+            cache, cache and cache.key("app_usage", since=since, until=until, by=by),
+            shards=shard_connections,
+            compute=lambda: summarize(since, until, by, raw=raw, explain=explain),
+            fold=fold,
+        )
+    finally:
+        if cache:
+            cache.close()
+
+def main():
+    args = parse_args()
+    since = resolve_relative(args.since)
+    until = resolve_relative(args.until)
 
-        detailed_rows.append({
-            "timestamp": ts,
-            "exe": exe,
-            "title": title,
-            "path": path,
-            "duration_s": f"{dur:.2f}"
-        })
+    agg = app_totals(since, until, args.by, raw=args.raw, use_cache=not args.no_cache, explain=args.explain)
 
     # Sort by total time desc
     items = sorted(agg.items(), key=lambda kv: kv[1]["seconds"], reverse=True)
@@ -142,12 +286,13 @@ def main():
     else:
         print("(no data)")
 
+    # detail exports stream their own pass over the raw rows
     if args.export_csv:
-        with open(args.export_csv, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=["timestamp","exe","title","path","duration_s"])
-            w.writeheader()
-            w.writerows(detailed_rows)
-        print(f"\n✅ Exported details to: {args.export_csv}")
+        export_csv(detail_rows(since, until), args.export_csv)
+    if args.export_jsonl:
+        export_jsonl(detail_rows(since, until), args.export_jsonl)
+    if args.export_parquet:
+        export_parquet(args.export_parquet, explain=args.explain)
 
 if __name__ == "__main__":
     main()
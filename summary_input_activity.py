@@ -1,17 +1,55 @@
-import argparse, sqlite3, os, json, csv
+import argparse, sqlite3, os, csv, json, heapq, warnings
 from datetime import datetime, timedelta
 from collections import defaultdict
+from operator import itemgetter
 from html import escape
+from urllib.parse import quote
+from db import report_shards, rollup_span, load_input_events
+import columnar, report_cache
+
+try:
+    import numpy as np
+except ImportError:  # optional; bucket_sums() and finish() fall back to plain Python
+    np = None
 
 DB_FILE = r"C:\AuditData\logs.db"
+SCHEMA_VERSION = 5  # needs the input_activity, rollup and event blob tables added by db.py migrations
+FETCH_CHUNK = 5000  # rows pulled from each shard cursor at a time
+PARQUET_COLUMNS = [("id", "int64"), ("timestamp", "timestamp"), ("event_type", "dictionary"),
+                   ("bucket_ts", "timestamp"), ("keys", "int64"), ("clicks", "int64"),
+                   ("scrolls", "int64"), ("moves", "int64"), ("seconds", "float64")]
 
-def connect():
-    if not os.path.exists(DB_FILE):
-        raise SystemExit(f"DB not found: {DB_FILE}")
-    conn = sqlite3.connect(DB_FILE)
+def connect(path=None, readonly=False):
+    path = path or DB_FILE
+    if not os.path.exists(path):
+        raise SystemExit(f"DB not found: {path}")
+    if readonly:  # sealed shard
+        conn = sqlite3.connect(f"file:{quote(path.replace(os.sep, '/'), safe='/:')}?mode=ro&immutable=1", uri=True)
+    else:
+        conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        raise SystemExit("DB schema is out of date; run `python db.py` (or start app.py) to migrate it")
     return conn
 
+def shard_connections(since=None, until=None):
+    # only the shard files whose time range overlaps [since, until]
+    if not os.path.exists(DB_FILE):
+        raise SystemExit(f"DB not found: {DB_FILE}")
+    for path, readonly in report_shards(DB_FILE, since, until):
+        yield connect(path, readonly)
+
+def _cursor_rows(conn, cur):
+    # stream a result set in chunks; the connection closes once it is drained
+    try:
+        while True:
+            chunk = cur.fetchmany(FETCH_CHUNK)
+            if not chunk:
+                break
+            yield from chunk
+    finally:
+        conn.close()
+
 def resolve_relative(ts):
     if not ts: return None
     s = ts.lower()
@@ -23,58 +61,100 @@ def resolve_relative(ts):
         return (y - timedelta(days=1)).isoformat()
     return ts  # assume ISO
 
-def fetch_rows(since, until, include_events=True, include_summaries=True):
-    clauses = []
-    params = []
+def print_plan(conn, q, params):
+    print(f"\n🔎 Query plan ({os.path.basename(conn.execute('PRAGMA database_list').fetchone()[2])}):")
+    depth = {0: -1}
+    for node_id, parent, _, detail in conn.execute("EXPLAIN QUERY PLAN " + q, params):
+        depth[node_id] = depth.get(parent, -1) + 1
+        print("   " + "  " * depth[node_id] + detail)
 
+def _range_clauses(since, until, before=None):
+    clauses, params = [], []
     if since:
-        clauses.append("timestamp >= ?")
+        clauses.append("a.timestamp >= ?")
         params.append(since)
     if until:
-        clauses.append("timestamp <= ?")
+        clauses.append("a.timestamp <= ?")
         params.append(until)
+    if before:
+        clauses.append("a.timestamp < ?")
+        params.append(before)
+    return clauses, params
 
-    type_clause = []
+def fetch_rows(since, until, include_events=True, include_summaries=True, explain=False, before=None, ids=None):
+    # counts were parsed once at ingest into input_activity (see db.py);
+    # ids=(lo, hi): only entries with lo < id <= hi, found by rowid instead of the time index
+    types = []
     if include_summaries:
-        type_clause.append("action LIKE 'Input summary:%'")
+        types.append("Input summary")
     if include_events:
-        type_clause.append("action LIKE 'Input events:%'")
+        types.append("Input events")
 
-    where = "WHERE (" + " OR ".join(type_clause) + ")"
-    if clauses:
-        where += " AND " + " AND ".join(clauses)
+    clauses, params = _range_clauses(since, until, before)
+    clauses.insert(0, f"a.event_type IN ({','.join('?' * len(types))})")
+    params[:0] = types
+    if ids:
+        clauses.append("i.log_id > ? AND i.log_id <= ?")
+        params += ids
 
-    q = f"SELECT timestamp, action FROM audit_logs {where} ORDER BY timestamp ASC"
-    with connect() as conn:
-        return conn.execute(q, params).fetchall()
+    # same leading columns as fetch_minutely, so bucket_sums() can take either
+    q = ("SELECT i.bucket_ts, i.keys, i.clicks, i.scrolls, i.moves, i.seconds, a.timestamp, a.event_type "
+         f"FROM input_activity i JOIN audit_logs a{' NOT INDEXED' if ids else ''} ON a.id = i.log_id "
+         f"WHERE {' AND '.join(clauses)}")  # no ORDER BY: buckets are sorted after aggregation
+    rows = []
+    for conn in shard_connections(since, until or before):  # `before` bounds the shards too
+        conn.row_factory = None  # plain tuples transpose far faster in bucket_sums()
+        with conn:
+            if explain:
+                print_plan(conn, q, params)
+            rows += conn.execute(q, params).fetchall()
+    return rows
 
-def parse_summary_line(action):
-    # "Input summary: keys=... | clicks=... | scrolls=... | moves=... | interval=...s"
-    try:
-        _, detail = action.split(":", 1)
-        parts = [p.strip() for p in detail.split("|")]
-        d = {}
-        for p in parts:
-            if "=" in p:
-                k, v = p.split("=", 1)
-                d[k.strip()] = v.strip().rstrip("s")
-        return {
-            "keys": int(float(d.get("keys", "0"))),
-            "clicks": int(float(d.get("clicks", "0"))),
-            "scrolls": int(float(d.get("scrolls", "0"))),
-            "moves": int(float(d.get("moves", "0"))),
-            "interval_s": float(d.get("interval", "0") or 0)
-        }
-    except Exception:
-        return None
+def fetch_minutely(lo, hi, explain=False):
+    # whole minutes in [lo, hi), pre-aggregated at ingest (input_minutely in db.py)
+    q = ("SELECT bucket AS bucket_ts, SUM(keys) AS keys, SUM(clicks) AS clicks, SUM(scrolls) AS scrolls, "
+         "SUM(moves) AS moves, SUM(seconds) AS seconds FROM input_minutely")
+    clauses, params = [], []
+    if lo:
+        clauses.append("minute >= ?"); params.append(lo)
+    if hi:
+        clauses.append("minute < ?"); params.append(hi)
+    if clauses:
+        q += " WHERE " + " AND ".join(clauses)
+    q += " GROUP BY bucket"
+    rows = []
+    for conn in shard_connections(lo, hi):
+        conn.row_factory = None
+        with conn:
+            if explain:
+                print_plan(conn, q, params)
+            rows += conn.execute(q, params).fetchall()
+    return rows
 
-def parse_events_line(action):
-    try:
-        _, j = action.split(":", 1)
-        payload = json.loads(j.strip())
-        return payload
-    except Exception:
-        return None
+def fetch_event_payloads(since, until, explain=False):
+    clauses, params = _range_clauses(since, until)
+    clauses.insert(0, "a.event_type = 'Input events'")
+    q = ("SELECT a.timestamp, a.action, b.data AS blob FROM audit_logs a "
+         "LEFT JOIN input_event_blobs b ON b.log_id = a.id "
+         f"WHERE {' AND '.join(clauses)} ORDER BY a.timestamp ASC")
+    streams = []
+    for conn in shard_connections(since, until):
+        if explain:
+            print_plan(conn, q, params)
+        streams.append(_cursor_rows(conn, conn.execute(q, params)))
+    return heapq.merge(*streams, key=lambda r: r["timestamp"])
+
+def iter_events(since, until, explain=False):
+    """Flattened per-event dicts, decoded one window at a time."""
+    for r in fetch_event_payloads(since, until, explain=explain):
+        payload = load_input_events(r["action"], r["blob"])  # inline JSON or compact blob
+        if not payload:
+            continue
+        for ev in payload.get("events", []):
+            ev = dict(ev)
+            if "t" not in ev: ev["t"] = r["timestamp"]
+            if "e" not in ev: ev["e"] = "key"
+            yield ev
 
 def bucket_key(ts: datetime, bucket="hour"):
     if bucket == "minute":
@@ -83,6 +163,73 @@ def bucket_key(ts: datetime, bucket="hour"):
         return ts.replace(hour=0, minute=0, second=0, microsecond=0)
     return ts.replace(minute=0, second=0, microsecond=0)
 
+BUCKET_US = {"minute": 60 * 10**6, "hour": 3600 * 10**6, "day": 86400 * 10**6}
+
+def _bucket_sums_py(rows, bucket):
+    buckets = defaultdict(lambda: [0, 0, 0, 0, 0.0])
+    for bucket_ts, keys, clicks, scrolls, moves, seconds, *_ in rows:
+        agg = buckets[bucket_key(datetime.fromisoformat(bucket_ts), bucket)]
+        agg[0] += keys
+        agg[1] += clicks
+        agg[2] += scrolls
+        agg[3] += moves
+        agg[4] += seconds
+    return sorted((b.isoformat(sep=" "), *v) for b, v in buckets.items())
+
+def _bucket_sums_np(rows, bucket):
+    stamps, keys, clicks, scrolls, moves, seconds = (list(map(itemgetter(i), rows)) for i in range(6))
+    try:
+        with warnings.catch_warnings():
+            # numpy warns (and shifts to UTC) on timestamps with an offset; keep those local
+            warnings.simplefilter("error")
+            # ISO strings -> epoch microseconds in one C-level parse
+            epoch = np.array(stamps, dtype="datetime64[us]").astype(np.int64)
+    except (ValueError, UserWarning):
+        return None
+    step = BUCKET_US[bucket]
+    starts, inverse = np.unique(epoch // step, return_inverse=True)
+    # bincount adds in row order, so float sums match the Python loop exactly
+    sums = [np.bincount(inverse, weights=np.asarray(col, dtype=np.float64), minlength=len(starts))
+            for col in (keys, clicks, scrolls, moves, seconds)]
+    labels = np.char.replace(np.datetime_as_string((starts * step).astype("datetime64[us]"), unit="s"), "T", " ")
+    return list(zip(labels.tolist(), *(s.astype(np.int64).tolist() for s in sums[:4]), sums[4].tolist()))
+
+def bucket_sums(rows, bucket="hour"):
+    """
+    Sum (bucket_ts, keys, clicks, scrolls, moves, seconds, ...) rows per
+    bucket -> unrounded (bucket start, keys, clicks, scrolls, moves, seconds)
+    rows sorted by bucket start. Vectorised with numpy when installed;
+    timezone-qualified timestamps always take the Python path.
+    """
+    if np is not None and rows:
+        result = _bucket_sums_np(rows, bucket)
+        if result is not None:
+            return result
+    return _bucket_sums_py(rows, bucket)
+
+def merge_sums(a, b):
+    merged = {r[0]: list(r[1:]) for r in a}
+    for label, *v in b:
+        if label in merged:
+            merged[label] = [x + y for x, y in zip(merged[label], v)]
+        else:
+            merged[label] = v
+    return sorted((label, *v) for label, v in merged.items())
+
+def finish(sums, top=0):
+    """
+    -> (rows with rounded intervals, the `top` rows by total activity or None).
+    Ties keep bucket order, with numpy's stable argsort or Python's sorted().
+    """
+    out_rows = [(b, keys, clicks, scrolls, moves, round(seconds, 2)) for b, keys, clicks, scrolls, moves, seconds in sums]
+    if top <= 0:
+        return out_rows, None
+    if np is not None and out_rows:
+        totals = np.array(list(map(itemgetter(1, 2, 3, 4), out_rows)), dtype=np.int64).sum(axis=1)
+        order = np.argsort(-totals, kind="stable")[:top]
+        return out_rows, [out_rows[i] for i in order.tolist()]
+    return out_rows, sorted(out_rows, key=lambda r: (r[1]+r[2]+r[3]+r[4]), reverse=True)[:top]
+
 def print_table(rows, headers):
     widths = [len(h) for h in headers]
     for r in rows:
@@ -104,10 +251,20 @@ def export_csv_summary(rows, path):
             w.writerow(r)
     print(f"✅ Exported CSV summary: {path}")
 
-def export_csv_events(events_rows, path):
-    keys = set()
-    for ev in events_rows:
-        keys.update(ev.keys())
+def export_jsonl_summary(rows, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for b, keys, clicks, scrolls, moves, interval_s in rows:
+            f.write(json.dumps({"bucket_start": b, "keys": keys, "clicks": clicks, "scrolls": scrolls,
+                                "moves": moves, "interval_s": interval_s}))
+            f.write("\n")
+    print(f"✅ Exported JSONL summary: {path}")
+
+def export_csv_events(events_rows, path, keys=None):
+    # `keys` lets callers stream events_rows once; otherwise it is read twice
+    if keys is None:
+        keys = set()
+        for ev in events_rows:
+            keys.update(ev.keys())
     keys = ["t","e","k","b","dx","dy"] if not keys else sorted(keys)
     with open(path, "w", newline="", encoding="utf-8") as f:
         w = csv.DictWriter(f, fieldnames=keys)
@@ -116,14 +273,15 @@ def export_csv_events(events_rows, path):
             w.writerow(ev)
     print(f"✅ Exported CSV events: {path}")
 
+def export_jsonl_events(events_rows, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for ev in events_rows:
+            f.write(json.dumps(ev, ensure_ascii=False))
+            f.write("\n")
+    print(f"✅ Exported JSONL events: {path}")
+
 def export_html_summary(rows, path, title="Input Activity Summary"):
-    html_rows = []
-    for r in rows:
-        b, keys, clicks, scrolls, moves, interval_s = r
-        html_rows.append(
-            f"<tr><td>{escape(str(b))}</td><td>{keys}</td><td>{clicks}</td><td>{scrolls}</td><td>{moves}</td><td>{interval_s}</td></tr>"
-        )
-    html = f"""<!doctype html>
+    head = f"""<!doctype html>
 <html><head><meta charset="utf-8"><title>{escape(title)}</title>
 <style>
 body{{font-family:Segoe UI,Arial,sans-serif;padding:16px}}
@@ -139,14 +297,65 @@ tr:nth-child(even){{background:#fafafa}}
     <tr><th>Bucket</th><th>Keys</th><th>Clicks</th><th>Scrolls</th><th>Moves</th><th>Interval(s)</th></tr>
   </thead>
   <tbody>
-    {''.join(html_rows)}
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(head)
+        for b, keys, clicks, scrolls, moves, interval_s in rows:
+            f.write(f"<tr><td>{escape(str(b))}</td><td>{keys}</td><td>{clicks}</td><td>{scrolls}</td>"
+                    f"<td>{moves}</td><td>{interval_s}</td></tr>")
+        f.write("""
   </tbody>
 </table>
-</body></html>"""
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(html)
+</body></html>""")
     print(f"✅ Exported HTML summary: {path}")
 
+def export_parquet(path, explain=False):
+    # every shard in id order, picking up after the dataset's high-water mark
+    columnar.require()
+    last_id = columnar.last_exported_id(path, PARQUET_COLUMNS)
+    q = ("SELECT i.log_id, a.timestamp, a.event_type, i.bucket_ts, i.keys, i.clicks, i.scrolls, i.moves, i.seconds "
+         "FROM input_activity i JOIN audit_logs a ON a.id = i.log_id WHERE i.log_id > ? ORDER BY i.log_id")
+    def rows():
+        for conn in shard_connections():
+            conn.row_factory = None
+            if explain:
+                print_plan(conn, q, (last_id,))
+            yield from _cursor_rows(conn, conn.execute(q, (last_id,)))
+    n = columnar.write_dataset(path, PARQUET_COLUMNS, rows())
+    print(f"✅ Exported Parquet: {n} new rows to {path}")
+
+def activity_sums(since, until, bucket="hour", raw=False, use_cache=True, explain=False):
+    """Unrounded bucket_sums() over the range, through the result cache (--raw skips it)."""
+    def compute():
+        # every bucket size is a multiple of a minute, so whole minutes of the
+        # range come from the rollups and only the partial ones at the ends are
+        # read row by row
+        span = None if raw else rollup_span(since, until, "minute")
+        if span:
+            lo, hi = span
+            rows = fetch_minutely(lo, hi, explain=explain)
+            if lo:
+                rows += fetch_rows(since, None, explain=explain, before=lo)
+            if hi:
+                rows += fetch_rows(hi, until, explain=explain)
+        else:
+            rows = fetch_rows(since, until, include_events=True, include_summaries=True, explain=explain)
+        return bucket_sums(rows, bucket)
+
+    # cached sums are kept unrounded; a repeat run only adds the newer entries
+    def fold(sums, lo, hi):
+        return merge_sums(sums, bucket_sums(fetch_rows(since, until, explain=explain, ids=(lo, hi)), bucket))
+
+    cache = report_cache.open_cache(DB_FILE) if use_cache and not raw else None
+    try:
+        return report_cache.cached_report(
+            cache, cache and cache.key("input_activity", since=since, until=until, bucket=bucket),
+            shards=shard_connections, compute=compute, fold=fold,
+        )
+    finally:
+        if cache:
+            cache.close()
+
 def main():
     p = argparse.ArgumentParser(description="Input Activity Summary (from Input summary/Input events rows)")
     p.add_argument("--since", help="ISO time or 'today'/'yesterday'")
@@ -154,58 +363,21 @@ def main():
     p.add_argument("--bucket", choices=["minute","hour","day"], default="hour", help="Aggregate bucket size")
     p.add_argument("--export-csv", metavar="FILE", help="Export the summary table to CSV")
     p.add_argument("--export-html", metavar="FILE", help="Export the summary table to HTML")
+    p.add_argument("--export-jsonl", metavar="FILE", help="Export the summary table to JSON Lines")
     p.add_argument("--export-events-csv", metavar="FILE", help="Export flattened per-event rows to CSV")
+    p.add_argument("--export-events-jsonl", metavar="FILE", help="Export flattened per-event rows to JSON Lines")
+    p.add_argument("--export-parquet", metavar="DIR",
+                   help="Append input rows logged since the last run to a day-partitioned Parquet dataset")
     p.add_argument("--top", type=int, default=0, help="Show only top N buckets by total activity")
+    p.add_argument("--raw", action="store_true", help="Aggregate raw rows even where per-minute rollups could be used (skips the result cache)")
+    p.add_argument("--no-cache", action="store_true", help="Recompute instead of reusing and updating cached results")
+    p.add_argument("--explain", action="store_true", help="Print the SQLite query plan")
     args = p.parse_args()
 
     since = resolve_relative(args.since)
     until = resolve_relative(args.until)
-    rows = fetch_rows(since, until, include_events=True, include_summaries=True)
-
-    buckets = defaultdict(lambda: {"keys":0,"clicks":0,"scrolls":0,"moves":0,"interval_s":0.0})
-    flat_events = []
-
-    for r in rows:
-        ts = datetime.fromisoformat(r["timestamp"])
-        bkey = bucket_key(ts, args.bucket)
-        act = r["action"]
-
-        if act.startswith("Input summary:"):
-            d = parse_summary_line(act)
-            if d:
-                agg = buckets[bkey]
-                agg["keys"] += d["keys"]
-                agg["clicks"] += d["clicks"]
-                agg["scrolls"] += d["scrolls"]
-                agg["moves"] += d["moves"]
-                agg["interval_s"] += d["interval_s"]
-
-        elif act.startswith("Input events:"):
-            payload = parse_events_line(act)
-            if payload:
-                try:
-                    wstart = datetime.fromisoformat(payload["window"]["start"])
-                    bkey = bucket_key(wstart, args.bucket)
-                except Exception:
-                    pass
-                cnts = payload.get("counts", {})
-                agg = buckets[bkey]
-                agg["keys"] += int(cnts.get("keys", 0))
-                agg["clicks"] += int(cnts.get("clicks", 0))
-                agg["scrolls"] += int(cnts.get("scrolls", 0))
-                agg["moves"] += int(cnts.get("moves", 0))
-                agg["interval_s"] += float(payload.get("window",{}).get("seconds", 0.0) or 0)
-                for ev in payload.get("events", []):
-                    ev = dict(ev)
-                    if "t" not in ev: ev["t"] = r["timestamp"]
-                    if "e" not in ev: ev["e"] = "key"
-                    flat_events.append(ev)
-
-    out_rows = []
-    for b, v in buckets.items():
-        out_rows.append((b.isoformat(sep=" "), v["keys"], v["clicks"], v["scrolls"], v["moves"], round(v["interval_s"],2)))
-
-    out_rows.sort(key=lambda x: x[0])
+    sums = activity_sums(since, until, args.bucket, raw=args.raw, use_cache=not args.no_cache, explain=args.explain)
+    out_rows, ranked = finish(sums, args.top)
 
     print("\n⌨️ Input Activity Summary\n")
     if since or until:
@@ -214,8 +386,7 @@ def main():
         print(f"Bucket: {args.bucket}")
     print()
 
-    if args.top and args.top > 0:
-        ranked = sorted(out_rows, key=lambda r: (r[1]+r[2]+r[3]+r[4]), reverse=True)[:args.top]
+    if ranked is not None:
         print_table(ranked, ["Bucket Start", "Keys", "Clicks", "Scrolls", "Moves", "Interval(s)"])
     else:
         print_table(out_rows, ["Bucket Start", "Keys", "Clicks", "Scrolls", "Moves", "Interval(s)"])
@@ -224,8 +395,19 @@ def main():
         export_csv_summary(out_rows, args.export_csv)
     if args.export_html:
         export_html_summary(out_rows, args.export_html, title=f"Input Activity Summary ({args.bucket})")
-    if args.export_events_csv and flat_events:
-        export_csv_events(flat_events, args.export_events_csv)
+    if args.export_jsonl:
+        export_jsonl_summary(out_rows, args.export_jsonl)
+    # event exports stream from the DB; the CSV header needs a first pass for the column set
+    if args.export_events_csv:
+        keys = set()
+        for ev in iter_events(since, until):
+            keys.update(ev.keys())
+        # no events: export_csv_events still writes the default header
+        export_csv_events(iter_events(since, until, explain=args.explain), args.export_events_csv, keys)
+    if args.export_events_jsonl:
+        export_jsonl_events(iter_events(since, until, explain=args.explain), args.export_events_jsonl)
+    if args.export_parquet:
+        export_parquet(args.export_parquet, explain=args.explain)
 
 if __name__ == "__main__":
     main()
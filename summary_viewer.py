@@ -1,20 +1,56 @@
 import argparse
 import sqlite3
 import csv
+import json
 import os
+import heapq
 from datetime import datetime
+from itertools import islice
 from collections import Counter
 from html import escape
+from urllib.parse import quote
+from db import report_shards
+from action_format import split_event
+import columnar, report_cache
 
 DB_FILE = r"C:\AuditData\logs.db"   # must match db.py
+SCHEMA_VERSION = 1  # needs the parsed columns added by db.py migrations
+FETCH_CHUNK = 5000  # rows pulled from each shard cursor at a time
+PARQUET_COLUMNS = [("id", "int64"), ("timestamp", "timestamp"), ("event_type", "dictionary"),
+                   ("detail", "string"), ("exe", "dictionary"), ("title", "string"),
+                   ("path", "string"), ("duration", "float64"), ("pid", "int64")]
 
-def connect():
-    if not os.path.exists(DB_FILE):
-        raise SystemExit(f"DB not found: {DB_FILE}")
-    conn = sqlite3.connect(DB_FILE)
+def connect(path=None, readonly=False):
+    path = path or DB_FILE
+    if not os.path.exists(path):
+        raise SystemExit(f"DB not found: {path}")
+    if readonly:  # sealed shard
+        conn = sqlite3.connect(f"file:{quote(path.replace(os.sep, '/'), safe='/:')}?mode=ro&immutable=1", uri=True)
+    else:
+        conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        raise SystemExit("DB schema is out of date; run `python db.py` (or start app.py) to migrate it")
     return conn
 
+def shard_connections(since=None, until=None):
+    # only the shard files whose time range overlaps [since, until]
+    if not os.path.exists(DB_FILE):
+        raise SystemExit(f"DB not found: {DB_FILE}")
+    for path, readonly in report_shards(DB_FILE, since, until):
+        yield connect(path, readonly)
+
+def _cursor_rows(conn, cur):
+    # stream a result set in chunks; the connection closes once it is drained
+    try:
+        while True:
+            chunk = cur.fetchmany(FETCH_CHUNK)
+            if not chunk:
+                break
+            yield from chunk
+    finally:
+        conn.close()
+
 def parse_args():
     p = argparse.ArgumentParser(
         description="Audit Log Summary Viewer (filters, grouping, export)"
@@ -23,12 +59,20 @@ def parse_args():
     p.add_argument("--until", help="ISO time (e.g. 2025-08-09T23:59:59)")
     p.add_argument("--type", dest="atype", help='Filter by action type substring (e.g. "File created")')
     p.add_argument("--contains", help='Filter rows whose "action" contains this text (e.g. "Downloads")')
+    p.add_argument("--query", help='Full-text query with AND/OR/NOT and "phrases" '
+                                   '(e.g. \'Downloads AND "File created" NOT .tmp\'); terms need 3+ characters')
     p.add_argument("--group", choices=["type", "path", "none"], default="type",
                    help="Group summary by 'type', 'path', or 'none' for raw rows")
     p.add_argument("--top", type=int, default=10, help="Show top N when grouping by type/path (default 10)")
     p.add_argument("--export-csv", metavar="FILE", help="Export filtered rows to CSV")
     p.add_argument("--export-html", metavar="FILE", help="Export filtered rows to HTML")
+    p.add_argument("--export-jsonl", metavar="FILE", help="Export filtered rows to JSON Lines")
+    p.add_argument("--export-parquet", metavar="DIR",
+                   help="Append entries logged since the last run to a day-partitioned Parquet dataset "
+                        "(all entries; the filters above do not apply)")
     p.add_argument("--limit", type=int, default=0, help="Limit raw rows shown (0 = all)")
+    p.add_argument("--no-cache", action="store_true", help="Recompute the summary instead of reusing cached results")
+    p.add_argument("--explain", action="store_true", help="Print the SQLite query plan for each query")
     return p.parse_args()
 
 def resolve_relative(ts):
@@ -43,45 +87,153 @@ def resolve_relative(ts):
     # assume ISO
     return ts
 
-def fetch_rows(args):
-    q = "SELECT timestamp, action FROM audit_logs WHERE 1=1"
-    params = []
+def print_plan(conn, q, params):
+    print(f"\n🔎 Query plan ({os.path.basename(conn.execute('PRAGMA database_list').fetchone()[2])}):")
+    depth = {0: -1}
+    for node_id, parent, _, detail in conn.execute("EXPLAIN QUERY PLAN " + q, params):
+        depth[node_id] = depth.get(parent, -1) + 1
+        print("   " + "  " * depth[node_id] + detail)
+
+def matching_types(conn, text):
+    # hop through the distinct event types with index seeks instead of a
+    # scan, then apply LIKE's case-insensitive substring match in Python
+    q = """
+        WITH RECURSIVE t(v) AS (
+            SELECT MIN(event_type) FROM audit_logs
+            UNION ALL
+            SELECT (SELECT MIN(event_type) FROM audit_logs WHERE event_type > t.v) FROM t WHERE t.v IS NOT NULL
+        )
+        SELECT v FROM t WHERE v IS NOT NULL
+    """
+    needle = text.lower()
+    return [r[0] for r in conn.execute(q) if needle in r[0].lower()]
+
+def has_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'audit_fts'").fetchone() is not None
+
+def fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+def build_filter(conn, args):
+    clauses, params = [], []
     since = resolve_relative(args.since)
     until = resolve_relative(args.until)
 
     if since:
-        q += " AND timestamp >= ?"
+        clauses.append("timestamp >= ?")
         params.append(since)
     if until:
-        q += " AND timestamp <= ?"
+        clauses.append("timestamp <= ?")
         params.append(until)
     if args.atype:
-        q += " AND action LIKE ?"
-        params.append(f"%{args.atype}%")
+        types = matching_types(conn, args.atype)
+        clauses.append(f"event_type IN ({','.join('?' * len(types))})" if types else "0")
+        params.extend(types)
+    fts = has_fts(conn)
     if args.contains:
-        q += " AND action LIKE ?"
-        params.append(f"%{args.contains}%")
+        # the trigram index needs at least 3 characters to narrow anything down
+        if fts and len(args.contains) >= 3:
+            clauses.append("id IN (SELECT rowid FROM audit_fts WHERE audit_fts MATCH ?)")
+            params.append(fts_phrase(args.contains))
+        else:
+            clauses.append("action LIKE ?")
+            params.append(f"%{args.contains}%")
+    if args.query:
+        if not fts:
+            raise SystemExit("--query needs the full-text index; run `python db.py` with an FTS5-enabled SQLite")
+        clauses.append("id IN (SELECT rowid FROM audit_fts WHERE audit_fts MATCH ?)")
+        params.append(args.query)
 
-    q += " ORDER BY timestamp DESC"
-    with connect() as conn:
-        rows = conn.execute(q, params).fetchall()
-    return rows
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where, params
+
+def fetch_rows(args, explain=False):
+    """Filtered rows, newest first, streamed from every shard (constant memory)."""
+    streams = []
+    for conn in shard_connections(resolve_relative(args.since), resolve_relative(args.until)):
+        where, params = build_filter(conn, args)
+        q = f"SELECT timestamp, action, event_type, path FROM audit_logs{where} ORDER BY timestamp DESC"
+        if explain:
+            print_plan(conn, q, params)
+        try:
+            cur = conn.execute(q, params)  # runs the first step, so bad --query syntax fails here
+        except sqlite3.OperationalError as e:
+            raise SystemExit(f"Invalid search: {e}")
+        streams.append(_cursor_rows(conn, cur))
+    return heapq.merge(*streams, key=lambda r: r["timestamp"], reverse=True)
+
+def fetch_page(args, limit, before=None):
+    """
+    Up to `limit` filtered rows (id, timestamp, action), newest first, for
+    keyset pagination: `before` is the (timestamp, id) of the previous page's
+    last row.
+    """
+    streams = []
+    for conn in shard_connections(resolve_relative(args.since), resolve_relative(args.until)):
+        conn.row_factory = None
+        where, params = build_filter(conn, args)
+        if before:
+            where += (" AND" if where else " WHERE") + " timestamp <= ? AND (timestamp < ? OR id < ?)"
+            params += [before[0], before[0], before[1]]
+        q = f"SELECT id, timestamp, action FROM audit_logs{where} ORDER BY timestamp DESC, id DESC LIMIT ?"
+        try:
+            rows = conn.execute(q, params + [limit]).fetchall()
+        except sqlite3.OperationalError as e:
+            raise SystemExit(f"Invalid search: {e}")
+        finally:
+            conn.close()
+        streams.append(rows)
+    return list(islice(heapq.merge(*streams, key=lambda r: (r[1], r[0]), reverse=True), limit))
 
 def split_action(row_action):
-    if ":" in row_action:
-        a, d = row_action.split(":", 1)
-        return a.strip(), d.strip()
-    return row_action.strip(), ""
+    # Action Type / Detail columns: labels such as "(from: a to: b)" stay in
+    # the type; grouping uses the label-free event_type parsed at ingest
+    return split_event(row_action, labels=True)
 
-def group_summary(rows, by="type", top=10):
+def count_items(args, by, ids=None):
+    # ids=(lo, hi): only entries with lo < id <= hi, found by rowid instead of the indexes
+    key = "event_type" if by == "type" else "COALESCE(path, event_type)"
+    counter = Counter()
+    for conn in shard_connections(resolve_relative(args.since), resolve_relative(args.until)):
+        with conn:
+            where, params = build_filter(conn, args)
+            table = "audit_logs"
+            if ids:
+                where += (" AND" if where else " WHERE") + " id > ? AND id <= ?"
+                params += ids
+                table += " NOT INDEXED"
+            q = f"SELECT {key} AS item, COUNT(*) AS n FROM {table}{where} GROUP BY item"
+            if args.explain:
+                print_plan(conn, q, params)
+            try:
+                for r in conn.execute(q, params):
+                    counter[r["item"]] += r["n"]
+            except sqlite3.OperationalError as e:
+                raise SystemExit(f"Invalid search: {e}")
+    return counter
+
+def group_counts(args, by="type"):
+    """[item, count] pairs for every item, through the result cache (--no-cache skips it)."""
+    # a repeat run only counts the entries logged since
+    def fold(pairs, lo, hi):
+        counter = Counter(dict(pairs)) + count_items(args, by, ids=(lo, hi))
+        return list(counter.items())
+
+    cache = None if args.no_cache else report_cache.open_cache(DB_FILE)
+    key = cache and cache.key("viewer_group", by=by, since=resolve_relative(args.since),
+                              until=resolve_relative(args.until), type=args.atype,
+                              contains=args.contains, query=args.query)
+    try:
+        return report_cache.cached_report(cache, key, shards=shard_connections,
+                                          compute=lambda: list(count_items(args, by).items()), fold=fold)
+    finally:
+        if cache:
+            cache.close()
+
+def group_summary(args, by="type", top=10):
     if by == "none":
         return None
-    counter = Counter()
-    for r in rows:
-        a, d = split_action(r["action"])
-        key = a if by == "type" else (d if d else a)
-        counter[key] += 1
-    return counter.most_common(top)
+    return sorted(group_counts(args, by), key=lambda kv: (-kv[1], kv[0]))[:top]
 
 def print_table(headers, data):
     # simple fixed-width print
@@ -104,16 +256,16 @@ def export_csv(rows, path):
             w.writerow([r["timestamp"], at, dt])
     print(f"✅ Exported CSV: {path}")
 
+def export_jsonl(rows, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for r in rows:
+            at, dt = split_action(r["action"])
+            f.write(json.dumps({"timestamp": r["timestamp"], "action_type": at, "detail": dt}, ensure_ascii=False))
+            f.write("\n")
+    print(f"✅ Exported JSONL: {path}")
+
 def export_html(rows, path, title="Audit Log Report"):
-    html_rows = []
-    for r in rows:
-        at, dt = split_action(r["action"])
-        html_rows.append(
-            f"<tr><td>{escape(r['timestamp'])}</td>"
-            f"<td>{escape(at)}</td>"
-            f"<td>{escape(dt)}</td></tr>"
-        )
-    html = f"""<!doctype html>
+    head = f"""<!doctype html>
 <html><head><meta charset="utf-8"><title>{escape(title)}</title>
 <style>
 body{{font-family:Segoe UI,Arial,sans-serif;padding:16px}}
@@ -127,21 +279,42 @@ tr:nth-child(even){{background:#fafafa}}
 <table>
   <thead><tr><th>Timestamp</th><th>Action Type</th><th>Detail</th></tr></thead>
   <tbody>
-    {''.join(html_rows)}
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(head)
+        for r in rows:
+            at, dt = split_action(r["action"])
+            f.write(f"<tr><td>{escape(r['timestamp'])}</td>"
+                    f"<td>{escape(at)}</td>"
+                    f"<td>{escape(dt)}</td></tr>")
+        f.write("""
   </tbody>
 </table>
-</body></html>"""
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(html)
+</body></html>""")
     print(f"✅ Exported HTML: {path}")
 
+def export_parquet(path, explain=False):
+    # every shard in id order, picking up after the dataset's high-water mark
+    columnar.require()
+    last_id = columnar.last_exported_id(path, PARQUET_COLUMNS)
+    q = ("SELECT id, timestamp, event_type, action, exe, title, path, duration, pid "
+         "FROM audit_logs WHERE id > ? ORDER BY id")
+    def rows():
+        for conn in shard_connections():
+            conn.row_factory = None
+            if explain:
+                print_plan(conn, q, (last_id,))
+            for r in _cursor_rows(conn, conn.execute(q, (last_id,))):
+                yield (r[0], r[1], r[2], split_event(r[3])[1]) + r[4:]
+    n = columnar.write_dataset(path, PARQUET_COLUMNS, rows())
+    print(f"✅ Exported Parquet: {n} new rows to {path}")
+
 def main():
     args = parse_args()
-    rows = fetch_rows(args)
 
-    # Summary
+    # Summary (aggregated in SQL, no rows loaded)
     if args.group != "none":
-        summary = group_summary(rows, by=args.group, top=args.top)
+        summary = group_summary(args, by=args.group, top=args.top)
         if args.group == "type":
             print("\n📊 Actions by Type:\n")
         else:
@@ -155,8 +328,8 @@ def main():
     if args.group == "none":
         print("\n🧾 Rows:\n")
         data = []
-        lim = args.limit if args.limit > 0 else len(rows)
-        for r in rows[:lim]:
+        rows = fetch_rows(args, explain=args.explain)
+        for r in islice(rows, args.limit) if args.limit > 0 else rows:
             at, dt = split_action(r["action"])
             data.append((r["timestamp"], at, dt))
         if data:
@@ -164,11 +337,15 @@ def main():
         else:
             print("(no data)")
 
-    # Exports
+    # Exports (each streams its own pass over the rows)
     if args.export_csv:
-        export_csv(rows, args.export_csv)
+        export_csv(fetch_rows(args, explain=args.explain), args.export_csv)
     if args.export_html:
-        export_html(rows, args.export_html, title="Audit Log Report")
+        export_html(fetch_rows(args, explain=args.explain), args.export_html, title="Audit Log Report")
+    if args.export_jsonl:
+        export_jsonl(fetch_rows(args, explain=args.explain), args.export_jsonl)
+    if args.export_parquet:
+        export_parquet(args.export_parquet, explain=args.explain)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,26 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+
+
+@pytest.fixture
+def log_db(tmp_path, monkeypatch):
+    """A fresh, migrated log in tmp_path; yields the db module."""
+    monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "logs.db"))
+    monkeypatch.setattr(db, "_writer", db.ChainWriter())
+    db.init_db()
+    yield db
+    db._writer._reset()
+    for key in [k for k in db._pools if k[0].startswith(str(tmp_path))]:
+        db.drop_pools(key[0])
+
+
+@pytest.fixture
+def client(log_db, monkeypatch):
+    """Flask test client for app.py against log_db, with the bearer token set."""
+    import app
+    monkeypatch.setattr(app, "ingest", None)
+    return app.app.test_client(), {"Authorization": f"Bearer {app.API_TOKEN}"}
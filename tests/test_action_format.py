@@ -0,0 +1,35 @@
+import pytest
+
+from action_format import SAMPLES, parse, split_event
+
+
+@pytest.mark.parametrize("action, event_type, path", [
+    ("File renamed (from: a.txt to: b.txt): C:/x/a.txt -> C:/x/b.txt", "File renamed", "C:/x/b.txt"),
+    ("Folder created (name: New folder (2)): C:/x/New folder (2)", "Folder created", "C:/x/New folder (2)"),
+    ("File renamed (from: a (1).txt to: b.txt): C:/x/a (1).txt -> C:/x/b.txt", "File renamed", "C:/x/b.txt"),
+    ("Folder renamed (from: New folder (2) to: New folder (3)): C:/x/New folder (2) -> C:/x/New folder (3)",
+     "Folder renamed", "C:/x/New folder (3)"),
+    ("File renamed (offline) (from: a (1).txt to: b.txt): C:/a (1).txt -> C:/b.txt",
+     "File renamed (offline)", "C:/b.txt"),
+    ("File created (offline): C:/x/notes (1).txt", "File created (offline)", "C:/x/notes (1).txt"),
+])
+def test_labels_are_dropped_from_the_type(action, event_type, path):
+    parsed = parse(action)
+    assert parsed.event_type == event_type
+    assert parsed.path == path
+
+
+def test_labels_kept_on_request():
+    action = "Folder created (name: New folder (2)): C:/x/New folder (2)"
+    assert split_event(action, labels=True) == ("Folder created (name: New folder (2))", "C:/x/New folder (2)")
+
+
+def test_app_fields():
+    parsed = parse('App focus end: pid=42 | exe="code.exe" | title="a | b" | duration=12.50s | reason=focus_switch')
+    assert (parsed.event_type, parsed.exe, parsed.title, parsed.duration, parsed.pid) == \
+        ("App focus end", "code.exe", "a | b", 12.5, 42)
+
+
+@pytest.mark.parametrize("line, event_type", SAMPLES)
+def test_benchmark_samples_parse_to_their_types(line, event_type):
+    assert parse(line).event_type == event_type
@@ -0,0 +1,35 @@
+import pytest
+
+
+@pytest.mark.parametrize("route, body", [
+    ("/log", ["File created: C:/x"]), ("/log", "File created: C:/x"), ("/log", 5),
+    ("/log", {"action": 5}), ("/log", {"action": "  "}),
+    ("/log-batch", ["File created: C:/x"]), ("/log-batch", "File created: C:/x"), ("/log-batch", 5),
+    ("/log-batch", {"actions": []}), ("/log-batch", {"actions": "File created: C:/x"}),
+])
+def test_malformed_bodies_are_400(client, route, body):
+    client, headers = client
+    assert client.post(route, json=body, headers=headers).status_code == 400
+
+
+def test_batch_skips_bad_items(client):
+    client, headers = client
+    resp = client.post("/log-batch", json={"actions": ["File created: C:/x", 5, " ", "File deleted: C:/x"]},
+                       headers=headers)
+    assert resp.status_code == 201
+    assert [e["action"] for e in resp.get_json()["logged"]] == ["File created: C:/x", "File deleted: C:/x"]
+
+
+@pytest.mark.parametrize("asked, expected", [("100000", None), ("-4", 1), ("0", 1), ("1", 1)])
+def test_parallel_verify_workers_are_clamped(client, monkeypatch, asked, expected):
+    import os
+    import app
+    seen = []
+
+    def verify_parallel(workers=None):
+        seen.append(workers)
+        return {"ok": True, "mode": "parallel", "checked": 0, "first_id": None, "last_id": None}
+    monkeypatch.setattr(app, "verify_parallel", verify_parallel)
+    client, headers = client
+    assert client.get(f"/verify?mode=parallel&workers={asked}", headers=headers).status_code == 200
+    assert seen == [expected or os.cpu_count() or 1]
@@ -0,0 +1,72 @@
+import json
+import sqlite3
+
+import pytest
+
+import event_codec
+
+START = "2026-10-17T09:15:59.870"
+EVENTS = [
+    {"t": "2026-10-17T09:15:59.871", "e": "key", "k": "a"},
+    {"t": "2026-10-17T09:15:59.999", "e": "key", "k": "shift"},
+    {"t": "2026-10-17T09:16:00.000", "e": "click", "b": "left"},  # crosses a second
+    {"t": "2026-10-17T09:16:00.000", "e": "move"},                 # same millisecond
+    {"t": "2026-10-17T09:16:03.250", "e": "scroll", "dx": -3, "dy": 32767},
+    {"t": "2026-10-17T09:16:09.999", "e": "key", "k": "ü"},
+    {"t": "2026-10-17T09:16:09.999", "e": "key", "k": "a"},
+]
+
+
+def test_columnar_round_trip():
+    codec, data = event_codec.pack(START, EVENTS)
+    assert codec == event_codec.VERSION
+    assert event_codec.unpack(codec, START, data) == EVENTS
+
+
+def test_empty_window():
+    codec, data = event_codec.pack(START, [])
+    assert event_codec.unpack(codec, START, data) == []
+
+
+@pytest.mark.parametrize("start, events", [
+    (START, [{"t": "2026-10-17T09:16:00.000123", "e": "move"}]),        # finer than 1 ms
+    (START, [{"t": "2026-10-17T09:16:00.000", "e": "wheel"}]),          # unknown kind
+    (START, [{"t": "2026-10-17T09:16:00.000", "e": "key", "k": "a", "extra": 1}]),
+    (START, [{"t": "2026-10-17T09:16:00.000", "e": "click", "b": 1}]),  # non-string name
+    (START, [{"t": "2026-10-17T09:16:00.000", "e": "scroll", "dx": 0, "dy": 40000}]),
+    (START, [{"t": "2026-10-17T09:16:00.000", "e": "key", "k": "x" * 300}]),
+    (None, [{"t": "2026-10-17T09:16:00.000", "e": "move"}]),           # no window start
+    (START, "not a list"),
+])
+def test_lossy_payloads_fall_back_to_json(start, events):
+    codec, data = event_codec.pack(start, events)
+    assert codec == event_codec.JSON_CODEC
+    assert event_codec.unpack(codec, start, data) == events
+
+
+def test_logged_events_round_trip_and_are_verified(log_db):
+    payload = {"window": {"start": START, "end": "2026-10-17T09:16:10.000", "seconds": 10.13},
+               "counts": {"keys": 4, "clicks": 1, "scrolls": 1, "moves": 1}, "events": EVENTS}
+    logged = log_db.log_action("Input events: " + json.dumps(payload))
+    row = log_db.get_entry(1)
+    assert row['action'] == logged['action'] and '"events"' not in row['action']
+    with log_db.get_db() as conn:
+        shard = log_db.list_shards(conn)[-1]
+    with log_db.shard_db(shard) as conn:
+        blob = conn.execute("SELECT data FROM input_event_blobs WHERE log_id = 1").fetchone()[0]
+    assert log_db.load_input_events(row['action'], blob) == payload
+    assert log_db.verify_chain(full=True)["ok"]
+
+    conn = sqlite3.connect(log_db.shard_file(shard['shard_key']))
+    conn.execute("UPDATE input_event_blobs SET data = ? WHERE log_id = 1",
+                 (event_codec.pack(START, EVENTS[:-1])[1],))
+    conn.commit()
+    conn.close()
+    assert log_db.verify_chain(full=True)["bad_id"] == 1
+
+
+@pytest.mark.parametrize("body", ["[1, 2]", "42", "null", "not json"])
+def test_non_object_payloads_stay_inline(log_db, body):
+    logged = log_db.log_action("Input events: " + body)
+    assert logged["action"] == "Input events: " + body
+    assert log_db.verify_chain(full=True)["ok"]
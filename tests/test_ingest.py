@@ -0,0 +1,15 @@
+from ingest import GroupCommitIngest
+
+
+def test_rejected_entries_are_skipped_and_capped(log_db):
+    ingest = GroupCommitIngest(window=0.01, max_failed=2)
+    try:
+        # None is what a bad entry looks like to log_actions: it fails on its own, every time
+        first, last = ingest.submit(["File created: C:/a", None, None, "File created: C:/b", None])
+        assert ingest.wait_durable(last, timeout=10)
+    finally:
+        ingest.stop()
+    assert sorted(ingest.failed) == [first + 2, first + 4]
+    assert [ingest.status(s) for s in range(first, last + 1)] == \
+        ["unknown", "unknown", "failed", "durable", "failed"]
+    assert [r['action'] for r in log_db.iter_entries(columns="action")] == ["File created: C:/a", "File created: C:/b"]
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pytest
+
+import db
+import summary_app_usage
+import summary_input_activity
+from bench.workload import build
+
+
+@pytest.fixture(scope="module")
+def workload(tmp_path_factory):
+    """~4 office hours of generated traffic from two users, logged through db.log_actions."""
+    with pytest.MonkeyPatch.context() as mp:
+        path = str(tmp_path_factory.mktemp("rollups") / "logs.db")
+        mp.setattr(db, "DB_FILE", path)
+        mp.setattr(db, "_writer", db.ChainWriter())
+        build(path, 5000, seed=7, users=2)
+        for module in (summary_app_usage, summary_input_activity):
+            mp.setattr(module, "DB_FILE", path)
+        yield path
+        db._writer._reset()
+
+
+RANGES = [
+    (None, None),
+    ("2025-01-06T09:00:00", "2025-01-06T11:00:00"),           # whole hours, until on a boundary
+    ("2025-01-06T08:30:00", "2025-01-06T10:59:59"),
+    ("2025-01-06T08:59:59.500000", "2025-01-06T11:00:00.000001"),
+    ("2025-01-06T10:00:09.999999", "2025-01-06T10:00:10"),
+    ("2025-01-06T09:10:00", "2025-01-06T09:50:30"),           # inside one hour: no whole hour to roll up
+    ("2025-01-06", "2025-01-06T10:30"),
+    ("2025-01-06T10:00:00", None),
+    (None, "2025-01-06T10:00:00"),
+]
+
+
+@pytest.mark.parametrize("since, until", RANGES)
+def test_app_usage_rollups_match_raw(workload, since, until):
+    raw = summary_app_usage.app_totals(since, until, raw=True)
+    rolled = summary_app_usage.app_totals(since, until, use_cache=False)
+    assert rolled.keys() == raw.keys()
+    for exe, r in raw.items():
+        got = rolled[exe]
+        assert (got["sessions"], got["first"], got["last"]) == (r["sessions"], r["first"], r["last"]), exe
+        assert got["seconds"] == pytest.approx(r["seconds"]), exe
+
+
+@pytest.mark.parametrize("since, until", RANGES)
+@pytest.mark.parametrize("bucket", ["minute", "hour"])
+def test_input_rollups_match_raw(workload, since, until, bucket):
+    raw = summary_input_activity.activity_sums(since, until, bucket, raw=True)
+    rolled = summary_input_activity.activity_sums(since, until, bucket, use_cache=False)
+    assert raw, "range selects no input activity"
+    assert [r[:5] for r in rolled] == [r[:5] for r in raw]
+    assert [r[5] for r in rolled] == pytest.approx([r[5] for r in raw])
+
+
+BOUNDARY_TIMES = ["2025-01-06T09:59:59.999999", "2025-01-06T10:00:00", "2025-01-06T10:00:00.000001",
+                  "2025-01-06T10:59:59.999999", "2025-01-06T11:00:00", "2025-01-06T11:00:00.000001"]
+
+
+@pytest.fixture
+def boundary_log(log_db, monkeypatch):
+    """One focus end and one input summary logged at each of BOUNDARY_TIMES."""
+    for module in (summary_app_usage, summary_input_activity):
+        monkeypatch.setattr(module, "DB_FILE", log_db.DB_FILE)
+    for n, ts in enumerate(BOUNDARY_TIMES):
+        monkeypatch.setattr(log_db, "utcnow", lambda ts=ts: datetime.fromisoformat(ts))
+        log_db.log_actions([
+            f'App focus end: pid={n} | exe="app{n % 2}.exe" | title="t" | duration={n + 0.25:.2f}s | reason=focus_switch',
+            f"Input summary: keys={n} | clicks=1 | scrolls=0 | moves=2 | interval=10.00s",
+        ])
+    return log_db
+
+
+@pytest.mark.parametrize("since", [None] + BOUNDARY_TIMES)
+@pytest.mark.parametrize("until", [None] + BOUNDARY_TIMES)
+def test_rollups_at_hour_boundaries_match_raw(boundary_log, since, until):
+    raw = summary_app_usage.app_totals(since, until, raw=True)
+    assert summary_app_usage.app_totals(since, until, use_cache=False) == raw  # durations are exact in binary
+    for bucket in ("minute", "hour"):
+        raw = summary_input_activity.activity_sums(since, until, bucket, raw=True)
+        assert summary_input_activity.activity_sums(since, until, bucket, use_cache=False) == raw
@@ -0,0 +1,66 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import merkle
+from chain_verify import verify_parallel
+
+
+@pytest.fixture
+def clock(log_db, monkeypatch):
+    """Entry timestamps come from now[0], which the test moves."""
+    now = [datetime(2026, 9, 30, 23, 59, 50)]
+    monkeypatch.setattr(log_db, "utcnow", lambda: now[0])
+    monkeypatch.setattr(log_db, "MERKLE_BLOCK_SIZE", 4)
+    return now
+
+
+def log_across_month_end(db, clock):
+    for i in range(6):
+        db.log_action(f"File created: C:/x/{i}.txt")
+        clock[0] += timedelta(seconds=4)  # ids 1-3 in September, 4-6 in October
+    with db.get_db() as conn:
+        return [dict(s) for s in db.list_shards(conn)]
+
+
+def test_october_shard_chains_from_september(log_db, clock):
+    shards = log_across_month_end(log_db, clock)
+    assert [(s['shard_key'], s['first_id'], s['last_id'], s['state']) for s in shards] == \
+        [("2026-09", 1, 3, "closed"), ("2026-10", 4, None, "active")]
+    assert shards[1]['prev_hash'] == shards[0]['last_hash'] == log_db.get_entry(3)['hash']
+    assert log_db.get_entry(4)['prev_hash'] == log_db.get_entry(3)['hash']
+    assert [r['id'] for r in log_db.iter_entries()] == [1, 2, 3, 4, 5, 6]
+    assert log_db.verify_chain(full=True)["checked"] == 6
+    assert verify_parallel(workers=2, segments=3)["ok"]
+
+
+def test_merkle_block_spans_the_shard_boundary(log_db, clock):
+    log_across_month_end(log_db, clock)
+    proof = log_db.get_proof(4)
+    assert (proof["block"]["first_id"], proof["block"]["last_id"]) == (1, 4)
+    assert merkle.check_proof(proof)[0]
+
+
+def test_broken_link_between_shards_is_reported(log_db, clock):
+    shards = log_across_month_end(log_db, clock)
+    # rewrite October's first entry to chain from somewhere else, rehashing October so it is self-consistent
+    conn = sqlite3.connect(log_db.shard_file("2026-10"))
+    prev = "0" * 64
+    for row_id, ts, action in conn.execute("SELECT id, timestamp, action FROM audit_logs ORDER BY id").fetchall():
+        h = log_db.calculate_hash(prev, ts, action)
+        conn.execute("UPDATE audit_logs SET prev_hash = ?, hash = ? WHERE id = ?", (prev, h, row_id))
+        prev = h
+    conn.commit()
+    conn.close()
+    assert shards[1]['first_id'] == 4
+    assert log_db.verify_chain(full=True)["bad_id"] == 4
+    assert verify_parallel(workers=2, segments=3)["bad_id"] == 4
+
+
+def test_incremental_verify_continues_into_the_next_shard(log_db, clock):
+    log_db.log_action("File created: C:/x/first.txt")
+    assert log_db.verify_chain()["checked"] == 1
+    log_across_month_end(log_db, clock)
+    result = log_db.verify_chain()
+    assert (result["ok"], result["first_id"], result["last_id"]) == (True, 2, 7)
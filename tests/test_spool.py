@@ -0,0 +1,70 @@
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "monitor"))
+import spool
+import transport
+
+
+class FakeTransport(transport.Transport):
+    """Refuses any batch holding a 'bad' action with `status`, accepts the rest."""
+    status = transport.Rejected("HTTP 400")
+
+    def __init__(self, url, token):
+        super().__init__(url, token)
+        self.sent = []
+
+    def send(self, actions):
+        if any("bad" in a for a in actions):
+            return self.status
+        self.sent += actions
+        return None
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.05)
+    return predicate()
+
+
+def test_rejected_batch_is_replaced_by_a_note(tmp_path, monkeypatch):
+    monkeypatch.setattr(spool, "Transport", FakeTransport)
+    monkeypatch.setattr(spool, "FLUSH_INTERVAL", 0.05)
+    s = spool.Spool("t", "http://unused", "token", path=str(tmp_path / "t.db"))
+    try:
+        s.put(["bad one"])
+        assert wait_for(lambda: s.backlog() == 0 and s.transport.sent)
+        s.put(["File created: C:/x"])
+        assert wait_for(lambda: s.backlog() == 0 and len(s.transport.sent) == 2)
+    finally:
+        s.close()
+    assert s.transport.sent[0].startswith("Spool error: rejected=1 | bytes=7 | status=HTTP 400")
+    assert s.transport.sent[1] == "File created: C:/x"
+    assert s._bytes == 0
+
+
+def test_retryable_status_keeps_the_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(spool, "Transport", FakeTransport)
+    monkeypatch.setattr(FakeTransport, "status", "HTTP 429")
+    monkeypatch.setattr(spool, "FLUSH_INTERVAL", 0.05)
+    s = spool.Spool("t", "http://unused", "token", path=str(tmp_path / "t.db"))
+    try:
+        s.put(["bad one"])
+        assert wait_for(lambda: s._failures > 0)
+        assert s.backlog() == 1 and not s.transport.sent
+    finally:
+        s.close(timeout=0)
+
+
+def test_trim_recounts_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(spool, "Transport", FakeTransport)
+    monkeypatch.setattr(spool, "MAX_DISK_BYTES", 1000)
+    monkeypatch.setattr(spool, "FLUSH_INTERVAL", 3600)
+    s = spool.Spool("t", "http://unused", "token", path=str(tmp_path / "t.db"))
+    try:
+        s.put(["bad " + "x" * 96] * 30)  # never sent, so only _trim shrinks the file
+        with s._lock:
+            s._persist()
+            assert s._bytes == s._size() <= 1000
+    finally:
+        s.close(timeout=0)
@@ -0,0 +1,77 @@
+import sqlite3
+
+import pytest
+
+ACTIONS = [
+    'App focus end: pid=42 | exe="code.exe" | title="db.py" | duration=12.50s | reason=focus_switch',
+    "Folder created (name: New folder (2)): C:/x/New folder (2)",
+    "File renamed (from: a (1).txt to: b.txt): C:/x/a (1).txt -> C:/x/b.txt",
+    "Input summary: keys=42 | clicks=8 | scrolls=3 | moves=20 | interval=10.00s",
+]
+
+
+def shard_paths(db):
+    with db.get_db() as conn:
+        return [db.shard_file(s['shard_key']) for s in db.list_shards(conn)]
+
+
+def execute_everywhere(db, sql, params=()):
+    """Run sql on every shard file behind the writer's back, like an attacker editing the files."""
+    for path in shard_paths(db):
+        conn = sqlite3.connect(path)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'audit_logs'").fetchone():
+            conn.execute(sql, params)
+            conn.commit()
+        conn.close()
+
+
+def test_intact_log_verifies(log_db):
+    log_db.log_actions(ACTIONS)
+    result = log_db.verify_chain(full=True)
+    assert result["ok"] and result["checked"] == len(ACTIONS)
+
+
+@pytest.mark.parametrize("sql", [
+    "UPDATE audit_logs SET event_type = 'File created' WHERE id = 3",
+    "UPDATE audit_logs SET duration = 1.5 WHERE id = 1",
+    "UPDATE audit_logs SET exe = 'game.exe' WHERE id = 1",
+    "UPDATE audit_logs SET path = 'C:/elsewhere' WHERE id = 2",
+])
+def test_edited_derived_column_is_reported(log_db, sql):
+    log_db.log_actions(ACTIONS)
+    execute_everywhere(log_db, sql)
+    result = log_db.verify_chain(full=True)
+    assert not result["ok"]
+    assert result["bad_id"] == int(sql.rsplit(" ", 1)[1])
+
+
+def test_edited_input_counts_are_reported(log_db):
+    log_db.log_actions(ACTIONS)
+    execute_everywhere(log_db, "UPDATE input_activity SET keys = 1 WHERE log_id = 4")
+    assert log_db.verify_chain(full=True)["bad_id"] == 4
+
+
+def test_migration_rederives_labelled_types(log_db):
+    log_db.log_actions(ACTIONS)
+    assert log_db.verify_chain()["ok"]
+    # the state a log written by the old label regex is in
+    execute_everywhere(log_db, "UPDATE audit_logs SET event_type = 'Folder created (name: New folder (2))' "
+                               "WHERE id = 2")
+    execute_everywhere(log_db, "UPDATE audit_logs SET event_type = 'File renamed (from: a (1).txt to: b.txt)' "
+                               "WHERE id = 3")
+    for path in {log_db.DB_FILE, *shard_paths(log_db)}:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA user_version=5")
+        conn.close()
+    log_db._writer._reset()
+    for path in {log_db.DB_FILE, *shard_paths(log_db)}:
+        log_db.drop_pools(path)
+    assert log_db.verify_chain(full=True)["bad_id"] == 2
+
+    log_db.init_db()
+    with log_db.get_db() as conn:
+        assert log_db.get_checkpoint(conn) is None
+    types = [r['event_type'] for r in log_db.iter_entries(2, 3, columns="event_type")]
+    assert types == ["Folder created", "File renamed"]
+    result = log_db.verify_chain()
+    assert result["ok"] and result["checked"] == len(ACTIONS)